@@ -0,0 +1,60 @@
+# benchmarks/bench_arranque.py
+#
+# Coste de arranque de la aplicación: cuánto tarda en importarse main.py y cuánto
+# añade la primera petición a cada endpoint (carga de su procesador y de sus
+# dependencias, y precalentamiento). Cada medida se hace en un intérprete nuevo.
+# Uso (desde la raíz del proyecto):
+#     python -m benchmarks.bench_arranque [repeticiones]
+
+import sys
+import json
+import statistics
+import subprocess
+
+from clases.carga_diferida import PROCESADORES
+
+# Se ejecuta en un proceso nuevo; imprime los segundos de cada fase en JSON
+SCRIPT = """
+import sys, json, time, warnings
+warnings.filterwarnings("ignore")
+inicio = time.perf_counter()
+import main
+tiempos = {"main": time.perf_counter() - inicio}
+modulos = len(sys.modules)
+nombre = sys.argv[1]
+if nombre:
+    from clases.carga_diferida import cargar_procesador
+    inicio = time.perf_counter()
+    clase = cargar_procesador(nombre)
+    tiempos["carga"] = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    clase.precalentar()
+    tiempos["precalentar"] = time.perf_counter() - inicio
+    modulos = len(sys.modules)
+tiempos["modulos"] = modulos
+print(json.dumps(tiempos))
+"""
+
+
+def medir(nombre: str, repeticiones: int) -> dict:
+    """Devuelve la mediana de cada fase (en ms) en `repeticiones` procesos nuevos."""
+    muestras = []
+    for _ in range(repeticiones):
+        salida = subprocess.run([sys.executable, "-c", SCRIPT, nombre], capture_output=True, text=True, check=True)
+        muestras.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+    return {fase: statistics.median(m[fase] for m in muestras) for fase in muestras[0]}
+
+
+def main(repeticiones: int = 5):
+    print(f"Mediana de {repeticiones} arranques")
+    print(f"{'escenario':<24}{'main (ms)':>11}{'carga (ms)':>12}{'precalentar (ms)':>18}{'módulos':>10}")
+    for nombre in ["", *PROCESADORES]:
+        tiempos = medir(nombre, repeticiones)
+        carga = f"{tiempos['carga'] * 1000:.1f}" if "carga" in tiempos else "-"
+        precalentar = f"{tiempos['precalentar'] * 1000:.1f}" if "precalentar" in tiempos else "-"
+        print(f"{nombre or 'solo main':<24}{tiempos['main'] * 1000:>11.1f}{carga:>12}{precalentar:>18}"
+              f"{int(tiempos['modulos']):>10}")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,58 @@
+# benchmarks/bench_backends.py
+#
+# Tiempo de extracción de texto por página con cada backend de PDF, sobre un
+# corpus sintético generado con PyMuPDF (página completa y solo el encabezado).
+# Uso (desde la raíz del proyecto):
+#     python -m benchmarks.bench_backends [documentos] [paginas_por_documento]
+
+import sys
+import time
+
+import fitz
+
+from clases.backend_pdf import BACKENDS, REGION_ENCABEZADO, abrir_pdf
+from clases.entrada_pdf import FuentePDF
+
+
+PARRAFO = ("Señores PACARIBE S.A.S. Cordial saludo, adjuntamos la respuesta a su "
+           "solicitud radicada en nuestras oficinas dentro de los términos de ley.")
+
+
+def generar_corpus(documentos: int, paginas: int):
+    """Genera PDF en memoria con un encabezado de atención y una página llena de texto."""
+    corpus = []
+    for n in range(documentos):
+        doc = fitz.open()
+        for p in range(paginas):
+            pagina = doc.new_page()
+            pagina.insert_text((72, 60), f"Atención N° {398000 + n}  Identificador del certificado: E{n:09d}-S")
+            pagina.insert_textbox(fitz.Rect(72, 100, 540, 780), (PARRAFO + " ") * 12, fontsize=10)
+        corpus.append(FuentePDF(f"doc_{n}.pdf", doc.tobytes()))
+        doc.close()
+    return corpus
+
+
+def medir(corpus, backend: str, region=None) -> float:
+    """Devuelve los milisegundos por página que tarda en abrirse el corpus y extraerse el texto."""
+    paginas = 0
+    inicio = time.perf_counter()
+    for fuente in corpus:
+        with abrir_pdf(fuente, backend) as documento:
+            for _ in documento.iterar_textos(region=region):
+                paginas += 1
+    return (time.perf_counter() - inicio) / paginas * 1000
+
+
+def main(documentos: int = 50, paginas: int = 4):
+    corpus = generar_corpus(documentos, paginas)
+    print(f"{documentos} documentos x {paginas} páginas")
+    print(f"{'backend':<10}{'página (ms)':>14}{'encabezado (ms)':>18}")
+    for backend in BACKENDS:
+        completa = medir(corpus, backend)
+        encabezado = medir(corpus, backend, REGION_ENCABEZADO)
+        print(f"{backend:<10}{completa:>14.3f}{encabezado:>18.3f}")
+
+
+if __name__ == "__main__":
+    argumentos = [int(a) for a in sys.argv[1:3]]
+    main(*argumentos)
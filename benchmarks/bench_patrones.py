@@ -0,0 +1,49 @@
+# benchmarks/bench_patrones.py
+#
+# Micro-benchmark del motor de patrones frente al bucle original de re.search.
+# Uso (desde la raíz del proyecto):
+#     python -m benchmarks.bench_patrones [repeticiones]
+
+import re
+import sys
+import timeit
+
+from clases.motor_patrones import cargar_reglas, obtener_motor
+from clases.procesador_lleida import ProcesadorPDF
+
+
+RELLENO = "Señores PACARIBE S.A.S. Cordial saludo, adjuntamos la respuesta a su solicitud. " * 20
+
+TEXTOS = {
+    "primer_patron": "Atención N° 398871\n" + RELLENO,
+    "ultimo_patron": RELLENO + "Asunto: NOTIFICACION ELECTRONICA PACARIBE - 398871",
+    "radicado_al_final": RELLENO * 3 + "RADICADO: 398871",
+    "sin_coincidencia": RELLENO * 3,
+}
+
+
+def buscar_con_bucle(patrones, texto):
+    """Implementación anterior: una búsqueda por patrón."""
+    for patron in patrones:
+        match = re.search(patron, texto, re.IGNORECASE)
+        if match:
+            return match.group(1)
+    return None
+
+
+def main(repeticiones: int = 2000):
+    # Sin crear un ProcesadorPDF, que abriría el índice de resultados y el OCR
+    patrones = cargar_reglas("atencion", ProcesadorPDF.PATRONES_ATENCION)
+    motor = obtener_motor(patrones)
+
+    print(f"{'texto':<20}{'bucle (µs)':>12}{'motor (µs)':>12}{'mejora':>9}")
+    for nombre, texto in TEXTOS.items():
+        assert buscar_con_bucle(patrones, texto) == motor.buscar(texto)
+        bucle = timeit.timeit(lambda: buscar_con_bucle(patrones, texto), number=repeticiones)
+        combinado = timeit.timeit(lambda: motor.buscar(texto), number=repeticiones)
+        print(f"{nombre:<20}{bucle / repeticiones * 1e6:>12.1f}"
+              f"{combinado / repeticiones * 1e6:>12.1f}{bucle / combinado:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,272 @@
+# benchmarks/bench_procesadores.py
+#
+# Rendimiento de extremo a extremo de los tres procesadores sobre los corpus
+# sintéticos de corpus_sintetico.py: documentos por segundo, latencia por
+# documento (p50/p99) y pico de memoria (RSS), para varios tamaños de corpus.
+# Cada medida se hace en un intérprete nuevo, para que el pico de memoria y las
+# cachés no dependan de las medidas anteriores, y con el índice de resultados y
+# el OCR desactivados. Los resultados se guardan en JSON para comparar ejecuciones.
+#
+# La latencia por documento es el tiempo entre la entrega de un documento y la
+# del anterior (los procesadores entregan los resultados en orden); en modo
+# secuencial es el coste de cada documento y en paralelo refleja las esperas.
+# En el escenario "cartas" no hay entrega por documento y solo se mide el total;
+# la conversión con LibreOffice queda fuera: se parte del PDF ya combinado.
+#
+# Uso (desde la raíz del proyecto):
+#     python -m benchmarks.bench_procesadores [--escenarios certificados,zip] [--tamanos 10,100]
+#                                             [--semilla 0] [--salida resultados.json]
+#     python -m benchmarks.bench_procesadores --comparar base.json nuevo.json
+# El modo de ejecución se elige como en la aplicación (PACA_EJECUTOR, PACA_WORKERS...).
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # Windows: no se mide la memoria
+    resource = None
+
+from benchmarks.corpus_sintetico import ESCENARIOS, obtener_corpus
+from clases.ejecutor import cerrar_pools, procesos_workers
+
+TAMANOS = (10, 100, 1000, 10000)
+DIR_BENCH = os.path.join("datos", "bench")
+
+
+def percentil(valores: List[float], p: float) -> Optional[float]:
+    """Percentil por rango más cercano (p entre 0 y 100)."""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def _rss_pico_mb(quien) -> Optional[float]:
+    if resource is None:
+        return None
+    # ru_maxrss está en KiB en Linux y en bytes en macOS
+    pico = resource.getrusage(quien).ru_maxrss
+    return round(pico / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+def _rss_pico_workers_mb() -> Optional[float]:
+    """
+    Pico de memoria del worker que más usó, leído de /proc antes de cerrar los pools.
+
+    Los workers arrancan desde el servidor de procesos (forkserver), no como hijos
+    de este proceso, así que no cuentan en RUSAGE_CHILDREN.
+    """
+    picos = []
+    for pid in procesos_workers():
+        try:
+            with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+                picos.extend(int(linea.split()[1]) for linea in f if linea.startswith("VmHWM:"))
+        except (OSError, ValueError, IndexError):
+            continue
+    if picos:
+        return round(max(picos) / 1024, 1)
+    return _rss_pico_mb(resource.RUSAGE_CHILDREN) if resource else None
+
+
+def _preparar(escenario: str) -> Callable[[List[str], str, Callable], Dict]:
+    """
+    Importa el procesador del escenario (fuera de la medida) y devuelve una función
+    que procesa los archivos y devuelve sus estadísticas.
+    """
+    if escenario == "certificados":
+        from clases.ExtractorCertificados import ExtractorCertificadosLleida
+        return lambda archivos, trabajo, progreso: ExtractorCertificadosLleida().procesar_archivos(
+            archivos, trabajo, progreso)[1]
+
+    if escenario in ("notificaciones", "zip"):
+        from clases.procesador_lleida import ProcesadorPDF
+        return lambda archivos, trabajo, progreso: ProcesadorPDF().procesar_archivos(
+            archivos, trabajo, progreso)[1]
+
+    from clases.procesador import ProcesadorCartas
+
+    class CartasSinConversion(ProcesadorCartas):
+        def _convertir_a_pdf(self):
+            return self.ruta_docx
+
+    return lambda archivos, trabajo, progreso: CartasSinConversion(
+        archivos[0], directorio_trabajo=trabajo).procesar()[1]
+
+
+def ejecutar(escenario: str, directorio: str) -> Dict:
+    """
+    Procesa un corpus ya generado y mide el tiempo, las latencias y la memoria.
+
+    Se llama en un proceso nuevo (opción --ejecutar); el resultado se imprime en JSON.
+    """
+    with open(os.path.join(directorio, "corpus.json"), encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    archivos = [os.path.join(directorio, nombre) for nombre in manifiesto["archivos"]]
+    procesar = _preparar(escenario)
+
+    trabajo = tempfile.mkdtemp(prefix="bench_")
+    rss_inicial = _rss_pico_mb(resource.RUSAGE_SELF) if resource else None
+
+    entregas = {}
+
+    def progreso(procesados, total):
+        entregas.setdefault(procesados, time.perf_counter())
+
+    try:
+        inicio = time.perf_counter()
+        estadisticas = procesar(archivos, trabajo, progreso)
+        segundos = time.perf_counter() - inicio
+        rss_workers = _rss_pico_workers_mb()
+    finally:
+        # Los pools son compartidos y no terminan con la llamada
+        cerrar_pools()
+        shutil.rmtree(trabajo, ignore_errors=True)
+
+    marcas = [inicio] + [entregas[n] for n in sorted(entregas)]
+    latencias = [(b - a) * 1000 for a, b in zip(marcas, marcas[1:])]
+    documentos = manifiesto["documentos"]
+    esperado = manifiesto["esperado"]
+
+    return {
+        "escenario": escenario,
+        "documentos": documentos,
+        "paginas": manifiesto["paginas"],
+        "segundos": round(segundos, 4),
+        "documentos_por_segundo": round(documentos / segundos, 2),
+        "paginas_por_segundo": round(manifiesto["paginas"] / segundos, 2),
+        "latencia_p50_ms": _redondear(percentil(latencias, 50)),
+        "latencia_p99_ms": _redondear(percentil(latencias, 99)),
+        "latencia_max_ms": _redondear(max(latencias, default=None)),
+        "rss_inicial_mb": rss_inicial,
+        "rss_pico_mb": _rss_pico_mb(resource.RUSAGE_SELF) if resource else None,
+        "rss_pico_workers_mb": rss_workers,
+        "estadisticas": estadisticas,
+        # Un cambio que acelera a costa de no encontrar los números no es una mejora
+        "correcto": all(estadisticas.get(clave) == valor for clave, valor in esperado.items()),
+    }
+
+
+def _redondear(valor: Optional[float]) -> Optional[float]:
+    return round(valor, 3) if valor is not None else None
+
+
+def medir(escenario: str, directorio: str) -> Dict:
+    """Ejecuta ejecutar() en un intérprete nuevo y devuelve su resultado."""
+    entorno = dict(os.environ, PACA_INDICE_DB="", PACA_OCR="0")
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    entorno["PYTHONPATH"] = os.pathsep.join(filter(None, [raiz, entorno.get("PYTHONPATH")]))
+    salida = subprocess.run([sys.executable, "-m", "benchmarks.bench_procesadores", "--ejecutar",
+                             escenario, os.path.abspath(directorio)],
+                            capture_output=True, text=True, env=entorno)
+    if salida.returncode != 0:
+        raise RuntimeError(f"Falló la medida de {escenario} en {directorio}:\n{salida.stderr}")
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def describir_entorno() -> Dict:
+    """Datos de la máquina y la configuración, para saber si dos ejecuciones son comparables."""
+    import fitz
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pymupdf": fitz.VersionBind,
+        "ejecutor": os.environ.get("PACA_EJECUTOR", "procesos"),
+        "workers": os.environ.get("PACA_WORKERS", "0"),
+        "backend_pdf": os.environ.get("PACA_BACKEND_PDF"),
+    }
+
+
+def comparar(ruta_base: str, ruta_nueva: str):
+    """Muestra la variación de rendimiento y memoria entre dos archivos de resultados."""
+    with open(ruta_base, encoding="utf-8") as f:
+        base = {(r["escenario"], r["documentos"]): r for r in json.load(f)["resultados"]}
+    with open(ruta_nueva, encoding="utf-8") as f:
+        nueva = {(r["escenario"], r["documentos"]): r for r in json.load(f)["resultados"]}
+
+    print(f"{'escenario':<16}{'docs':>7}{'docs/s':>16}{'p99 (ms)':>20}{'RSS (MB)':>18}")
+    for clave in sorted(base.keys() & nueva.keys()):
+        a, b = base[clave], nueva[clave]
+        print(f"{clave[0]:<16}{clave[1]:>7}"
+              f"{_variacion(a['documentos_por_segundo'], b['documentos_por_segundo']):>16}"
+              f"{_variacion(a['latencia_p99_ms'], b['latencia_p99_ms']):>20}"
+              f"{_variacion(a['rss_pico_mb'], b['rss_pico_mb']):>18}"
+              f"{'' if b['correcto'] else '  (resultados incorrectos)'}")
+
+
+def _variacion(antes: Optional[float], despues: Optional[float]) -> str:
+    if not antes or despues is None:
+        return "-"
+    return f"{despues:g} ({(despues - antes) / antes:+.0%})"
+
+
+def main(argumentos: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark de los procesadores con corpus sintéticos")
+    parser.add_argument("--escenarios", default=",".join(ESCENARIOS))
+    parser.add_argument("--tamanos", default=",".join(str(t) for t in TAMANOS))
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--corpus", default=os.path.join(DIR_BENCH, "corpus"),
+                        help="Directorio donde se generan y reutilizan los corpus")
+    parser.add_argument("--salida", help="Archivo JSON de resultados (por defecto, en datos/bench/resultados)")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "NUEVO"))
+    parser.add_argument("--ejecutar", nargs=2, metavar=("ESCENARIO", "DIRECTORIO"), help=argparse.SUPPRESS)
+    opciones = parser.parse_args(argumentos)
+
+    if opciones.ejecutar:
+        print(json.dumps(ejecutar(*opciones.ejecutar)))
+        return
+    if opciones.comparar:
+        comparar(*opciones.comparar)
+        return
+
+    escenarios = [e.strip() for e in opciones.escenarios.split(",") if e.strip()]
+    tamanos = [int(t) for t in opciones.tamanos.split(",")]
+    resultados = []
+
+    print(f"{'escenario':<16}{'docs':>7}{'páginas':>9}{'s':>9}{'docs/s':>10}{'p50 (ms)':>10}"
+          f"{'p99 (ms)':>10}{'RSS (MB)':>10}{'workers (MB)':>14}")
+    for escenario in escenarios:
+        for tamano in tamanos:
+            corpus = obtener_corpus(opciones.corpus, escenario, tamano, opciones.semilla)
+            r = medir(escenario, corpus["directorio"])
+            resultados.append(r)
+            print(f"{escenario:<16}{tamano:>7}{r['paginas']:>9}{r['segundos']:>9.2f}"
+                  f"{r['documentos_por_segundo']:>10.1f}{_celda(r['latencia_p50_ms']):>10}"
+                  f"{_celda(r['latencia_p99_ms']):>10}{_celda(r['rss_pico_mb']):>10}"
+                  f"{_celda(r['rss_pico_workers_mb']):>14}"
+                  f"{'' if r['correcto'] else '  ⚠️ estadísticas distintas de las esperadas'}")
+
+    salida = opciones.salida or os.path.join(DIR_BENCH, "resultados",
+                                             f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump({"fecha": datetime.now().isoformat(timespec="seconds"), "semilla": opciones.semilla,
+                   "entorno": describir_entorno(), "resultados": resultados}, f, ensure_ascii=False, indent=2)
+    print(f"Resultados guardados en {salida}")
+
+
+def _celda(valor: Optional[float]) -> str:
+    return "-" if valor is None else f"{valor:.1f}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# benchmarks/corpus_sintetico.py
+#
+# Corpus sintéticos y reproducibles (misma semilla, mismos documentos) para los
+# benchmarks de los procesadores, generados con PyMuPDF:
+#   - certificados: PDF de varias páginas con el identificador E…-S y el asunto
+#   - notificaciones: PDF con cada una de las variantes de patrones_atencion
+#   - zip: las mismas notificaciones empaquetadas en ZIP con carpetas anidadas
+#   - cartas: un PDF combinado de cartas de 4 páginas (PAC-DR-25-2-xxxxxx)
+# Cada corpus se guarda en su directorio con un manifiesto (corpus.json) que
+# incluye las estadísticas esperadas, y se reutiliza mientras no cambie VERSION.
+
+import os
+import json
+import random
+import zipfile
+from typing import Dict, List, Tuple
+
+import fitz
+
+
+# Cambiar al modificar la generación, para no reutilizar corpus antiguos
+VERSION = 1
+MANIFIESTO = "corpus.json"
+ESCENARIOS = ("certificados", "notificaciones", "zip", "cartas")
+
+PARRAFO = ("Señores PACARIBE S.A.S. Cordial saludo, adjuntamos la respuesta a su "
+           "solicitud radicada en nuestras oficinas dentro de los términos de ley.")
+
+# Una línea por cada patrón de ProcesadorPDF.patrones_atencion (None: sin número)
+VARIANTES_ATENCION = (
+    "Atención N° {n}",
+    "Atención No. {n}",
+    "ATENCION: {n}",
+    "Atención # {n}",
+    "Radicado: {n}",
+    "RADICADO # {n}",
+    "Referencia interna: {n}",
+    "Nro. {n}",
+    "Asunto: NOTIFICACION ELECTRONICA PACARIBE - {n}",
+    None,
+)
+
+# Dónde aparecen el certificado y el asunto en cada certificado
+VARIANTES_CERTIFICADO = ("completo", "certificado_al_final", "solo_respaldo", "sin_asunto")
+
+# Notificaciones por ZIP y carpetas por ZIP en el escenario "zip"
+PDFS_POR_ZIP = 250
+CARPETAS_POR_ZIP = 5
+
+
+def directorio_corpus(raiz: str, escenario: str, documentos: int, semilla: int) -> str:
+    return os.path.join(raiz, f"{escenario}_{documentos}_s{semilla}")
+
+
+def obtener_corpus(raiz: str, escenario: str, documentos: int, semilla: int = 0) -> Dict:
+    """
+    Devuelve el manifiesto de un corpus, generándolo si no existe o es de otra versión.
+
+    Args:
+        raiz: Directorio donde se guardan los corpus
+        escenario: Uno de ESCENARIOS
+        documentos: Número de documentos (de cartas, en el escenario "cartas")
+        semilla: Semilla del generador aleatorio
+
+    Returns:
+        Manifiesto con directorio, archivos, documentos, paginas y esperado
+    """
+    if escenario not in ESCENARIOS:
+        raise ValueError(f"Escenario no válido: {escenario}. Disponibles: {', '.join(ESCENARIOS)}")
+
+    directorio = directorio_corpus(raiz, escenario, documentos, semilla)
+    ruta_manifiesto = os.path.join(directorio, MANIFIESTO)
+    if os.path.exists(ruta_manifiesto):
+        with open(ruta_manifiesto, encoding="utf-8") as f:
+            manifiesto = json.load(f)
+        if manifiesto.get("version") == VERSION:
+            manifiesto["directorio"] = directorio
+            return manifiesto
+
+    print(f"Generando el corpus {escenario} de {documentos} documentos en {directorio}...")
+    os.makedirs(directorio, exist_ok=True)
+    rng = random.Random(f"{escenario}:{documentos}:{semilla}")
+    generar = {
+        "certificados": _generar_certificados,
+        "notificaciones": _generar_notificaciones,
+        "zip": _generar_zip,
+        "cartas": _generar_cartas,
+    }[escenario]
+    archivos, paginas, esperado = generar(directorio, documentos, rng)
+
+    manifiesto = {
+        "version": VERSION,
+        "escenario": escenario,
+        "documentos": documentos,
+        "semilla": semilla,
+        "paginas": paginas,
+        "archivos": archivos,
+        "esperado": esperado,
+    }
+    # El manifiesto se escribe al final: un corpus a medio generar se regenera
+    with open(ruta_manifiesto, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    manifiesto["directorio"] = directorio
+    return manifiesto
+
+
+def _pagina(doc: fitz.Document, cabecera: List[str], rng: random.Random):
+    """Añade una página con unas líneas de cabecera y un cuerpo de texto de longitud variable."""
+    pagina = doc.new_page()
+    for i, linea in enumerate(cabecera):
+        pagina.insert_text((72, 60 + 16 * i), linea, fontsize=11)
+    pagina.insert_textbox(fitz.Rect(72, 80 + 16 * len(cabecera), 540, 780),
+                          (PARRAFO + " ") * rng.randint(4, 14), fontsize=10)
+
+
+def _notificacion(rng: random.Random) -> Tuple[bytes, int, bool]:
+    """Genera una notificación de 1 a 3 páginas; devuelve (bytes, páginas, tiene_número)."""
+    variante = rng.choice(VARIANTES_ATENCION)
+    cabecera = ["Bogotá D.C.", "Señores PACARIBE S.A.S."]
+    if variante is not None:
+        cabecera.insert(0, variante.format(n=rng.randint(300000, 399999)))
+    paginas = rng.randint(1, 3)
+    doc = fitz.open()
+    _pagina(doc, cabecera, rng)
+    for _ in range(paginas - 1):
+        _pagina(doc, [], rng)
+    datos = doc.tobytes()
+    doc.close()
+    return datos, paginas, variante is not None
+
+
+def _nombre_notificacion(indice: int) -> str:
+    # Sin 5 dígitos seguidos: ProcesadorPDF toma el número del nombre si no está en el texto
+    return f"notificacion_{indice // 1000}_{indice % 1000:03d}.pdf"
+
+
+def _generar_notificaciones(directorio: str, documentos: int, rng: random.Random):
+    archivos = []
+    paginas = 0
+    con_numero = 0
+    for i in range(documentos):
+        datos, n_paginas, tiene_numero = _notificacion(rng)
+        nombre = _nombre_notificacion(i)
+        with open(os.path.join(directorio, nombre), "wb") as f:
+            f.write(datos)
+        archivos.append(nombre)
+        paginas += n_paginas
+        con_numero += tiene_numero
+    return archivos, paginas, {"total": documentos, "exitosos": con_numero,
+                               "sin_numero": documentos - con_numero, "fallidos": 0}
+
+
+def _generar_zip(directorio: str, documentos: int, rng: random.Random):
+    """Notificaciones en ZIP de hasta PDFS_POR_ZIP archivos, repartidas en carpetas anidadas."""
+    archivos = []
+    paginas = 0
+    con_numero = 0
+    for inicio in range(0, documentos, PDFS_POR_ZIP):
+        nombre = f"lote_{inicio // PDFS_POR_ZIP:03d}.zip"
+        with zipfile.ZipFile(os.path.join(directorio, nombre), "w", zipfile.ZIP_DEFLATED) as zipf:
+            # Algo que no es un PDF, que la ingesta debe saltarse
+            zipf.writestr("LEAME.txt", "Lote de notificaciones")
+            for i in range(inicio, min(inicio + PDFS_POR_ZIP, documentos)):
+                datos, n_paginas, tiene_numero = _notificacion(rng)
+                carpeta = f"region_{i % CARPETAS_POR_ZIP}/dia_{i % 3}"
+                zipf.writestr(f"{carpeta}/{_nombre_notificacion(i)}", datos)
+                paginas += n_paginas
+                con_numero += tiene_numero
+        archivos.append(nombre)
+    return archivos, paginas, {"total": documentos, "exitosos": con_numero,
+                               "sin_numero": documentos - con_numero, "fallidos": 0}
+
+
+def _generar_certificados(directorio: str, documentos: int, rng: random.Random):
+    archivos = []
+    paginas = 0
+    sin_asunto = 0
+    for i in range(documentos):
+        variante = rng.choice(VARIANTES_CERTIFICADO)
+        certificado = f"E{rng.randint(10 ** 8, 10 ** 9 - 1):09d}-S"
+        asunto = rng.randint(300000, 399999)
+        n_paginas = rng.randint(2, 5)
+
+        if variante == "completo":
+            primera = [f"Identificador del certificado: {certificado}",
+                       f"Asunto: NOTIFICACION ELECTRONICA PACARIBE - {asunto}"]
+            ultima = []
+        elif variante == "certificado_al_final":
+            primera = [f"Asunto: NOTIFICACION ELECTRONICA PACARIBE - {asunto}"]
+            ultima = [f"Identificador del certificado: {certificado}"]
+        elif variante == "solo_respaldo":
+            # Sin etiquetas: solo lo encuentran los patrones de respaldo
+            primera = [f"Remitente PACARIBE S.A.S. referencia {asunto}"]
+            ultima = [f"Sello de tiempo {certificado}"]
+        else:
+            primera = [f"Identificador del certificado: {certificado}"]
+            ultima = []
+            sin_asunto += 1
+
+        doc = fitz.open()
+        _pagina(doc, ["Certificado de comunicación electrónica", *primera], rng)
+        for p in range(1, n_paginas):
+            _pagina(doc, ultima if p == n_paginas - 1 else [], rng)
+        nombre = f"certificado_{i:05d}.pdf"
+        doc.save(os.path.join(directorio, nombre))
+        doc.close()
+        archivos.append(nombre)
+        paginas += n_paginas
+    return archivos, paginas, {"total": documentos, "exitosos": documentos, "fallidos": 0,
+                               "sin_certificado": 0, "sin_asunto": sin_asunto}
+
+
+def _generar_cartas(directorio: str, documentos: int, rng: random.Random):
+    """Un único PDF combinado con `documentos` cartas de 4 páginas; una de cada 20 sin número."""
+    doc = fitz.open()
+    con_numero = 0
+    for i in range(documentos):
+        cabecera = ["Bogotá D.C.", "Señor(a) usuario(a)"]
+        if rng.random() >= 0.05:
+            cabecera.insert(0, f"PAC-DR-25-2-{rng.randint(300000, 399999)}")
+            con_numero += 1
+        _pagina(doc, cabecera, rng)
+        for _ in range(3):
+            _pagina(doc, [], rng)
+    nombre = "cartas_combinadas.pdf"
+    doc.save(os.path.join(directorio, nombre))
+    doc.close()
+    return [nombre], documentos * 4, {"procesados": documentos, "con_numero": con_numero,
+                                      "sin_numero": documentos - con_numero, "paginas_excepcion": 0}
@@ -1,109 +1,421 @@
 import os
-import re
-import PyPDF2
-from typing import List, Dict, Tuple
-from pathlib import Path
-import pandas as pd
-import tempfile
+import time
+from typing import Callable, Iterable, List, Dict, Optional, Tuple, Union
 import zipfile
+from clases.backend_pdf import cargar_backend, parsear_region
+from clases.cache_texto import CacheTextoPDF, cache_texto, obtener_cache_worker
+from clases.ejecutor import EjecutorTareas
+from clases.entrada_pdf import FuentePDF, nombre_fuente
+from clases.indice_resultados import CERTIFICADO, IndiceResultados, obtener_indice, version_reglas
+from clases.metricas import (BUSCAR, COMPRIMIR, ESCRIBIR, EXTRAER_TEXTO, OCR, CronometroEtapas, medir_etapa,
+                             metricas, registrar_etapas)
+from clases.motor_patrones import cargar_reglas, obtener_motor
+from clases.ocr import MotorOCR, describir_error_ocr, intercalar_ocr, obtener_motor_ocr
+from clases.reportes import crear_escritor
+
+# Columnas del informe de certificados
+COLUMNAS_INFORME = ["Archivo", "Certificado", "Asunto", "Tiempo extracción (s)", "Tiempo OCR (s)", "Error"]
 
 class ExtractorCertificadosLleida:
     """Clase para extraer números de certificado y atención de archivos PDF."""
     
-    def __init__(self):
-        self.patron_certificado = r'(?:Identificador\s+del\s+certificado|Certificado|Identificación)[:\s]*(E\d+-S)'
-        self.patron_asunto = r'(?:NOTIFICACION\s+ELECTRONICA\s+PACARIBE|Asunto|Atención)[\s\-:]*(\d{5,8})'
+    # Nombre del procesador en las métricas
+    NOMBRE_METRICAS = "procesar_certificados"
+    
+    def __init__(self, cache: CacheTextoPDF = None, ejecutor: EjecutorTareas = None, ocr: MotorOCR = None,
+                 indice: IndiceResultados = None):
+        self.cache = cache or cache_texto
+        self.ejecutor = ejecutor or EjecutorTareas()
+        # Resultados ya conocidos por hash de contenido (None si el índice está desactivado)
+        self.indice = indice or obtener_indice()
+        # OCR de respaldo para los PDF sin capa de texto, si hay Tesseract instalado
+        self.ocr = ocr or obtener_motor_ocr()
+        # Región de la primera página que se lee antes que el documento completo
+        # (PACA_REGION_CERTIFICADOS, p. ej. "0,0,1,0.3"); por defecto se lee todo
+        self.region_campos = parsear_region(os.environ.get("PACA_REGION_CERTIFICADOS"))
+        self.patrones_certificado = cargar_reglas("certificado", [
+            r'(?:Identificador\s+del\s+certificado|Certificado|Identificación)[:\s]*(E\d+-S)'
+        ])
+        self.patrones_asunto = cargar_reglas("asunto", [
+            r'(?:NOTIFICACION\s+ELECTRONICA\s+PACARIBE|Asunto|Atención)[\s\-:]*(\d{5,8})'
+        ])
+        # Búsquedas de respaldo sin etiqueta, sensibles a mayúsculas
+        self.patrones_certificado_respaldo = cargar_reglas("certificado_respaldo", [
+            {"patron": r'(E\d+-S)', "ignorar_mayusculas": False}
+        ])
+        self.patrones_asunto_respaldo = cargar_reglas("asunto_respaldo", [
+            {"patron": r'PACARIBE[^\d]*(\d{5,8})', "ignorar_mayusculas": False}
+        ])
+        # Los resultados del índice obtenidos con otras reglas u opciones no se reutilizan
+        self.version_indice = version_reglas(
+            self.patrones_certificado, self.patrones_asunto, self.patrones_certificado_respaldo,
+            self.patrones_asunto_respaldo, region=self.region_campos, ocr=self.ocr.disponible)
+
+    @classmethod
+    def precalentar(cls):
+        """Carga la librería de PDF, compila los patrones y abre el índice antes de la primera petición."""
+        extractor = cls()
+        cargar_backend(extractor.cache.backend)
+        for patrones in (extractor.patrones_certificado, extractor.patrones_asunto,
+                         extractor.patrones_certificado_respaldo, extractor.patrones_asunto_respaldo):
+            obtener_motor(patrones)
 
-    def procesar_archivos(self, archivos_pdf: List[str], directorio_temporal: str) -> Tuple[str, Dict]:
+    def __getstate__(self):
+        # Los workers de otros procesos usan una caché pequeña (su texto vuelve con
+        # cada resultado a la de este proceso) y no vuelven a paralelizar
+        estado = self.__dict__.copy()
+        del estado["cache"]
+        del estado["ejecutor"]
+        del estado["ocr"]
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self.cache = obtener_cache_worker()
+        self.ejecutor = EjecutorTareas(modo="secuencial")
+        self.ocr = None
+
+    def procesar_archivos(self, archivos_pdf: List[str], directorio_temporal: str,
+                          progreso: Callable[[int, Optional[int]], None] = None,
+                          formato: str = "xlsx") -> Tuple[str, Dict]:
         """
-        Procesa una lista de archivos PDF y genera un Excel con los resultados.
+        Procesa una lista de archivos PDF y genera un informe con los resultados.
+        
+        Las filas del informe se escriben a medida que llegan los resultados (en el
+        orden de entrada), sin acumularlas en memoria.
         
         Args:
             archivos_pdf: Lista de rutas de archivos PDF
             directorio_temporal: Directorio temporal para trabajar
+            progreso: Función opcional llamada tras cada archivo con (procesados, total)
+            formato: Formato del informe: "xlsx", "csv" o "parquet"
             
         Returns:
-            Tuple con (ruta_excel_resultado, resumen_estadisticas)
+            Tuple con (ruta_zip_resultado, resumen_estadisticas)
         """
         # Crear directorio de salida
         directorio_salida = os.path.join(directorio_temporal, "resultados")
         os.makedirs(directorio_salida, exist_ok=True)
         
         # Procesar archivos
-        resultados = []
-        estadisticas = {
-            "total": len(archivos_pdf),
-            "exitosos": 0,
-            "fallidos": 0,
-            "sin_certificado": 0,
-            "sin_asunto": 0
-        }
+        estadisticas = self.estadisticas_iniciales(len(archivos_pdf))
+        filas_indice = []
         
-        for ruta_pdf in archivos_pdf:
-            try:
-                nombre_archivo = Path(ruta_pdf).name
-                certificado = self._extraer_certificado(ruta_pdf)
-                asunto = self._extraer_asunto(ruta_pdf)
+        informe = crear_escritor(formato, directorio_salida, "resultados_certificados", COLUMNAS_INFORME)
+        try:
+            # Extraer los campos en paralelo, en el orden de entrada (los ya conocidos
+            # por el índice o la caché, aquí); los PDF escaneados (sin capa de texto)
+            # pasan además por OCR en su propio pool
+            resultados = ((archivos_pdf[indice], self.cache.recoger(resultado), error)
+                          for indice, resultado, error in self.ejecutor.mapear(
+                              self._extraer_en_worker, archivos_pdf, ordenado=True, resolver=self._resolver))
+            
+            for procesados, ((ruta_pdf, resultado, error), ocr) in enumerate(
+                    intercalar_ocr(resultados, self.ocr, self._necesita_ocr), start=1):
+                if ocr is not None:
+                    self.completar_ocr(ruta_pdf, resultado, ocr, estadisticas)
                 
-                if not certificado:
-                    estadisticas["sin_certificado"] += 1
-                if not asunto:
-                    estadisticas["sin_asunto"] += 1
+                fila = self.contabilizar(estadisticas, ruta_pdf, resultado, error)
+                if fila is not None:
+                    with medir_etapa(self.NOMBRE_METRICAS, ESCRIBIR):
+                        informe.agregar(fila)
+                if error is None and not resultado.get("desde_indice") and resultado.get("indexable", True):
+                    filas_indice.append(self.fila_indice(ruta_pdf, resultado))
                 
-                if certificado or asunto:
-                    estadisticas["exitosos"] += 1
-                    resultados.append({
-                        "Archivo": nombre_archivo,
-                        "Certificado": certificado or "NO ENCONTRADO",
-                        "Asunto": asunto or "NO ENCONTRADO"
-                    })
-                else:
-                    estadisticas["fallidos"] += 1
-                    
-            except Exception as e:
-                estadisticas["fallidos"] += 1
-                resultados.append({
-                    "Archivo": Path(ruta_pdf).name,
-                    "Certificado": f"ERROR: {str(e)}",
-                    "Asunto": ""
-                })
+                if progreso:
+                    progreso(procesados, len(archivos_pdf))
+        finally:
+            with medir_etapa(self.NOMBRE_METRICAS, ESCRIBIR):
+                informe.cerrar()
         
-        # Crear DataFrame y guardar Excel
-        ruta_excel = os.path.join(directorio_salida, "resultados_certificados.xlsx")
-        df = pd.DataFrame(resultados)
-        df.to_excel(ruta_excel, index=False)
+        estadisticas["tiempo_extraccion_s"] = round(estadisticas["tiempo_extraccion_s"], 3)
+        if self.indice is not None:
+            self.indice.guardar(filas_indice)
         
         # Crear ZIP (para consistencia con otros endpoints)
         ruta_zip = os.path.join(directorio_temporal, f"resultados_certificados.zip")
-        with zipfile.ZipFile(ruta_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            zipf.write(ruta_excel, os.path.basename(ruta_excel))
+        compresion = zipfile.ZIP_STORED if informe.comprimido else zipfile.ZIP_DEFLATED
+        with medir_etapa(self.NOMBRE_METRICAS, COMPRIMIR), zipfile.ZipFile(ruta_zip, 'w', compresion) as zipf:
+            zipf.write(informe.ruta, os.path.basename(informe.ruta))
         
         return ruta_zip, estadisticas
     
-    def _extraer_certificado(self, ruta_pdf: str) -> str:
-        """Extrae el número de certificado de un PDF."""
-        with open(ruta_pdf, 'rb') as f:
-            reader = PyPDF2.PdfReader(f)
-            texto = "\n".join(page.extract_text() or "" for page in reader.pages)
-            
-            match = re.search(self.patron_certificado, texto, re.IGNORECASE)
-            if match:
-                return match.group(1)
-            
-            # Buscar directamente el formato E123456789-S
-            match = re.search(r'(E\d+-S)', texto)
-            return match.group(1) if match else None
+    def estadisticas_iniciales(self, total: int = 0) -> Dict:
+        return {
+            "total": total,
+            "exitosos": 0,
+            "fallidos": 0,
+            "sin_certificado": 0,
+            "sin_asunto": 0,
+            "desde_indice": 0,
+            "ocr_archivos": 0,
+            "tiempo_extraccion_s": 0.0,
+            "tiempo_ocr_s": 0.0
+        }
     
-    def _extraer_asunto(self, ruta_pdf: str) -> str:
-        """Extrae el número de asunto/atención de un PDF."""
-        with open(ruta_pdf, 'rb') as f:
-            reader = PyPDF2.PdfReader(f)
-            texto = "\n".join(page.extract_text() or "" for page in reader.pages)
-            
-            match = re.search(self.patron_asunto, texto, re.IGNORECASE)
-            if match:
-                return match.group(1)
-            
-            # Buscar números de 5-8 dígitos después de "PACARIBE"
-            match = re.search(r'PACARIBE[^\d]*(\d{5,8})', texto)
-            return match.group(1) if match else None
\ No newline at end of file
+    def _necesita_ocr(self, elemento: Tuple[str, Dict, str]) -> bool:
+        _, resultado, error = elemento
+        return self.ocr.disponible and error is None and resultado["sin_texto"]
+    
+    def fila_indice(self, ruta_pdf: Union[str, FuentePDF], resultado: Dict) -> Dict:
+        """Fila del índice de resultados para un PDF del que se extrajeron los campos."""
+        return {
+            "huella": resultado["huella"],
+            "tipo": CERTIFICADO,
+            "version": self.version_indice,
+            "nombre_archivo": nombre_fuente(ruta_pdf),
+            "certificado": resultado["certificado"],
+            "asunto": resultado["asunto"]
+        }
+
+    def completar_ocr(self, ruta_pdf: Union[str, FuentePDF], resultado: Dict, ocr, estadisticas: Dict):
+        """Busca el certificado y el asunto en el texto reconocido por el OCR (esperándolo si hace falta)."""
+        try:
+            reconocido = ocr.result()
+        except Exception as e:
+            # Los campos se quedan sin encontrar, pero el resultado no se guarda en el índice
+            print(describir_error_ocr(ruta_pdf, e))
+            resultado["indexable"] = False
+            return
+        
+        estadisticas["ocr_archivos"] += 1
+        estadisticas["tiempo_ocr_s"] = round(estadisticas["tiempo_ocr_s"] + reconocido.segundos, 3)
+        resultado["tiempo_ocr_s"] = reconocido.segundos
+        registrar_etapas(self.NOMBRE_METRICAS, {OCR: reconocido.segundos})
+        resultado["certificado"] = self.extraer_certificado(reconocido.texto)
+        resultado["asunto"] = self.extraer_asunto(reconocido.texto)
+    
+    def contabilizar(self, estadisticas: Dict, ruta_pdf: Union[str, FuentePDF], resultado: Dict, error: str) -> Optional[Dict]:
+        """
+        Actualiza las estadísticas (y las métricas) con el resultado de un archivo.
+        
+        Returns:
+            La fila del informe, o None si el archivo no tiene ni certificado ni asunto
+        """
+        nombre_archivo = nombre_fuente(ruta_pdf)
+        if error is not None:
+            estadisticas["fallidos"] += 1
+            metricas.incrementar("paca_archivos_total", procesador=self.NOMBRE_METRICAS, resultado="fallido")
+            return {
+                "Archivo": nombre_archivo,
+                "Certificado": "ERROR",
+                "Asunto": "",
+                "Error": error
+            }
+        
+        estadisticas["tiempo_extraccion_s"] += resultado["tiempo_extraccion_s"]
+        registrar_etapas(self.NOMBRE_METRICAS, resultado["etapas"])
+        certificado, asunto = resultado["certificado"], resultado["asunto"]
+        if resultado.get("desde_indice"):
+            estadisticas["desde_indice"] += 1
+        if not certificado:
+            estadisticas["sin_certificado"] += 1
+        if not asunto:
+            estadisticas["sin_asunto"] += 1
+        
+        if not (certificado or asunto):
+            estadisticas["fallidos"] += 1
+            metricas.incrementar("paca_archivos_total", procesador=self.NOMBRE_METRICAS, resultado="sin_campos")
+            return None
+        
+        estadisticas["exitosos"] += 1
+        metricas.incrementar("paca_archivos_total", procesador=self.NOMBRE_METRICAS, resultado="exitoso")
+        return {
+            "Archivo": nombre_archivo,
+            "Certificado": certificado or "NO ENCONTRADO",
+            "Asunto": asunto or "NO ENCONTRADO",
+            "Tiempo extracción (s)": round(resultado["tiempo_extraccion_s"], 4),
+            "Tiempo OCR (s)": round(resultado["tiempo_ocr_s"], 4) if "tiempo_ocr_s" in resultado else None
+        }
+    
+    def _resolver(self, ruta_pdf: str) -> Tuple[bool, object]:
+        """
+        Resuelve en este proceso los PDF que ya están en el índice o en la caché de texto.
+
+        La lectura de un certificado se detiene al encontrar sus campos, así que
+        la caché rara vez tiene el documento completo: basta con que las páginas
+        en caché permitan terminar la búsqueda (ver campos_en_cache). La huella es
+        la de la ingesta, así que el archivo no se vuelve a leer; los demás PDF se
+        envían a los workers junto con ella.
+
+        Returns:
+            Tuple con (True, resultado) o (False, (ruta_pdf, huella)) para _extraer_en_worker
+        """
+        huella = self.cache.obtener_huella(ruta_pdf)
+        previo = None
+        if self.indice is not None:
+            previo = self.indice.consultar(huella, CERTIFICADO, self.version_indice)
+        if previo is None:
+            campos = self.campos_en_cache(huella)
+            if campos is not None:
+                previo = {"certificado": campos[0], "asunto": campos[1], "sin_texto": campos[2],
+                          "desde_cache": True}
+        if previo is not None:
+            return True, self.extraer_campos(ruta_pdf, huella, previo)
+        return False, (ruta_pdf, huella)
+
+    def campos_en_cache(self, huella: str) -> Optional[Tuple[str, str, bool]]:
+        """
+        Busca el certificado y el asunto solo en las páginas que ya están en caché.
+
+        Returns:
+            Lo mismo que buscar_campos, o None si las páginas en caché no bastan
+            para decidir (la búsqueda habría seguido leyendo el PDF)
+        """
+        if self.region_campos:
+            encabezados, _ = self.cache.paginas_en_cache(huella, self.region_campos)
+            if not encabezados:
+                return None
+            certificado = self.extraer_certificado(encabezados[0], respaldo=False)
+            asunto = self.extraer_asunto(encabezados[0], respaldo=False)
+            if certificado and asunto:
+                return certificado, asunto, False
+
+        paginas, completo = self.cache.paginas_en_cache(huella)
+        agotadas = []
+
+        def leer():
+            yield from paginas
+            agotadas.append(True)
+
+        campos = self.buscar_campos_en_paginas(leer())
+        # Si se terminaron las páginas en caché sin el documento completo, faltaba leer más
+        if agotadas and not completo:
+            return None
+        return campos
+
+    def _extraer_en_worker(self, elemento: Tuple[str, str]) -> Dict:
+        """Extrae en un worker los campos de un PDF que no se resolvió en el proceso principal."""
+        ruta_pdf, huella = elemento
+        try:
+            self.cache.registrar_huella(ruta_pdf, huella)
+        except OSError:
+            pass
+        resultado = self.extraer_campos(ruta_pdf, huella)
+        if self.cache.en_worker:
+            self.cache.adjuntar(resultado, huella)
+        return resultado
+
+    def extraer_campos(self, ruta_pdf: str, huella: str = None, previo: Dict = None) -> Dict:
+        """
+        Extrae el certificado y el asunto de un PDF, midiendo el tiempo de extracción.
+
+        Si el PDF ya está en el índice (con las mismas reglas) no se vuelve a parsear.
+
+        Args:
+            ruta_pdf: Ruta del archivo PDF
+            huella: Hash de contenido del PDF, si ya se conoce
+            previo: Campos ya conocidos del PDF (del índice o de la caché de texto), si los había (ver _resolver)
+
+        Returns:
+            Diccionario con certificado, asunto (cada uno puede ser None), sin_texto
+            (True si ninguna página tiene texto extraíble), huella, tiempo_extraccion_s
+            y etapas (segundos de extracción de texto y de búsqueda)
+        """
+        inicio = time.perf_counter()
+        cronometro = CronometroEtapas()
+        huella = huella or self.cache.obtener_huella(ruta_pdf)
+
+        if previo is not None:
+            certificado, asunto, sin_texto = previo["certificado"], previo["asunto"], previo.get("sin_texto", False)
+        else:
+            certificado, asunto, sin_texto = self.buscar_campos(ruta_pdf, cronometro)
+
+        tiempo = time.perf_counter() - inicio
+        busqueda = cronometro.tiempos.get(BUSCAR, 0.0)
+        resultado = {
+            "certificado": certificado,
+            "asunto": asunto,
+            "sin_texto": sin_texto,
+            "huella": huella,
+            "tiempo_extraccion_s": tiempo,
+            # Lo que no fue buscar con los patrones fue obtener el texto (o la huella)
+            "etapas": {EXTRAER_TEXTO: tiempo - busqueda, BUSCAR: busqueda}
+        }
+        if previo is not None and not previo.get("desde_cache"):
+            resultado["desde_indice"] = True
+        return resultado
+
+    def buscar_campos(self, ruta_pdf: str, cronometro: CronometroEtapas = None) -> Tuple[str, str, bool]:
+        """
+        Extrae el certificado y el asunto de un PDF leyendo sus páginas una a una.
+
+        La lectura se detiene en cuanto ambos campos aparecen con sus patrones
+        principales. Las búsquedas de respaldo (sin etiqueta) solo se aplican
+        cuando se ha recorrido el documento completo. Si hay una región
+        configurada, antes se buscan ambos campos solo en esa parte de la
+        primera página.
+
+        Args:
+            ruta_pdf: Ruta del archivo PDF
+            cronometro: Si se indica, acumula en él el tiempo de búsqueda con los patrones
+
+        Returns:
+            Tuple con (certificado, asunto, sin_texto); certificado y asunto pueden ser None
+        """
+        cronometro = cronometro or CronometroEtapas()
+        if self.region_campos:
+            for encabezado in self.cache.iterar_paginas(ruta_pdf, self.region_campos):
+                with cronometro.medir(BUSCAR):
+                    certificado = self.extraer_certificado(encabezado, respaldo=False)
+                    asunto = self.extraer_asunto(encabezado, respaldo=False)
+                if certificado and asunto:
+                    return certificado, asunto, False
+                break
+
+        return self.buscar_campos_en_paginas(self.cache.iterar_paginas(ruta_pdf), cronometro)
+
+    def buscar_campos_en_paginas(self, paginas: Iterable[str],
+                                  cronometro: CronometroEtapas = None) -> Tuple[str, str, bool]:
+        """
+        Busca el certificado y el asunto en el texto de las páginas de un PDF, en orden.
+
+        Args:
+            paginas: Texto de cada página (puede ser perezoso: se deja de leer
+                en cuanto aparecen ambos campos)
+            cronometro: Si se indica, acumula en él el tiempo de búsqueda con los patrones
+
+        Returns:
+            Tuple con (certificado, asunto, sin_texto); certificado y asunto pueden ser None
+        """
+        cronometro = cronometro or CronometroEtapas()
+        certificado = None
+        asunto = None
+        leidas = []
+
+        for texto_pagina in paginas:
+            leidas.append(texto_pagina)
+            with cronometro.medir(BUSCAR):
+                if not certificado:
+                    certificado = self.extraer_certificado(texto_pagina, respaldo=False)
+                if not asunto:
+                    asunto = self.extraer_asunto(texto_pagina, respaldo=False)
+            if certificado and asunto:
+                return certificado, asunto, False
+
+        texto = "\n".join(leidas)
+        with cronometro.medir(BUSCAR):
+            if not certificado:
+                certificado = self.extraer_certificado(texto)
+            if not asunto:
+                asunto = self.extraer_asunto(texto)
+
+        return certificado, asunto, not texto.strip()
+
+    def extraer_certificado(self, texto: str, respaldo: bool = True) -> str:
+        """Extrae el número de certificado del texto de un PDF."""
+        certificado = obtener_motor(self.patrones_certificado).buscar(texto)
+        if certificado or not respaldo:
+            return certificado
+        
+        # Buscar directamente el formato E123456789-S
+        return obtener_motor(self.patrones_certificado_respaldo).buscar(texto)
+    
+    def extraer_asunto(self, texto: str, respaldo: bool = True) -> str:
+        """Extrae el número de asunto/atención del texto de un PDF."""
+        asunto = obtener_motor(self.patrones_asunto).buscar(texto)
+        if asunto or not respaldo:
+            return asunto
+        
+        # Buscar números de 5-8 dígitos después de "PACARIBE"
+        return obtener_motor(self.patrones_asunto_respaldo).buscar(texto)
\ No newline at end of file
@@ -0,0 +1,277 @@
+# clases/backend_pdf.py
+
+import os
+import importlib
+import importlib.util
+import threading
+from functools import lru_cache
+from io import BytesIO
+from typing import Iterator, Optional, Sequence, Tuple, Union
+
+from clases.entrada_pdf import FuentePDF, leer_bytes
+
+# PyMuPDF y PyPDF2 se importan la primera vez que se abre un PDF con ellos (ver
+# cargar_backend), no al importar este módulo. PyMuPDF es opcional: sin él se usa PyPDF2
+fitz = None
+PyPDF2 = None
+
+# Región de una página como fracciones de su tamaño (x0, y0, x1, y1), con el
+# origen en la esquina superior izquierda; (0, 0, 1, 1) es la página completa
+Region = Tuple[float, float, float, float]
+
+# Franja superior de la página, donde suelen estar los números de atención y de certificado
+REGION_ENCABEZADO: Region = (0.0, 0.0, 1.0, 0.3)
+
+BACKENDS = ("fitz", "pypdf2")
+
+# PyMuPDF no admite usar documentos desde varios hilos a la vez; en modo
+# "hilos" las llamadas a fitz de un mismo proceso se serializan
+_lock_fitz = threading.RLock()
+
+_MODULOS_BACKEND = {"fitz": "fitz", "pypdf2": "PyPDF2"}
+_lock_carga = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def fitz_disponible() -> bool:
+    """Indica si PyMuPDF está instalado, sin importarlo."""
+    return fitz is not None or importlib.util.find_spec("fitz") is not None
+
+
+def cargar_backend(backend: str):
+    """
+    Importa la librería de un backend de PDF si aún no se había importado.
+
+    Args:
+        backend: "fitz" o "pypdf2"
+
+    Returns:
+        El módulo de la librería
+    """
+    global fitz, PyPDF2
+    if backend not in _MODULOS_BACKEND:
+        raise ValueError(f"Backend de PDF no válido: {backend}")
+    with _lock_carga:
+        modulo = importlib.import_module(_MODULOS_BACKEND[backend])
+        if backend == "fitz":
+            fitz = modulo
+        else:
+            PyPDF2 = modulo
+    return modulo
+
+
+def backend_por_defecto() -> str:
+    """Devuelve el backend configurado en PACA_BACKEND_PDF ("fitz" si está instalado, si no "pypdf2")."""
+    backend = os.environ.get("PACA_BACKEND_PDF") or ("fitz" if fitz_disponible() else "pypdf2")
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de PDF no válido: {backend}")
+    if backend == "fitz" and not fitz_disponible():
+        print("⚠️ PyMuPDF no está instalado, se usa PyPDF2")
+        return "pypdf2"
+    return backend
+
+
+def parsear_region(valor: Optional[str]) -> Optional[Region]:
+    """
+    Convierte una región escrita como "x0,y0,x1,y1" (por ejemplo, en una variable de entorno).
+
+    Returns:
+        La región, o None si el valor está vacío
+    """
+    if not valor:
+        return None
+    partes = tuple(float(p) for p in valor.split(","))
+    if len(partes) != 4 or not all(0 <= p <= 1 for p in partes):
+        raise ValueError(f"Región no válida: {valor}")
+    return partes
+
+
+def abrir_pdf(fuente: Union[str, FuentePDF], backend: str = None) -> "DocumentoPDF":
+    """
+    Abre un PDF con el backend indicado o el configurado por defecto.
+
+    Args:
+        fuente: Ruta del archivo PDF o PDF en memoria
+        backend: "fitz" o "pypdf2"
+
+    Returns:
+        DocumentoPDF; se puede usar como gestor de contexto
+    """
+    backend = backend or backend_por_defecto()
+    if backend == "fitz":
+        return DocumentoFitz(fuente)
+    if backend == "pypdf2":
+        return DocumentoPyPDF2(fuente)
+    raise ValueError(f"Backend de PDF no válido: {backend}")
+
+
+class DocumentoPDF:
+    """Acceso común a un PDF abierto, independiente de la librería que lo lee."""
+
+    backend = None
+
+    @property
+    def num_paginas(self) -> int:
+        raise NotImplementedError
+
+    def texto_pagina(self, indice: int, region: Region = None) -> str:
+        """
+        Extrae el texto de una página.
+
+        Args:
+            indice: Número de página (desde 0)
+            region: Si se indica, solo se extrae el texto dentro de esa región
+
+        Returns:
+            Texto de la página (cadena vacía si no tiene texto)
+        """
+        raise NotImplementedError
+
+    def iterar_textos(self, desde: int = 0, region: Region = None) -> Iterator[str]:
+        """Devuelve el texto de cada página a partir de `desde`, extrayéndolo solo cuando se pide."""
+        for indice in range(desde, self.num_paginas):
+            yield self.texto_pagina(indice, region)
+
+    def renderizar(self, indice: int, region: Region = None, dpi: int = 150) -> bytes:
+        """
+        Renderiza una página (o solo una región) como imagen PNG en escala de grises.
+
+        Args:
+            indice: Número de página (desde 0)
+            region: Si se indica, solo se renderiza esa región
+            dpi: Resolución de la imagen
+
+        Returns:
+            Bytes de la imagen PNG
+        """
+        raise NotImplementedError(f"El backend {self.backend} no puede renderizar páginas")
+
+    def guardar_paginas(self, paginas: Sequence[int], ruta: str):
+        """
+        Guarda en un PDF nuevo las páginas indicadas, en ese orden.
+
+        Args:
+            paginas: Números de página (desde 0)
+            ruta: Ruta del PDF a crear
+        """
+        raise NotImplementedError
+
+    def cerrar(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.cerrar()
+
+
+class DocumentoFitz(DocumentoPDF):
+    """Backend PyMuPDF: extracción de texto en C, mucho más rápida que PyPDF2."""
+
+    backend = "fitz"
+
+    # Sin recolección de objetos ni compresión al guardar: es lo más rápido y el
+    # documento nuevo solo contiene las páginas copiadas
+    OPCIONES_GUARDADO = {"garbage": 0, "deflate": False}
+
+    def __init__(self, fuente: Union[str, FuentePDF]):
+        if fitz is None:
+            cargar_backend("fitz")
+        with _lock_fitz:
+            if isinstance(fuente, FuentePDF):
+                self._doc = fitz.open(stream=fuente.datos, filetype="pdf")
+            else:
+                self._doc = fitz.open(fuente)
+
+    @property
+    def num_paginas(self) -> int:
+        return self._doc.page_count
+
+    def texto_pagina(self, indice: int, region: Region = None) -> str:
+        with _lock_fitz:
+            pagina = self._doc.load_page(indice)
+            if region is None:
+                return pagina.get_text()
+            return pagina.get_text(clip=self._recorte(pagina, region))
+
+    def renderizar(self, indice: int, region: Region = None, dpi: int = 150) -> bytes:
+        with _lock_fitz:
+            pagina = self._doc.load_page(indice)
+            clip = self._recorte(pagina, region) if region is not None else None
+            return pagina.get_pixmap(dpi=dpi, clip=clip, colorspace=fitz.csGRAY).tobytes("png")
+
+    def guardar_paginas(self, paginas: Sequence[int], ruta: str):
+        with _lock_fitz, fitz.open() as destino:
+            # Las páginas consecutivas se copian de una vez
+            for inicio, fin in _tramos(paginas):
+                destino.insert_pdf(self._doc, from_page=inicio, to_page=fin)
+            destino.save(ruta, **self.OPCIONES_GUARDADO)
+
+    def cerrar(self):
+        with _lock_fitz:
+            self._doc.close()
+
+    @staticmethod
+    def _recorte(pagina, region: Region):
+        caja = pagina.rect
+        return fitz.Rect(caja.x0 + region[0] * caja.width, caja.y0 + region[1] * caja.height,
+                         caja.x0 + region[2] * caja.width, caja.y0 + region[3] * caja.height)
+
+
+class DocumentoPyPDF2(DocumentoPDF):
+    """Backend PyPDF2 (Python puro), de respaldo si PyMuPDF no está disponible."""
+
+    backend = "pypdf2"
+
+    def __init__(self, fuente: Union[str, FuentePDF]):
+        if PyPDF2 is None:
+            cargar_backend("pypdf2")
+        self._reader = PyPDF2.PdfReader(BytesIO(leer_bytes(fuente)))
+
+    @property
+    def num_paginas(self) -> int:
+        return len(self._reader.pages)
+
+    def texto_pagina(self, indice: int, region: Region = None) -> str:
+        pagina = self._reader.pages[indice]
+        if region is None:
+            return pagina.extract_text() or ""
+
+        # PyPDF2 no recorta por región: se filtran los fragmentos por su posición
+        caja = pagina.mediabox
+        ancho, alto = float(caja.width), float(caja.height)
+        izquierda, arriba = float(caja.left), float(caja.top)
+        partes = []
+
+        def visitar(texto, cm, tm, *_):
+            x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4]
+            y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+            relativa_x = (x - izquierda) / ancho
+            relativa_y = (arriba - y) / alto
+            if region[0] <= relativa_x <= region[2] and region[1] <= relativa_y <= region[3]:
+                partes.append(texto)
+
+        pagina.extract_text(visitor_text=visitar)
+        return "".join(partes)
+
+    def guardar_paginas(self, paginas: Sequence[int], ruta: str):
+        writer = PyPDF2.PdfWriter()
+        for indice in paginas:
+            writer.add_page(self._reader.pages[indice])
+        with open(ruta, "wb") as f:
+            writer.write(f)
+
+
+def _tramos(paginas: Sequence[int]) -> Iterator[Tuple[int, int]]:
+    """Agrupa números de página en tramos consecutivos (primera, última)."""
+    inicio = anterior = None
+    for pagina in paginas:
+        if inicio is None:
+            inicio = pagina
+        elif pagina != anterior + 1:
+            yield inicio, anterior
+            inicio = pagina
+        anterior = pagina
+    if inicio is not None:
+        yield inicio, anterior
@@ -0,0 +1,282 @@
+# clases/cache_texto.py
+
+import os
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from clases.backend_pdf import Region, abrir_pdf, backend_por_defecto
+from clases.entrada_pdf import FuentePDF, leer_bytes
+from clases.metricas import metricas
+
+
+class CacheTextoPDF:
+    """
+    Caché del texto extraído de archivos PDF.
+
+    Las entradas se indexan por el hash SHA-256 del contenido del archivo, de modo
+    que un mismo PDF subido de nuevo (aunque cambie de nombre) no se vuelve a parsear.
+    La caché está limitada en número de entradas y en caracteres almacenados, y
+    descarta primero las entradas usadas hace más tiempo (LRU) o caducadas.
+    El texto de una región de las páginas se guarda aparte del de las páginas completas.
+
+    Los workers de otros procesos usan una caché pequeña (obtener_cache_worker) y
+    devuelven con su resultado el texto que extrajeron (adjuntar), que el proceso
+    principal guarda en la suya (recoger): la caché que cuenta es una sola.
+    """
+
+    # Clave del resultado de un worker con el texto extraído (ver adjuntar y recoger)
+    CLAVE_TEXTO = "texto_cache"
+
+    def __init__(self, max_entradas: int = 4096, max_caracteres: int = 200_000_000,
+                 ttl_segundos: int = 24 * 60 * 60, backend: str = None):
+        """
+        Args:
+            max_entradas: Número máximo de documentos en caché
+            max_caracteres: Total máximo de caracteres de texto almacenados
+            ttl_segundos: Tiempo de vida de cada entrada
+            backend: Backend de PDF con el que se extrae el texto ("fitz" o "pypdf2")
+        """
+        self.backend = backend or backend_por_defecto()
+        self.max_entradas = max_entradas
+        self.max_caracteres = max_caracteres
+        self.ttl_segundos = ttl_segundos
+        self._entradas = OrderedDict()
+        self._huellas_conocidas = OrderedDict()
+        self._caracteres = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        # True en la caché de un worker de otro proceso (ver obtener_cache_worker)
+        self.en_worker = False
+
+    @staticmethod
+    def calcular_huella(datos: bytes) -> str:
+        """Calcula el hash de contenido usado como clave de la caché."""
+        return hashlib.sha256(datos).hexdigest()
+
+    def registrar_huella(self, ruta_pdf: Union[str, FuentePDF], huella: str):
+        """
+        Asocia a una ruta el hash de contenido ya calculado (por ejemplo, al recibir la subida).
+
+        Mientras el archivo no cambie, las búsquedas en caché para esa ruta no
+        necesitan leerlo ni volver a hashearlo. Un PDF en memoria guarda el hash
+        consigo.
+        """
+        if isinstance(ruta_pdf, FuentePDF):
+            ruta_pdf.huella = huella
+            return
+        estado = os.stat(ruta_pdf)
+        with self._lock:
+            self._huellas_conocidas[ruta_pdf] = (estado.st_size, estado.st_mtime_ns, huella)
+            self._huellas_conocidas.move_to_end(ruta_pdf)
+            while len(self._huellas_conocidas) > self.max_entradas:
+                self._huellas_conocidas.popitem(last=False)
+
+    def obtener_huella(self, ruta_pdf: Union[str, FuentePDF]) -> str:
+        """
+        Devuelve el hash de contenido de un PDF, sin leerlo si ya estaba registrado.
+
+        El hash calculado para una ruta se registra, así que la búsqueda en caché
+        posterior no vuelve a hashear el archivo.
+        """
+        huella = self._huella_registrada(ruta_pdf)
+        if huella is None:
+            huella = self.calcular_huella(leer_bytes(ruta_pdf))
+            self.registrar_huella(ruta_pdf, huella)
+        return huella
+
+    def contiene(self, huella: str, region: Region = None, paginas: Optional[int] = None) -> bool:
+        """
+        Indica si el texto de un PDF está en caché, sin contarlo como acierto ni fallo.
+
+        Args:
+            huella: Hash de contenido del PDF
+            region: Región de las páginas (None para las páginas completas)
+            paginas: Basta con las primeras `paginas` páginas; None exige el documento completo
+        """
+        with self._lock:
+            entrada = self._entradas.get(self._clave(huella, region))
+        if entrada is None or time.monotonic() - entrada[0] > self.ttl_segundos:
+            return False
+        _, textos, completo = entrada
+        return completo or (paginas is not None and len(textos) >= paginas)
+
+    def paginas_en_cache(self, huella: str, region: Region = None) -> Tuple[Tuple[str, ...], bool]:
+        """
+        Devuelve las páginas de un PDF que ya están en caché, sin leer el archivo.
+
+        Returns:
+            Tuple con (texto de las primeras páginas extraídas, True si están todas)
+        """
+        return self._buscar(self._clave(huella, region))
+
+    def adjuntar(self, resultado: Dict, huella: str) -> Dict:
+        """Añade al resultado de un worker el texto que extrajo del PDF (páginas y regiones)."""
+        with self._lock:
+            resultado[self.CLAVE_TEXTO] = {
+                clave: (textos, completo) for clave, (_, textos, completo) in self._entradas.items()
+                if clave == huella or clave.startswith(f"{huella}@")}
+        return resultado
+
+    def recoger(self, resultado: Optional[Dict]) -> Optional[Dict]:
+        """Guarda el texto adjuntado por un worker a su resultado (ver adjuntar) y lo quita del resultado."""
+        if resultado is not None:
+            for clave, (textos, completo) in resultado.pop(self.CLAVE_TEXTO, {}).items():
+                self._guardar(clave, list(textos), completo)
+        return resultado
+
+    def iterar_paginas(self, ruta_pdf: Union[str, FuentePDF], region: Region = None) -> Iterator[str]:
+        """
+        Devuelve el texto del PDF página a página, extrayendo cada página solo cuando se pide.
+
+        Si el consumidor deja de iterar (por ejemplo, porque ya encontró lo que buscaba)
+        no se extraen las páginas restantes. Las páginas ya extraídas se guardan en
+        caché y una iteración posterior continúa desde donde se quedó la anterior.
+
+        Args:
+            ruta_pdf: Ruta del archivo PDF o PDF en memoria
+            region: Si se indica, solo se extrae el texto de esa región de cada página
+
+        Yields:
+            Texto de cada página, en orden
+        """
+        datos = None
+        huella = self._huella_registrada(ruta_pdf)
+        if huella is None:
+            datos = leer_bytes(ruta_pdf)
+            huella = self.calcular_huella(datos)
+        clave = self._clave(huella, region)
+
+        paginas, completo = self._buscar(clave)
+        for texto in paginas:
+            yield texto
+        if completo:
+            return
+
+        fuente = ruta_pdf if datos is None else FuentePDF(getattr(ruta_pdf, "nombre", ruta_pdf), datos)
+        paginas = list(paginas)
+        completo = False
+        try:
+            with abrir_pdf(fuente, self.backend) as documento:
+                for texto in documento.iterar_textos(len(paginas), region):
+                    paginas.append(texto)
+                    yield texto
+            completo = True
+        finally:
+            # También se guarda lo extraído si el consumidor abandona la iteración
+            self._guardar(clave, paginas, completo)
+
+    def obtener_paginas(self, ruta_pdf: Union[str, FuentePDF]) -> List[str]:
+        """
+        Devuelve el texto de cada página del PDF, parseándolo solo si no está en caché.
+
+        Args:
+            ruta_pdf: Ruta del archivo PDF o PDF en memoria
+
+        Returns:
+            Lista con el texto de cada página
+        """
+        return list(self.iterar_paginas(ruta_pdf))
+
+    def obtener_texto(self, ruta_pdf: Union[str, FuentePDF]) -> str:
+        """Devuelve el texto completo del PDF (páginas separadas por saltos de línea)."""
+        return "\n".join(self.obtener_paginas(ruta_pdf))
+
+    def limpiar(self):
+        """Vacía la caché."""
+        with self._lock:
+            self._entradas.clear()
+            self._huellas_conocidas.clear()
+            self._caracteres = 0
+
+    @staticmethod
+    def _clave(huella: str, region: Region) -> str:
+        return huella if region is None else f"{huella}@{region}"
+
+    def _huella_registrada(self, ruta_pdf: Union[str, FuentePDF]) -> Optional[str]:
+        if isinstance(ruta_pdf, FuentePDF):
+            return ruta_pdf.huella
+        with self._lock:
+            conocida = self._huellas_conocidas.get(ruta_pdf)
+        if conocida is None:
+            return None
+
+        try:
+            estado = os.stat(ruta_pdf)
+        except OSError:
+            return None
+        tamano, modificacion, huella = conocida
+        if (estado.st_size, estado.st_mtime_ns) != (tamano, modificacion):
+            return None
+        return huella
+
+    def _buscar(self, huella: str) -> Tuple[Tuple[str, ...], bool]:
+        with self._lock:
+            entrada = self._entradas.get(huella)
+            if entrada is None:
+                self.fallos += 1
+                return (), False
+
+            instante, paginas, completo = entrada
+            if time.monotonic() - instante > self.ttl_segundos:
+                self._eliminar(huella)
+                self.fallos += 1
+                return (), False
+
+            self._entradas.move_to_end(huella)
+            self.aciertos += 1
+            return paginas, completo
+
+    def _guardar(self, huella: str, paginas: List[str], completo: bool):
+        tamano = sum(len(p) for p in paginas)
+        if not paginas or tamano > self.max_caracteres:
+            return
+
+        with self._lock:
+            existente = self._entradas.get(huella)
+            if existente is not None:
+                # No sustituir una entrada más completa por una parcial
+                if existente[2] or len(existente[1]) >= len(paginas):
+                    return
+                self._eliminar(huella)
+
+            self._entradas[huella] = (time.monotonic(), tuple(paginas), completo)
+            self._caracteres += tamano
+
+            # Desalojar las entradas menos usadas hasta respetar los límites
+            while (len(self._entradas) > self.max_entradas
+                   or self._caracteres > self.max_caracteres):
+                self._eliminar(next(iter(self._entradas)))
+
+    def _eliminar(self, huella: str):
+        _, paginas, _ = self._entradas.pop(huella)
+        self._caracteres -= sum(len(p) for p in paginas)
+
+
+# Caché compartida por todos los procesadores del proceso
+cache_texto = CacheTextoPDF()
+metricas.registrar_sonda("paca_cache_texto_aciertos_total", lambda: cache_texto.aciertos)
+metricas.registrar_sonda("paca_cache_texto_fallos_total", lambda: cache_texto.fallos)
+
+_cache_worker = None
+_lock_cache_worker = threading.Lock()
+
+
+def obtener_cache_worker() -> CacheTextoPDF:
+    """
+    Devuelve la caché de los workers de otros procesos, creándola la primera vez.
+
+    Solo retiene el texto de los PDF que el worker está analizando: el texto vuelve
+    con el resultado a la caché del proceso principal, así que no se multiplica la
+    memoria por el número de workers. Tamaño con PACA_CACHE_WORKER_CARACTERES.
+    """
+    global _cache_worker
+    with _lock_cache_worker:
+        if _cache_worker is None:
+            _cache_worker = CacheTextoPDF(
+                max_entradas=64, max_caracteres=int(os.environ.get("PACA_CACHE_WORKER_CARACTERES", 20_000_000)))
+            _cache_worker.en_worker = True
+        return _cache_worker
@@ -0,0 +1,115 @@
+# clases/carga_diferida.py
+
+import os
+import time
+import importlib
+import threading
+from typing import Dict, Iterable, List, Optional
+
+
+class ProcesadorNoDisponible(Exception):
+    """No se pudo importar el módulo de un procesador o alguna de sus dependencias."""
+
+
+# Clase que atiende cada tipo de procesamiento: (módulo, nombre de la clase)
+PROCESADORES = {
+    "procesar_docx": ("clases.procesador", "ProcesadorCartas"),
+    "procesar_pdfs": ("clases.procesador_lleida", "ProcesadorPDF"),
+    "procesar_certificados": ("clases.ExtractorCertificados", "ExtractorCertificadosLleida"),
+    "procesar_documentos": ("clases.enrutador", "EnrutadorDocumentos"),
+}
+
+_clases = {}
+_tiempos_carga = {}
+_lock = threading.Lock()
+
+
+def cargar_procesador(nombre: str) -> type:
+    """
+    Devuelve la clase de un procesador, importando su módulo la primera vez que se pide.
+
+    Así la aplicación arranca sin cargar PyMuPDF, PyPDF2 ni el resto de
+    dependencias de los procesadores, y si una de ellas falta solo deja de
+    funcionar el endpoint que la usa.
+
+    Args:
+        nombre: Clave de PROCESADORES
+
+    Returns:
+        La clase del procesador
+
+    Raises:
+        ProcesadorNoDisponible: Si el módulo o alguna de sus dependencias no se puede importar
+    """
+    with _lock:
+        clase = _clases.get(nombre)
+        if clase is not None:
+            return clase
+
+        modulo, atributo = PROCESADORES[nombre]
+        inicio = time.perf_counter()
+        try:
+            clase = getattr(importlib.import_module(modulo), atributo)
+        except ImportError as e:
+            raise ProcesadorNoDisponible(f"El procesador {nombre} no está disponible: {e}") from e
+        _tiempos_carga[nombre] = round(time.perf_counter() - inicio, 3)
+        _clases[nombre] = clase
+        return clase
+
+
+def procesadores_a_precargar() -> List[str]:
+    """
+    Procesadores indicados en PACA_PRECARGA: "todos", o nombres separados por comas.
+
+    Por defecto no se precarga ninguno.
+    """
+    valor = os.environ.get("PACA_PRECARGA", "").strip()
+    if not valor:
+        return []
+    if valor == "todos":
+        return list(PROCESADORES)
+
+    nombres = [nombre.strip() for nombre in valor.split(",") if nombre.strip()]
+    for nombre in nombres:
+        if nombre not in PROCESADORES:
+            raise ValueError(f"Procesador no válido en PACA_PRECARGA: {nombre}. "
+                             f"Disponibles: {', '.join(PROCESADORES)}")
+    return nombres
+
+
+def precargar(nombres: Iterable[str] = None) -> Dict[str, Optional[str]]:
+    """
+    Importa y prepara los procesadores por adelantado, por ejemplo al arrancar el servidor.
+
+    Además del módulo, cada procesador carga su librería de PDF, compila sus
+    patrones, etc. (método precalentar). Un procesador que falla no impide
+    precargar los demás.
+
+    Args:
+        nombres: Procesadores a precargar; por defecto, los de PACA_PRECARGA
+
+    Returns:
+        Dict con el error de cada procesador, o None si se precargó bien
+    """
+    if nombres is None:
+        nombres = procesadores_a_precargar()
+
+    errores = {}
+    for nombre in nombres:
+        try:
+            clase = cargar_procesador(nombre)
+            inicio = time.perf_counter()
+            clase.precalentar()
+            with _lock:
+                _tiempos_carga[nombre] = round(_tiempos_carga[nombre] + time.perf_counter() - inicio, 3)
+            errores[nombre] = None
+        except Exception as e:
+            print(f"⚠️ No se pudo precargar {nombre}: {str(e)}")
+            errores[nombre] = str(e)
+    return errores
+
+
+def tiempos_carga() -> Dict[str, float]:
+    """Segundos que costó cargar (y precalentar, si se hizo) cada procesador ya cargado."""
+    with _lock:
+        return dict(_tiempos_carga)
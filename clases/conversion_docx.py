@@ -0,0 +1,379 @@
+# clases/conversion_docx.py
+
+import os
+import sys
+import time
+import queue
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+from pathlib import Path
+
+from clases.metricas import metricas
+
+
+class ErrorConversion(Exception):
+    """Se lanza cuando no se puede convertir un DOCX a PDF."""
+
+
+class ColaConversionLlena(ErrorConversion):
+    """Se lanza cuando hay demasiadas conversiones pendientes."""
+
+
+class InstanciaLibreOffice:
+    """
+    Proceso de LibreOffice que queda escuchando (soffice --accept) y convierte por UNO.
+
+    Arrancar soffice cuesta más que convertir un documento corriente, así que cada
+    worker del conversor mantiene el suyo entre conversiones. Si una conversión
+    falla o supera el tiempo máximo, el proceso se mata y se arranca otro en la
+    siguiente. Necesita el módulo `uno` de LibreOffice (paquete python3-uno).
+    """
+
+    def __init__(self, soffice: str, perfil: Path, nombre: str, timeout: float):
+        """
+        Args:
+            soffice: Ejecutable de LibreOffice
+            perfil: Perfil (UserInstallation) de esta instancia
+            nombre: Nombre de la tubería en la que escucha
+            timeout: Segundos máximos para arrancar y para cada conversión
+        """
+        self.soffice = soffice
+        self.perfil = perfil
+        self.nombre = nombre
+        self.timeout = timeout
+        self._proceso = None
+        self._escritorio = None
+
+    @staticmethod
+    def disponible() -> bool:
+        """Indica si se puede hablar con LibreOffice por UNO desde este intérprete."""
+        try:
+            import uno  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def convertir(self, ruta_docx: str, ruta_pdf: str):
+        """
+        Convierte un DOCX a PDF en el proceso en escucha, arrancándolo si hace falta.
+
+        Raises:
+            ErrorConversion: Si la conversión falla o supera el tiempo máximo
+        """
+        import uno
+        from com.sun.star.beans import PropertyValue
+
+        def propiedad(nombre, valor):
+            p = PropertyValue()
+            p.Name, p.Value = nombre, valor
+            return p
+
+        proceso = self._proceso
+        if self._escritorio is None or proceso is None or proceso.poll() is not None:
+            self._arrancar()
+
+        # Una conversión colgada no devuelve nunca: al matar el proceso la llamada UNO falla
+        vencido = threading.Event()
+
+        def vencer():
+            vencido.set()
+            self.detener()
+
+        vigilante = threading.Timer(self.timeout, vencer)
+        vigilante.start()
+        documento = None
+        try:
+            documento = self._escritorio.loadComponentFromURL(
+                uno.systemPathToFileUrl(os.path.abspath(ruta_docx)), "_blank", 0,
+                (propiedad("Hidden", True), propiedad("ReadOnly", True)))
+            if documento is None:
+                raise ErrorConversion("LibreOffice no pudo abrir el documento")
+            documento.storeToURL(uno.systemPathToFileUrl(os.path.abspath(ruta_pdf)),
+                                 (propiedad("FilterName", "writer_pdf_Export"),))
+        except Exception as e:
+            self.detener()
+            if vencido.is_set():
+                raise ErrorConversion(f"La conversión superó el tiempo máximo de {self.timeout:.0f} s")
+            if isinstance(e, ErrorConversion):
+                raise
+            raise ErrorConversion(f"LibreOffice falló: {e}")
+        finally:
+            vigilante.cancel()
+        try:
+            documento.close(True)
+        except Exception:
+            # El PDF ya está escrito; la instancia se rehace en la siguiente conversión
+            self.detener()
+
+    def detener(self):
+        """Cierra el proceso de LibreOffice (se vuelve a arrancar en la siguiente conversión)."""
+        self._escritorio = None
+        proceso, self._proceso = self._proceso, None
+        if proceso is not None and proceso.poll() is None:
+            proceso.kill()
+            proceso.wait()
+
+    def _arrancar(self):
+        import uno
+
+        self.detener()
+        conexion = f"pipe,name={self.nombre};urp;StarOffice.ComponentContext"
+        self._proceso = subprocess.Popen(
+            [self.soffice, f"-env:UserInstallation={self.perfil.as_uri()}",
+             "--headless", "--invisible", "--norestore", "--nolockcheck", "--nodefault", "--nologo",
+             f"--accept={conexion}"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        local = uno.getComponentContext()
+        resolvedor = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        limite = time.monotonic() + self.timeout
+        while True:
+            try:
+                contexto = resolvedor.resolve(f"uno:{conexion}")
+                break
+            except Exception:
+                if self._proceso.poll() is not None or time.monotonic() > limite:
+                    self.detener()
+                    raise ErrorConversion("No se pudo arrancar LibreOffice en modo escucha")
+                time.sleep(0.2)
+        self._escritorio = contexto.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", contexto)
+
+
+class ConversorDocx:
+    """
+    Pool de conversión DOCX → PDF con LibreOffice en modo headless.
+
+    Cada worker mantiene un proceso de LibreOffice en escucha (InstanciaLibreOffice)
+    y le envía las conversiones, así que soffice arranca una vez por worker y no
+    una vez por documento; si la instancia falla o se cuelga, se rehace. Sin el
+    módulo `uno`, o con PACA_SOFFICE_PERSISTENTE=0, cada conversión lanza soffice
+    --convert-to. Cada worker tiene su propio perfil de LibreOffice
+    (UserInstallation) que se conserva entre conversiones, y workers distintos no
+    se bloquean entre sí por compartir perfil. Las peticiones entran en una cola acotada y cada
+    conversión tiene un tiempo máximo. Los PDF generados se guardan en una caché
+    en disco indexada por el hash del DOCX, así que un mismo documento subido
+    otra vez no se vuelve a convertir.
+
+    Si no hay LibreOffice instalado y la plataforma es Windows, se usa docx2pdf (Word).
+
+    Configuración por variables de entorno: PACA_SOFFICE, PACA_SOFFICE_PERSISTENTE, PACA_CONVERSION_WORKERS,
+    PACA_CONVERSION_MAX_COLA, PACA_CONVERSION_TIMEOUT, PACA_DIR_CACHE_PDF y
+    PACA_CACHE_PDF_MAX_BYTES.
+    """
+
+    def __init__(self, num_workers: int = None, max_cola: int = None, timeout: float = None,
+                 directorio: str = None, max_bytes_cache: int = None):
+        """
+        Args:
+            num_workers: Conversiones simultáneas
+            max_cola: Conversiones pendientes admitidas antes de rechazar
+            timeout: Segundos máximos por conversión
+            directorio: Directorio de la caché de PDF y de los perfiles de LibreOffice
+            max_bytes_cache: Tamaño máximo de la caché de PDF
+        """
+        self.soffice = os.environ.get("PACA_SOFFICE") or shutil.which("soffice") or shutil.which("libreoffice")
+        self.num_workers = num_workers or int(os.environ.get("PACA_CONVERSION_WORKERS", 2))
+        self.max_cola = max_cola or int(os.environ.get("PACA_CONVERSION_MAX_COLA", 20))
+        self.timeout = timeout or float(os.environ.get("PACA_CONVERSION_TIMEOUT", 300))
+        self.directorio = directorio or os.environ.get(
+            "PACA_DIR_CACHE_PDF", os.path.join(tempfile.gettempdir(), "paca_conversion"))
+        self.max_bytes_cache = max_bytes_cache or int(os.environ.get("PACA_CACHE_PDF_MAX_BYTES", 2 * 1024 ** 3))
+        self.persistente = (os.environ.get("PACA_SOFFICE_PERSISTENTE", "1") != "0"
+                            and InstanciaLibreOffice.disponible())
+
+        self._directorio_cache = os.path.join(self.directorio, "pdf")
+        os.makedirs(self._directorio_cache, exist_ok=True)
+        self._cola = queue.Queue(maxsize=self.max_cola)
+        self._hilos = []
+        self._instancias = []
+        self._lock = threading.Lock()
+
+    @property
+    def en_cola(self) -> int:
+        """Conversiones encoladas que aún no ha empezado ningún worker."""
+        return self._cola.qsize()
+
+    def convertir(self, ruta_docx: str, ruta_pdf: str = None) -> str:
+        """
+        Convierte un DOCX a PDF, usando la caché si el documento ya se convirtió antes.
+
+        Args:
+            ruta_docx: Ruta del DOCX
+            ruta_pdf: Ruta del PDF de salida (por defecto, la del DOCX con extensión .pdf)
+
+        Returns:
+            Ruta del PDF generado
+
+        Raises:
+            ColaConversionLlena: Si la cola de conversiones está llena
+            ErrorConversion: Si la conversión falla o supera el tiempo máximo
+        """
+        ruta_pdf = ruta_pdf or str(Path(ruta_docx).with_suffix(".pdf"))
+        huella = self._calcular_huella(ruta_docx)
+        en_cache = os.path.join(self._directorio_cache, f"{huella}.pdf")
+        if self._copiar_de_cache(en_cache, ruta_pdf):
+            return ruta_pdf
+
+        # El worker deja el PDF en ruta_pdf antes de limpiar la caché, que podría desalojarlo
+        futuro = Future()
+        self._iniciar_workers()
+        try:
+            self._cola.put_nowait((ruta_docx, ruta_pdf, en_cache, futuro))
+        except queue.Full:
+            raise ColaConversionLlena("Hay demasiadas conversiones pendientes, inténtelo más tarde")
+
+        try:
+            # Margen para el tiempo de espera en cola
+            futuro.result(timeout=self.timeout * (1 + self._cola.qsize()))
+        except FuturesTimeoutError:
+            futuro.cancel()
+            raise ErrorConversion("La conversión no terminó a tiempo")
+
+        return ruta_pdf
+
+    @staticmethod
+    def _copiar_de_cache(en_cache: str, ruta_pdf: str) -> bool:
+        """
+        Copia un PDF de la caché a ruta_pdf, marcándolo como usado recientemente para el desalojo.
+
+        Returns:
+            False si el PDF no está en la caché (o se acaba de desalojar)
+        """
+        try:
+            os.utime(en_cache)
+            shutil.copyfile(en_cache, ruta_pdf)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _calcular_huella(ruta: str) -> str:
+        hash_contenido = hashlib.sha256()
+        with open(ruta, "rb") as f:
+            for bloque in iter(lambda: f.read(1024 * 1024), b""):
+                hash_contenido.update(bloque)
+        return hash_contenido.hexdigest()
+
+    def _iniciar_workers(self):
+        with self._lock:
+            if self._hilos:
+                return
+            for i in range(self.num_workers):
+                hilo = threading.Thread(target=self._atender_cola, args=(i,), name=f"conversion-{i}", daemon=True)
+                hilo.start()
+                self._hilos.append(hilo)
+
+    def cerrar(self):
+        """Cierra los procesos de LibreOffice en escucha (al apagar el servidor)."""
+        with self._lock:
+            instancias = list(self._instancias)
+        for instancia in instancias:
+            instancia.detener()
+
+    def _atender_cola(self, numero_worker: int):
+        perfil = Path(self.directorio, "perfiles", f"worker_{numero_worker}").resolve()
+        instancia = None
+        if self.soffice and self.persistente:
+            instancia = InstanciaLibreOffice(self.soffice, perfil, f"paca_{os.getpid()}_{numero_worker}", self.timeout)
+            with self._lock:
+                self._instancias.append(instancia)
+        while True:
+            ruta_docx, ruta_pdf, en_cache, futuro = self._cola.get()
+            try:
+                if not futuro.set_running_or_notify_cancel():
+                    continue
+                # Otro worker pudo convertir el mismo documento mientras esperaba
+                if not self._copiar_de_cache(en_cache, ruta_pdf):
+                    self._convertir_a_cache(ruta_docx, ruta_pdf, en_cache, perfil, instancia)
+                futuro.set_result(ruta_pdf)
+            except Exception as e:
+                futuro.set_exception(e)
+            finally:
+                self._cola.task_done()
+
+    def _convertir_a_cache(self, ruta_docx: str, ruta_pdf: str, en_cache: str, perfil: Path,
+                           instancia: InstanciaLibreOffice = None):
+        """Convierte un DOCX, copia el PDF a ruta_pdf y lo guarda en la caché antes de limpiarla."""
+        with tempfile.TemporaryDirectory(dir=self.directorio) as salida:
+            if instancia is not None:
+                instancia.convertir(ruta_docx, os.path.join(salida, Path(ruta_docx).with_suffix(".pdf").name))
+            elif self.soffice:
+                self._convertir_soffice(ruta_docx, salida, perfil)
+            elif sys.platform == "win32":
+                from docx2pdf import convert
+                convert(ruta_docx, salida)
+            else:
+                raise ErrorConversion("No se encontró LibreOffice (soffice) para convertir el DOCX")
+
+            generado = os.path.join(salida, Path(ruta_docx).with_suffix(".pdf").name)
+            if not os.path.exists(generado):
+                raise ErrorConversion("❌ No se generó el archivo PDF.")
+            # La copia del llamador sale del directorio temporal: la limpieza de la
+            # caché (de este u otro worker) puede desalojar en_cache en cualquier momento
+            shutil.copyfile(generado, ruta_pdf)
+
+            # Escritura atómica: otro worker puede estar leyendo la caché
+            temporal = f"{en_cache}.{threading.get_ident()}.tmp"
+            shutil.move(generado, temporal)
+            os.replace(temporal, en_cache)
+
+        self._limpiar_cache()
+
+    def _convertir_soffice(self, ruta_docx: str, salida: str, perfil: Path):
+        comando = [
+            self.soffice, f"-env:UserInstallation={perfil.as_uri()}",
+            "--headless", "--norestore", "--nolockcheck", "--nodefault",
+            "--convert-to", "pdf", "--outdir", salida, os.path.abspath(ruta_docx)
+        ]
+        try:
+            subprocess.run(comando, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                           timeout=self.timeout, check=True)
+        except subprocess.TimeoutExpired:
+            raise ErrorConversion(f"La conversión superó el tiempo máximo de {self.timeout:.0f} s")
+        except subprocess.CalledProcessError as e:
+            raise ErrorConversion(f"LibreOffice falló: {e.stderr.decode(errors='replace').strip()}")
+
+    def _limpiar_cache(self):
+        """Elimina los PDF usados hace más tiempo hasta respetar el tamaño máximo de la caché."""
+        with self._lock:
+            archivos = []
+            for entrada in os.scandir(self._directorio_cache):
+                if entrada.name.endswith(".pdf"):
+                    estado = entrada.stat()
+                    archivos.append((estado.st_mtime, estado.st_size, entrada.path))
+
+            total = sum(tamano for _, tamano, _ in archivos)
+            for _, tamano, ruta in sorted(archivos):
+                if total <= self.max_bytes_cache:
+                    break
+                try:
+                    os.remove(ruta)
+                    total -= tamano
+                except OSError:
+                    pass
+
+
+_conversor = None
+_lock_conversor = threading.Lock()
+
+
+def obtener_conversor() -> ConversorDocx:
+    """Devuelve el conversor compartido por todo el proceso, creándolo la primera vez."""
+    global _conversor
+    with _lock_conversor:
+        if _conversor is None:
+            _conversor = ConversorDocx()
+            metricas.registrar_sonda("paca_conversion_en_cola", lambda: _conversor.en_cola)
+        return _conversor
+
+
+def cerrar_conversor():
+    """Cierra los procesos de LibreOffice del conversor compartido, si se llegó a crear."""
+    with _lock_conversor:
+        conversor = _conversor
+    if conversor is not None:
+        conversor.cerrar()
@@ -0,0 +1,286 @@
+# clases/ejecutor.py
+
+import os
+import threading
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from clases.metricas import metricas, perfilando
+
+
+def _ejecutar_lote(funcion: Callable, lote: List[Tuple[int, object]]) -> List[Tuple[int, object, Optional[str]]]:
+    """
+    Ejecuta un lote de elementos dentro de un mismo worker.
+
+    Los errores se capturan por elemento para que un archivo defectuoso no
+    invalide el resto del lote.
+    """
+    resultados = []
+    for indice, elemento in lote:
+        try:
+            resultados.append((indice, funcion(elemento), None))
+        except Exception as e:
+            resultados.append((indice, None, str(e)))
+    return resultados
+
+
+# Módulos que el servidor de procesos importa una vez, para que cada worker no tenga que hacerlo
+MODULOS_PRECARGA = ["clases.procesador_lleida", "clases.ExtractorCertificados", "clases.enrutador",
+                    "clases.procesador", "clases.ocr"]
+
+
+def contexto_procesos() -> multiprocessing.context.BaseContext:
+    """
+    Contexto con el que se arrancan los workers de los pools de procesos.
+
+    Los pools se crean (y se rehacen si se rompen) bajo demanda, desde el hilo de
+    una petición mientras otros hilos pueden tener tomados locks (métricas, SQLite,
+    cachés...); un fork copiaría esos locks tomados en los workers. Con "forkserver"
+    los workers salen de un proceso servidor sin hilos, y con "spawn" donde no existe.
+    PACA_INICIO_PROCESOS permite elegir otro método.
+    """
+    metodo = os.environ.get("PACA_INICIO_PROCESOS") or (
+        "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+    contexto = multiprocessing.get_context(metodo)
+    if metodo == "forkserver":
+        contexto.set_forkserver_preload(MODULOS_PRECARGA)
+    return contexto
+
+
+# Pools compartidos por todo el proceso, por (modo, número de workers)
+_pools = {}
+_lock_pools = threading.Lock()
+
+
+def obtener_pool(modo: str, max_workers: int) -> concurrent.futures.Executor:
+    """
+    Devuelve el pool compartido del modo ("procesos" o "hilos"), creándolo la primera vez.
+
+    Todas las peticiones y trabajos reparten sus lotes en el mismo pool, así que
+    el número de procesos o hilos de trabajo no crece con la concurrencia, y los
+    workers se reutilizan en lugar de arrancarse en cada llamada.
+    """
+    with _lock_pools:
+        pool = _pools.get((modo, max_workers))
+        if pool is None:
+            if modo == "hilos":
+                pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                             thread_name_prefix="ejecutor")
+            else:
+                pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers,
+                                                              mp_context=contexto_procesos())
+            _pools[(modo, max_workers)] = pool
+        return pool
+
+
+def _descartar_pool(modo: str, max_workers: int, pool: concurrent.futures.Executor):
+    """Retira un pool roto (un worker murió) para que la siguiente llamada cree otro."""
+    with _lock_pools:
+        if _pools.get((modo, max_workers)) is pool:
+            del _pools[(modo, max_workers)]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def procesos_workers() -> List[int]:
+    """PIDs de los workers vivos de los pools de procesos (para medir su memoria)."""
+    with _lock_pools:
+        pools = [pool for (modo, _), pool in _pools.items() if modo == "procesos"]
+    return [pid for pool in pools for pid in list(getattr(pool, "_processes", None) or {})]
+
+
+def cerrar_pools():
+    """Cierra los pools compartidos (al apagar el servidor)."""
+    with _lock_pools:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class EjecutorTareas:
+    """
+    Ejecuta una función sobre una lista de elementos con el backend configurado.
+
+    Modos disponibles:
+        - "procesos": ProcessPoolExecutor; los elementos se envían en lotes y cada
+          worker devuelve solo el resultado (no documentos PDF abiertos). Escala con el
+          número de núcleos porque no comparte el GIL.
+        - "hilos": ThreadPoolExecutor, útil cuando el trabajo es de E/S.
+        - "secuencial": ejecuta todo en el hilo actual (depuración y lotes pequeños).
+
+    Los pools de procesos e hilos se comparten entre todas las instancias (ver
+    obtener_pool): cada llamada a mapear() limita sus lotes en vuelo, y el total de
+    workers lo fija el pool, no el número de peticiones simultáneas.
+
+    El modo y el número de workers se pueden fijar con las variables de entorno
+    PACA_EJECUTOR y PACA_WORKERS, y el arranque de los procesos con
+    PACA_INICIO_PROCESOS (ver contexto_procesos).
+    """
+
+    MODOS = ("procesos", "hilos", "secuencial")
+
+    def __init__(self, modo: str = None, max_workers: int = None, tamano_lote: int = None):
+        """
+        Args:
+            modo: "procesos", "hilos" o "secuencial"
+            max_workers: Número de workers del pool
+            tamano_lote: Elementos enviados juntos a cada worker en modo "procesos"
+        """
+        self.modo = modo or os.environ.get("PACA_EJECUTOR", "procesos")
+        if self.modo not in self.MODOS:
+            raise ValueError(f"Modo de ejecución no válido: {self.modo}")
+
+        if max_workers is None:
+            max_workers = int(os.environ.get("PACA_WORKERS", "0")) or os.cpu_count() or 4
+            if self.modo == "hilos":
+                max_workers = min(32, max_workers + 4)
+        self.max_workers = max_workers
+        self.tamano_lote = tamano_lote
+
+    def mapear(self, funcion: Callable, elementos: Iterable, ordenado: bool = False,
+               resolver: Callable[[object], Tuple[bool, object]] = None) -> Iterator[Tuple[int, object, Optional[str]]]:
+        """
+        Aplica la función a cada elemento y entrega los resultados a medida que terminan.
+
+        Los elementos pueden venir de un generador: se envían a los workers a medida
+        que se producen, con un máximo de lotes en vuelo para acotar la memoria.
+        En modo "procesos" la función y los elementos deben poder serializarse con pickle.
+
+        Args:
+            funcion: Función a aplicar a cada elemento
+            elementos: Elementos a procesar (secuencia o iterable)
+            ordenado: Entregar los resultados en el orden de los elementos; se espera
+                siempre al lote más antiguo, así que la memoria sigue acotada
+            resolver: Función opcional que se aplica antes a cada elemento en este
+                proceso (p. ej. consultar una caché); devuelve (True, resultado) si ya
+                lo resuelve, o (False, elemento_para_la_función) si hay que enviarlo
+
+        Yields:
+            Tuple con (índice_del_elemento, resultado, error); error es None si no falló
+        """
+        modo = self.modo
+        # En una petición perfilada todo se ejecuta en este hilo, para que entre en el perfil
+        if self.max_workers <= 1 or perfilando() or (hasattr(elementos, "__len__") and len(elementos) <= 1):
+            modo = "secuencial"
+
+        indexados = enumerate(elementos)
+
+        if modo == "secuencial":
+            for indice, elemento in indexados:
+                resueltos, elemento = _resolver(resolver, indice, elemento)
+                yield from resueltos or _ejecutar_lote(funcion, [(indice, elemento)])
+            return
+
+        pool = obtener_pool(modo, self.max_workers)
+        tamano = 1 if modo == "hilos" else self._tamano_lote(elementos)
+
+        max_en_vuelo = self.max_workers * 2
+        pendientes = {}
+        # Resultados ya resueltos en este proceso, como futuros terminados, para
+        # entregarlos en su sitio entre los lotes de los workers
+        locales = set()
+        try:
+            for lote, resueltos in _agrupar(indexados, tamano, resolver):
+                if len(pendientes) >= max_en_vuelo:
+                    if ordenado:
+                        # Los lotes se guardan en orden de envío: el primero es el más antiguo
+                        terminados = [next(iter(pendientes))]
+                    else:
+                        terminados, _ = concurrent.futures.wait(
+                            pendientes, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for futuro in terminados:
+                        yield from self._entregar(futuro, pendientes, locales, modo)
+                if resueltos is not None:
+                    futuro = concurrent.futures.Future()
+                    futuro.set_result(resueltos)
+                    pendientes[futuro] = lote
+                    locales.add(futuro)
+                    continue
+                try:
+                    futuro = pool.submit(_ejecutar_lote, funcion, lote)
+                except BrokenProcessPool:
+                    _descartar_pool(modo, self.max_workers, pool)
+                    pool = obtener_pool(modo, self.max_workers)
+                    futuro = pool.submit(_ejecutar_lote, funcion, lote)
+                pendientes[futuro] = lote
+                metricas.incrementar("paca_ejecutor_lotes_en_vuelo", 1, modo=modo)
+
+            restantes = list(pendientes) if ordenado else concurrent.futures.as_completed(pendientes)
+            for futuro in restantes:
+                yield from self._entregar(futuro, pendientes, locales, modo)
+        finally:
+            # Lotes abandonados si el consumidor dejó de iterar: no deben ocupar el pool compartido
+            enviados = [futuro for futuro in pendientes if futuro not in locales]
+            if enviados:
+                for futuro in enviados:
+                    futuro.cancel()
+                metricas.incrementar("paca_ejecutor_lotes_en_vuelo", -len(enviados), modo=modo)
+            if modo == "procesos" and getattr(pool, "_broken", False):
+                _descartar_pool(modo, self.max_workers, pool)
+
+    @staticmethod
+    def _entregar(futuro: concurrent.futures.Future, pendientes: Dict, locales: Set,
+                  modo: str) -> Iterator[Tuple[int, object, Optional[str]]]:
+        lote = pendientes.pop(futuro)
+        if futuro in locales:
+            locales.discard(futuro)
+        else:
+            metricas.incrementar("paca_ejecutor_lotes_en_vuelo", -1, modo=modo)
+        return _resultados_de(futuro, lote)
+
+    def _tamano_lote(self, elementos: Iterable) -> int:
+        """Por defecto, unos cuatro lotes por worker (o lotes de 8 si no se conoce el total)."""
+        if self.tamano_lote:
+            return self.tamano_lote
+        if hasattr(elementos, "__len__"):
+            return max(1, len(elementos) // (self.max_workers * 4))
+        return 8
+
+
+def _resolver(resolver: Optional[Callable], indice: int, elemento: object) -> Tuple[Optional[List], object]:
+    """Aplica el resolver a un elemento: (resultados, None) si lo resolvió, o (None, elemento_a_enviar)."""
+    if resolver is None:
+        return None, elemento
+    try:
+        resuelto, valor = resolver(elemento)
+    except Exception as e:
+        return [(indice, None, str(e))], None
+    return ([(indice, valor, None)], None) if resuelto else (None, valor)
+
+
+def _agrupar(indexados: Iterator[Tuple[int, object]], tamano: int,
+             resolver: Optional[Callable] = None) -> Iterator[Tuple[List[Tuple[int, object]], Optional[List]]]:
+    """
+    Agrupa en lotes los elementos que hay que enviar a los workers.
+
+    Yields:
+        Tuple con (lote, None) para enviar, o ([(índice, None)], resultados) para un
+        elemento resuelto en este proceso; el lote a medio llenar se entrega antes,
+        para conservar el orden
+    """
+    lote = []
+    for indice, elemento in indexados:
+        resueltos, elemento = _resolver(resolver, indice, elemento)
+        if resueltos is not None:
+            if lote:
+                yield lote, None
+                lote = []
+            yield [(indice, None)], resueltos
+            continue
+        lote.append((indice, elemento))
+        if len(lote) >= tamano:
+            yield lote, None
+            lote = []
+    if lote:
+        yield lote, None
+
+
+def _resultados_de(futuro: concurrent.futures.Future, lote: List[Tuple[int, object]]) -> Iterator[Tuple[int, object, Optional[str]]]:
+    try:
+        yield from futuro.result()
+    except Exception as e:
+        # El worker murió o el lote no se pudo serializar
+        for indice, _ in lote:
+            yield indice, None, str(e)
@@ -0,0 +1,530 @@
+# clases/enrutador.py
+
+import os
+import json
+import time
+import shutil
+import tempfile
+from datetime import datetime
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from clases.backend_pdf import abrir_pdf, cargar_backend
+from clases.cache_texto import CacheTextoPDF, cache_texto, obtener_cache_worker
+from clases.ejecutor import EjecutorTareas
+from clases.entrada_pdf import FuentePDF, descripcion_fuente
+from clases.ExtractorCertificados import COLUMNAS_INFORME, ExtractorCertificadosLleida
+from clases.indice_resultados import ORIGEN_OCR, IndiceResultados, obtener_indice, version_reglas
+from clases.metricas import (BUSCAR, COMPRIMIR, ESCRIBIR, EXTRAER_TEXTO, CronometroEtapas, medir_etapa,
+                             metricas, registrar_etapas)
+from clases.motor_patrones import cargar_reglas, obtener_motor
+from clases.nombres_salida import AsignadorNombres
+from clases.ocr import MotorOCR, describir_error_ocr, intercalar_ocr, obtener_motor_ocr
+from clases.procesador import ProcesadorCartas, dividir_cartas, segmentar_textos
+from clases.procesador_lleida import ProcesadorPDF
+from clases.reportes import crear_escritor
+from clases.zip_streaming import comprimir_directorio
+
+# Tipos de documento que reconoce el enrutador
+TIPO_CERTIFICADO = "certificado"
+TIPO_NOTIFICACION = "notificacion"
+TIPO_CARTAS = "cartas"
+
+
+class EnrutadorDocumentos:
+    """
+    Procesa lotes mixtos de PDF: clasifica cada documento y aplica el extractor que le corresponde.
+
+    El texto de cada PDF se extrae una sola vez (en el worker, con la caché de
+    texto) y con ese mismo texto se decide el tipo y se buscan sus datos, con los
+    métodos de cada procesador (y sus regiones configuradas):
+        - certificado: certificado y asunto, como ExtractorCertificadosLleida
+        - notificacion: número de atención y nombre de salida, como ProcesadorPDF
+        - cartas: PDF combinado de cartas, dividido como ProcesadorCartas
+    El tipo se decide con las primeras páginas (PACA_PAGINAS_CLASIFICACION): de una
+    notificación no se lee nada más, un certificado se sigue leyendo solo hasta
+    encontrar sus campos, y las cartas necesitan todas las páginas. Las cartas se
+    guardan repartidas entre los workers del ejecutor, como en ProcesadorCartas.
+    Las filas del índice de resultados llevan el tipo decidido: un PDF ya
+    procesado con las mismas reglas no se vuelve a clasificar ni a leer.
+    Todo va a un único ZIP con una carpeta por tipo y un manifiesto (manifiesto.json)
+    con el tipo, los datos y los archivos de salida de cada PDF de entrada.
+    """
+
+    # Nombre del procesador en las métricas
+    NOMBRE_METRICAS = "procesar_documentos"
+    # Carpeta del ZIP de salida de cada tipo
+    CARPETAS = {TIPO_CERTIFICADO: "certificados", TIPO_NOTIFICACION: "notificaciones", TIPO_CARTAS: "cartas"}
+    NOMBRE_MANIFIESTO = "manifiesto.json"
+    # Resultados que se acumulan antes de escribirlos en el índice
+    TAMANO_BLOQUE_INDICE = 500
+    # Resultados que pueden quedar retenidos detrás de un OCR sin terminar
+    MAX_EN_ESPERA_OCR = 256
+
+    def __init__(self, cache: CacheTextoPDF = None, ejecutor: EjecutorTareas = None, ocr: MotorOCR = None,
+                 indice: IndiceResultados = None):
+        self.cache = cache or cache_texto
+        self.ejecutor = ejecutor or EjecutorTareas()
+        self.indice = indice or obtener_indice()
+        self.ocr = ocr or obtener_motor_ocr()
+        self.usar_ocr = self.ocr.disponible
+        # Los procesadores de cada tipo aportan sus reglas y su contabilidad; el
+        # reparto entre workers, el OCR y la salida los gestiona el enrutador
+        self.notificaciones = ProcesadorPDF(cache=self.cache, ejecutor=self.ejecutor, ocr=self.ocr,
+                                            indice=self.indice)
+        self.certificados = ExtractorCertificadosLleida(cache=self.cache, ejecutor=self.ejecutor, ocr=self.ocr,
+                                                        indice=self.indice)
+        for procesador in (self.notificaciones, self.certificados):
+            procesador.NOMBRE_METRICAS = self.NOMBRE_METRICAS
+        # Reglas y opciones de las cartas (las mismas variables que ProcesadorCartas)
+        self.segmentacion = os.environ.get("PACA_SEGMENTACION_CARTAS", "fija")
+        if self.segmentacion not in ProcesadorCartas.MODOS_SEGMENTACION:
+            raise ValueError(f"Modo de segmentación no válido: {self.segmentacion}")
+        self.max_paginas_carta = int(os.environ.get("PACA_MAX_PAGINAS_CARTA", 8))
+        # Páginas con las que se clasifica un documento (al menos las que se leen de una notificación)
+        self.paginas_clasificacion = max(int(os.environ.get("PACA_PAGINAS_CLASIFICACION", 3)),
+                                         self.notificaciones.max_paginas_atencion)
+        self.patrones_numero_carta = cargar_reglas("cartas", ProcesadorCartas.PATRONES_NUMERO)
+        self.patrones_marcador_carta = cargar_reglas("marcadores_cartas", self.patrones_numero_carta)
+        # Versión de las reglas de clasificación, guardada con el tipo en el índice
+        self.version_clasificacion = version_reglas(
+            self.certificados.patrones_certificado, self.certificados.patrones_certificado_respaldo,
+            self.patrones_marcador_carta, paginas=self.paginas_clasificacion, ocr=self.usar_ocr)
+
+    @classmethod
+    def precalentar(cls):
+        """Carga la librería de PDF y compila los patrones de todos los tipos antes de la primera petición."""
+        enrutador = cls()
+        cargar_backend(enrutador.cache.backend)
+        certificados = enrutador.certificados
+        for patrones in (enrutador.notificaciones.patrones_atencion, certificados.patrones_certificado,
+                         certificados.patrones_asunto, certificados.patrones_certificado_respaldo,
+                         certificados.patrones_asunto_respaldo, enrutador.patrones_numero_carta,
+                         enrutador.patrones_marcador_carta):
+            obtener_motor(patrones)
+
+    def __getstate__(self):
+        # Como en los demás procesadores: los workers usan una caché pequeña (su texto
+        # vuelve con cada resultado a la de este proceso) y no paralelizan
+        estado = self.__dict__.copy()
+        del estado["cache"]
+        del estado["ejecutor"]
+        del estado["ocr"]
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self.cache = obtener_cache_worker()
+        self.ejecutor = EjecutorTareas(modo="secuencial")
+        self.ocr = None
+
+    def procesar_archivos(self, archivos_entrada: List[str], directorio_temporal: str,
+                          progreso: Callable[[int, Optional[int]], None] = None,
+                          formato: str = "xlsx") -> Tuple[str, Dict]:
+        """
+        Clasifica y procesa una lista de archivos PDF/ZIP con PDF de cualquier tipo.
+
+        Args:
+            archivos_entrada: Lista de rutas de archivos PDF/ZIP
+            directorio_temporal: Directorio temporal para trabajar
+            progreso: Función opcional llamada tras cada PDF con (procesados, total);
+                total es None mientras quedan ZIP por leer
+            formato: Formato del informe de certificados: "xlsx", "csv" o "parquet"
+
+        Returns:
+            Tuple con (ruta_zip_resultado, resumen_estadisticas)
+        """
+        directorio_salida = os.path.join(directorio_temporal, "documentos")
+        for carpeta in self.CARPETAS.values():
+            os.makedirs(os.path.join(directorio_salida, carpeta), exist_ok=True)
+
+        archivos_pdf = self.notificaciones.recopilar_archivos_pdf(archivos_entrada, directorio_temporal)
+
+        estadisticas = {
+            "total": 0,
+            "fallidos": 0,
+            "certificados": self.certificados.estadisticas_iniciales(),
+            "notificaciones": self.notificaciones.estadisticas_iniciales(),
+            "cartas": {"documentos": 0, "procesados": 0, "con_numero": 0, "sin_numero": 0,
+                          "paginas_excepcion": 0}
+        }
+        asignadores = {tipo: AsignadorNombres() for tipo in self.CARPETAS}
+        # Rutas de salida (relativas al directorio de salida) en el orden de entrada
+        nombres_zip = []
+        manifiesto = []
+        filas_indice = []
+
+        carpeta_certificados = os.path.join(directorio_salida, self.CARPETAS[TIPO_CERTIFICADO])
+        informe = crear_escritor(formato, carpeta_certificados, "resultados_certificados", COLUMNAS_INFORME)
+        try:
+            for fuente, resultado, error, ocr in self._mapear(archivos_pdf):
+                if ocr is not None:
+                    self._completar_ocr(fuente, resultado, ocr, estadisticas)
+
+                estadisticas["total"] += 1
+                entrada = {"archivo": self._origen(fuente)}
+                if error is not None or not resultado["exitoso"]:
+                    error = error or resultado.get("error")
+                    print(f"Error procesando {descripcion_fuente(fuente)}: {error}")
+                    estadisticas["fallidos"] += 1
+                    metricas.incrementar("paca_archivos_total", procesador=self.NOMBRE_METRICAS, resultado="fallido")
+                    entrada.update(tipo=None, error=error, salidas=[])
+                else:
+                    salidas = self._registrar(fuente, resultado, estadisticas, asignadores, directorio_salida,
+                                              informe, entrada)
+                    nombres_zip.extend(salidas)
+                    entrada["salidas"] = salidas
+                    fila = self._fila_indice(fuente, resultado)
+                    if fila is not None:
+                        filas_indice.append(fila)
+                        if len(filas_indice) >= self.TAMANO_BLOQUE_INDICE:
+                            self.indice.guardar(filas_indice)
+                            filas_indice = []
+                manifiesto.append(entrada)
+
+                if progreso:
+                    progreso(estadisticas["total"], None)
+        finally:
+            with medir_etapa(self.NOMBRE_METRICAS, ESCRIBIR):
+                informe.cerrar()
+            if filas_indice:
+                self.indice.guardar(filas_indice)
+
+        if progreso:
+            progreso(estadisticas["total"], estadisticas["total"])
+
+        for apartado in ("certificados", "notificaciones"):
+            for clave in ("tiempo_extraccion_s", "tiempo_ocr_s"):
+                estadisticas[apartado][clave] = round(estadisticas[apartado][clave], 3)
+
+        # El informe de certificados solo se incluye si hubo certificados
+        if estadisticas["certificados"]["total"]:
+            nombres_zip.append(os.path.relpath(informe.ruta, directorio_salida))
+
+        with medir_etapa(self.NOMBRE_METRICAS, ESCRIBIR):
+            with open(os.path.join(directorio_salida, self.NOMBRE_MANIFIESTO), "w", encoding="utf-8") as f:
+                json.dump({"resumen": estadisticas, "archivos": manifiesto}, f, ensure_ascii=False, indent=2)
+        nombres_zip.append(self.NOMBRE_MANIFIESTO)
+
+        zip_path = os.path.join(directorio_temporal, self.nombre_zip_resultado())
+        with medir_etapa(self.NOMBRE_METRICAS, COMPRIMIR):
+            comprimir_directorio(directorio_salida, zip_path, nombres_zip)
+
+        return zip_path, estadisticas
+
+    def nombre_zip_resultado(self) -> str:
+        """Nombre del ZIP de resultados con la fecha y hora actuales."""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"documentos_procesados_{timestamp}.zip"
+
+    def _mapear(self, archivos_pdf: Iterable[Union[str, FuentePDF]]) -> Iterator[Tuple]:
+        """
+        Analiza los PDF con el ejecutor, en el orden de entrada, enviando al OCR los que no tienen texto.
+
+        Yields:
+            Tuple con (fuente, resultado, error, futuro_del_ocr_o_None)
+        """
+        en_vuelo = {}
+
+        def registrar():
+            for indice, fuente in enumerate(archivos_pdf):
+                en_vuelo[indice] = fuente
+                yield fuente
+
+        resultados = ((en_vuelo.pop(indice), self.cache.recoger(resultado), error)
+                      for indice, resultado, error in self.ejecutor.mapear(
+                          self._analizar_en_worker, registrar(), ordenado=True, resolver=self._resolver))
+        for (fuente, resultado, error), ocr in intercalar_ocr(
+                resultados, self.ocr, self.notificaciones.pendiente_ocr, self.MAX_EN_ESPERA_OCR):
+            yield fuente, resultado, error, ocr
+
+    def _resolver(self, fuente: Union[str, FuentePDF]) -> Tuple[bool, object]:
+        """
+        Analiza en este proceso los PDF que ya están en el índice o en la caché de texto; los demás van a los workers.
+
+        Una fila del índice con las mismas reglas dice el tipo del PDF y sus datos.
+        Si no la hay, el tipo se decide con las primeras páginas en caché y basta
+        con que la caché tenga lo que leería el procesador de ese tipo. La huella es
+        la de la ingesta (o la que se calculó al leer el ZIP), así que el worker no
+        vuelve a hashear el PDF.
+
+        Returns:
+            Tuple con (True, resultado) o (False, (fuente, huella)) para _analizar_en_worker
+        """
+        huella = self.cache.obtener_huella(fuente)
+        previo = self._consultar_indice(huella)
+        if previo is not None:
+            return True, self._analizar_pdf(fuente, huella, previo)
+        if self.cache.contiene(huella, paginas=self.paginas_clasificacion):
+            tipo = self._clasificar(list(islice(self.cache.iterar_paginas(fuente), self.paginas_clasificacion)))
+            if (self.cache.contiene(huella)
+                    or (tipo == TIPO_NOTIFICACION and self.notificaciones.texto_en_cache(huella))
+                    or (tipo == TIPO_CERTIFICADO and self.certificados.campos_en_cache(huella) is not None)):
+                return True, self._analizar_pdf(fuente, huella)
+        return False, (fuente, huella)
+
+    def _consultar_indice(self, huella: str) -> Optional[Dict]:
+        """
+        Fila del índice guardada por el enrutador para un PDF, si su tipo y sus datos siguen valiendo.
+
+        Returns:
+            La fila (con clase_documento), o None si no hay índice, no se procesó
+            con las mismas reglas de clasificación o cambiaron las de su tipo
+        """
+        if self.indice is None:
+            return None
+        fila = self.indice.consultar_clasificado(huella, self.version_clasificacion)
+        if fila is None:
+            return None
+        procesador = self.certificados if fila["clase_documento"] == TIPO_CERTIFICADO else self.notificaciones
+        return fila if fila["version"] == procesador.version_indice else None
+
+    def _analizar_en_worker(self, elemento: Tuple[Union[str, FuentePDF], str]) -> Dict:
+        """Analiza en un worker un PDF que no se resolvió en el proceso principal, con su huella."""
+        fuente, huella = elemento
+        try:
+            self.cache.registrar_huella(fuente, huella)
+        except OSError:
+            pass
+        resultado = self._analizar_pdf(fuente, huella)
+        if self.cache.en_worker:
+            self.cache.adjuntar(resultado, huella)
+        return resultado
+
+    def _analizar_pdf(self, fuente: Union[str, FuentePDF], huella: str = None, previo: Dict = None) -> Dict:
+        """
+        Clasifica un PDF por el texto de sus primeras páginas y busca sus datos, sin escribir nada.
+
+        Los datos los busca el procesador de cada tipo, que sigue leyendo de la
+        caché las páginas (o la región) que necesita sin volver a extraer las ya leídas.
+
+        Args:
+            fuente: Ruta del archivo PDF o PDF en memoria
+            huella: Hash de contenido del PDF, si ya se conoce
+            previo: Fila del índice para el PDF, si la había (ver _resolver)
+
+        Returns:
+            Diccionario con el tipo y los datos del documento: certificado y asunto,
+            número de atención y nombre de salida, o las cartas (primera página,
+            última página y número) y las páginas en excepción
+        """
+        try:
+            inicio = time.perf_counter()
+            cronometro = CronometroEtapas()
+            huella = huella or self.cache.obtener_huella(fuente)
+            if previo is not None:
+                tipo = previo["clase_documento"]
+            else:
+                # Al cerrar el iterador, las páginas leídas quedan en la caché para el procesador del tipo
+                paginas = self.cache.iterar_paginas(fuente)
+                primeras = list(islice(paginas, self.paginas_clasificacion))
+                paginas.close()
+                with cronometro.medir(BUSCAR):
+                    tipo = self._clasificar(primeras)
+
+            if tipo == TIPO_CERTIFICADO:
+                resultado = self.certificados.extraer_campos(fuente, huella, previo)
+                resultado.update(exitoso=True, indexable=not resultado.get("desde_indice"))
+            elif tipo == TIPO_NOTIFICACION:
+                resultado = self.notificaciones.analizar_pdf(fuente, huella, previo)
+                if not resultado["exitoso"]:
+                    return resultado
+            else:
+                paginas = self.cache.obtener_paginas(fuente)
+                with cronometro.medir(BUSCAR):
+                    cartas, excepciones = segmentar_textos(
+                        paginas, self.patrones_numero_carta, self.patrones_marcador_carta,
+                        self.segmentacion, self.max_paginas_carta)
+                resultado = {"exitoso": True, "huella": huella, "cartas": cartas, "excepciones": excepciones}
+            resultado["tipo"] = tipo
+
+            resultado["tiempo_extraccion_s"] = time.perf_counter() - inicio
+            # Lo que no fue clasificar o buscar con los patrones fue obtener el texto (o la huella)
+            busqueda = cronometro.tiempos.get(BUSCAR, 0.0) + resultado.get("etapas", {}).get(BUSCAR, 0.0)
+            resultado["etapas"] = {EXTRAER_TEXTO: resultado["tiempo_extraccion_s"] - busqueda, BUSCAR: busqueda}
+            return resultado
+
+        except Exception as e:
+            return {
+                "exitoso": False,
+                "error": str(e),
+                "ruta_original": descripcion_fuente(fuente)
+            }
+
+    def _clasificar(self, paginas: List[str]) -> str:
+        """
+        Decide el tipo de un documento a partir del texto de sus primeras páginas.
+
+        Un identificador de certificado con su etiqueta hace del documento un
+        certificado, aunque mencione una carta; si no, la cabecera de carta en la
+        primera página lo hace un PDF de cartas, y un identificador sin etiqueta
+        (E…-S), de nuevo un certificado. El resto son notificaciones.
+        """
+        texto = "\n".join(paginas)
+        if self.certificados.extraer_certificado(texto, respaldo=False):
+            return TIPO_CERTIFICADO
+        if paginas and obtener_motor(self.patrones_marcador_carta).buscar(paginas[0]):
+            return TIPO_CARTAS
+        if obtener_motor(self.certificados.patrones_certificado_respaldo).buscar(texto):
+            return TIPO_CERTIFICADO
+        return TIPO_NOTIFICACION
+
+    def _completar_ocr(self, fuente: Union[str, FuentePDF], resultado: Dict, ocr, estadisticas: Dict):
+        """Clasifica un PDF sin texto con el texto reconocido por el OCR y busca sus datos."""
+        del resultado["pendiente_ocr"]
+        try:
+            reconocido = ocr.result()
+        except Exception as e:
+            # Sin OCR el archivo se queda como notificación SIN_NUMERO, fuera del índice
+            print(describir_error_ocr(fuente, e))
+            resultado["indexable"] = False
+            return
+
+        if self._clasificar([reconocido.texto]) == TIPO_CERTIFICADO:
+            resultado["tipo"] = TIPO_CERTIFICADO
+            self.certificados.completar_ocr(fuente, resultado, ocr, estadisticas["certificados"])
+            return
+
+        # Solo se reconoce el encabezado de la primera página: no basta para dividir cartas
+        resultado["tiempo_ocr_s"] = reconocido.segundos
+        numero = self.notificaciones.buscar_en_paginas([reconocido.texto])
+        if numero:
+            resultado.update(self.notificaciones.nombrar(fuente, numero), numero_contenido=numero,
+                             origen_numero=ORIGEN_OCR, ocr=True)
+
+    def _registrar(self, fuente: Union[str, FuentePDF], resultado: Dict, estadisticas: Dict,
+                   asignadores: Dict[str, AsignadorNombres], directorio_salida: str, informe,
+                   entrada: Dict) -> List[str]:
+        """
+        Escribe la salida de un PDF ya analizado según su tipo y lo contabiliza.
+
+        Args:
+            fuente: Ruta del archivo PDF o PDF en memoria
+            resultado: Resultado de _analizar_pdf (completado con el OCR, si hizo falta)
+            estadisticas: Estadísticas del lote, con un apartado por tipo
+            asignadores: Asignador de nombres de la carpeta de cada tipo
+            directorio_salida: Directorio de salida (una carpeta por tipo)
+            informe: Escritor del informe de certificados
+            entrada: Entrada del manifiesto del PDF, que se completa con sus datos
+
+        Returns:
+            Rutas de los archivos de salida, relativas al directorio de salida
+        """
+        tipo = resultado["tipo"]
+        carpeta = self.CARPETAS[tipo]
+        # Las estadísticas de cada tipo van en el apartado con el nombre de su carpeta
+        apartado = estadisticas[carpeta]
+        entrada["tipo"] = tipo
+        if "tiempo_ocr_s" in resultado:
+            entrada["ocr"] = True
+
+        if tipo == TIPO_CERTIFICADO:
+            fila = self.certificados.contabilizar(apartado, fuente, resultado, None)
+            apartado["total"] += 1
+            if fila is not None:
+                with medir_etapa(self.NOMBRE_METRICAS, ESCRIBIR):
+                    informe.agregar({**fila, "Archivo": self._origen(fuente)})
+            entrada.update(certificado=resultado["certificado"], asunto=resultado["asunto"])
+            return []
+
+        if tipo == TIPO_NOTIFICACION:
+            with medir_etapa(self.NOMBRE_METRICAS, ESCRIBIR):
+                resultado = self.notificaciones.guardar_pdf(fuente, resultado, os.path.join(directorio_salida, carpeta),
+                                                             asignadores[tipo])
+            self.notificaciones.contabilizar(apartado, resultado, None, fuente)
+            if not resultado["exitoso"]:
+                entrada["error"] = resultado["error"]
+                return []
+            entrada["numero_atencion"] = resultado["numero_atencion"]
+            return [f"{carpeta}/{resultado['nombre_salida']}"]
+
+        registrar_etapas(self.NOMBRE_METRICAS, resultado["etapas"])
+        # La escritura de las cartas la miden los workers (ver _guardar_cartas)
+        nombres = self._guardar_cartas(fuente, resultado, os.path.join(directorio_salida, carpeta),
+                                       asignadores[tipo], apartado)
+        entrada["cartas"] = len(resultado["cartas"])
+        return [f"{carpeta}/{nombre}" for nombre in nombres]
+
+    def _guardar_cartas(self, fuente: Union[str, FuentePDF], resultado: Dict, directorio: str,
+                        asignador: AsignadorNombres, estadisticas: Dict) -> List[str]:
+        """
+        Guarda cada carta de un PDF combinado como un PDF independiente, y las páginas sueltas en excepciones.
+
+        Las cartas se reparten en bloques entre los workers del ejecutor, que abren
+        el PDF por su cuenta (dividir_cartas); los nombres se asignan después, en orden.
+
+        Returns:
+            Nombres de los archivos creados, en orden
+        """
+        nombres = []
+        provisional = tempfile.mkdtemp(prefix=".cartas_", dir=directorio)
+        try:
+            ruta_pdf = fuente
+            if isinstance(fuente, FuentePDF):
+                # Los workers leen el PDF del disco, en lugar de recibir sus bytes en cada bloque
+                ruta_pdf = os.path.join(provisional, "combinado.pdf")
+                with open(ruta_pdf, "wb") as f:
+                    f.write(fuente.datos)
+
+            # El número ya se buscó al analizar; sin él, el worker lo busca en la carta (modo "fija")
+            cartas = [(n, inicio, fin, numero) for n, (inicio, fin, numero) in enumerate(resultado["cartas"])]
+            tamano = max(1, -(-len(cartas) // (self.ejecutor.max_workers * 4)))
+            dividir = partial(dividir_cartas, ruta_pdf=ruta_pdf, directorio=provisional,
+                              patrones=self.patrones_numero_carta)
+            guardadas = []
+            for _, salida, error in self.ejecutor.mapear(
+                    dividir, [cartas[i:i + tamano] for i in range(0, len(cartas), tamano)]):
+                if error is not None:
+                    raise RuntimeError(f"❌ Error al dividir el PDF: {error}")
+                bloque, tiempos = salida
+                guardadas.extend(bloque)
+                registrar_etapas(self.NOMBRE_METRICAS, tiempos)
+
+            for _, numero, ruta in sorted(guardadas):
+                if numero:
+                    estadisticas["con_numero"] += 1
+                    nombre = f"PQR-{numero}.pdf"
+                else:
+                    estadisticas["sin_numero"] += 1
+                    nombre = f"PQR-Unknown-{estadisticas['sin_numero']}.pdf"
+                nombre = asignador.asignar(nombre)
+                os.replace(ruta, os.path.join(directorio, nombre))
+                nombres.append(nombre)
+                estadisticas["procesados"] += 1
+                metricas.incrementar("paca_archivos_total", procesador=self.NOMBRE_METRICAS,
+                                     resultado="con_numero" if numero else "sin_numero")
+
+            if resultado["excepciones"]:
+                print(f"⚠️ {len(resultado['excepciones'])} páginas de {descripcion_fuente(fuente)} "
+                      f"no pertenecen a ninguna carta")
+                nombre = asignador.asignar(ProcesadorCartas.NOMBRE_EXCEPCIONES)
+                with medir_etapa(self.NOMBRE_METRICAS, ESCRIBIR), abrir_pdf(ruta_pdf) as doc:
+                    doc.guardar_paginas(resultado["excepciones"], os.path.join(directorio, nombre))
+                nombres.append(nombre)
+                estadisticas["paginas_excepcion"] += len(resultado["excepciones"])
+        finally:
+            shutil.rmtree(provisional, ignore_errors=True)
+
+        estadisticas["documentos"] += 1
+        return nombres
+
+    def _fila_indice(self, fuente: Union[str, FuentePDF], resultado: Dict) -> Optional[Dict]:
+        """
+        Fila del índice de resultados para una notificación o un certificado, con el tipo decidido.
+
+        Returns:
+            La fila, o None si no hay índice, son cartas, falló la extracción o el
+            resultado ya venía del índice
+        """
+        if (self.indice is None or not resultado["exitoso"] or not resultado.get("indexable")
+                or resultado["tipo"] == TIPO_CARTAS):
+            return None
+        procesador = self.certificados if resultado["tipo"] == TIPO_CERTIFICADO else self.notificaciones
+        return {**procesador.fila_indice(fuente, resultado), "clase_documento": resultado["tipo"],
+                "version_clasificacion": self.version_clasificacion}
+
+    @staticmethod
+    def _origen(fuente: Union[str, FuentePDF]) -> str:
+        """Nombre del PDF de entrada en el manifiesto: el del archivo subido, o ZIP/ruta dentro del ZIP."""
+        return fuente.nombre if isinstance(fuente, FuentePDF) else Path(fuente).name
@@ -0,0 +1,99 @@
+# clases/entrada_pdf.py
+
+import os
+import zipfile
+from pathlib import Path
+from typing import Iterator, Union
+
+# Límites por defecto para los PDF leídos desde un ZIP (bytes descomprimidos)
+MAX_BYTES_MIEMBRO = 100 * 1024 * 1024
+MAX_BYTES_ZIP = 2 * 1024 * 1024 * 1024
+
+
+class FuentePDF:
+    """
+    PDF leído en memoria, sin archivo propio en disco (por ejemplo, un miembro de un ZIP).
+
+    Los procesadores aceptan indistintamente rutas (str) y FuentePDF; las funciones
+    de este módulo ocultan la diferencia.
+    """
+
+    __slots__ = ("nombre", "datos", "huella")
+
+    def __init__(self, nombre: str, datos: bytes, huella: str = None):
+        """
+        Args:
+            nombre: Nombre lógico del PDF, con el ZIP de origen como prefijo
+                (por ejemplo "lote_marzo/carpeta/aviso.pdf")
+            datos: Contenido del PDF
+            huella: Hash de contenido, si ya se calculó (viaja con el PDF a los workers)
+        """
+        self.nombre = nombre
+        self.datos = datos
+        self.huella = huella
+
+    def __repr__(self):
+        return f"FuentePDF({self.nombre!r}, {len(self.datos)} bytes)"
+
+
+def leer_bytes(fuente: Union[str, FuentePDF]) -> bytes:
+    """Devuelve el contenido de un PDF, esté en disco o en memoria."""
+    if isinstance(fuente, FuentePDF):
+        return fuente.datos
+    with open(fuente, 'rb') as f:
+        return f.read()
+
+
+def nombre_fuente(fuente: Union[str, FuentePDF]) -> str:
+    """Devuelve el nombre de archivo (sin directorios) de un PDF."""
+    if isinstance(fuente, FuentePDF):
+        return os.path.basename(fuente.nombre)
+    return os.path.basename(fuente)
+
+
+def descripcion_fuente(fuente: Union[str, FuentePDF]) -> str:
+    """Devuelve la ruta o el nombre completo de un PDF, para mensajes y reportes."""
+    return fuente.nombre if isinstance(fuente, FuentePDF) else fuente
+
+
+def iterar_pdfs_de_zip(ruta_zip: str, max_bytes_miembro: int = MAX_BYTES_MIEMBRO,
+                       max_bytes_zip: int = MAX_BYTES_ZIP) -> Iterator[FuentePDF]:
+    """
+    Lee los PDF de un ZIP directamente a memoria, uno a uno y sin extraer nada a disco.
+
+    Los demás miembros se ignoran. Cada PDF lleva como prefijo el nombre del ZIP,
+    de modo que dos ZIP con archivos del mismo nombre no se pisan.
+
+    Args:
+        ruta_zip: Ruta del archivo ZIP
+        max_bytes_miembro: Tamaño máximo descomprimido de cada PDF; los mayores se omiten
+        max_bytes_zip: Tamaño máximo descomprimido del total de PDF del ZIP
+
+    Yields:
+        FuentePDF de cada PDF del ZIP
+    """
+    prefijo = Path(ruta_zip).stem
+    total = 0
+
+    with zipfile.ZipFile(ruta_zip, 'r') as zip_ref:
+        for info in zip_ref.infolist():
+            if info.is_dir() or not info.filename.lower().endswith('.pdf'):
+                continue
+
+            if info.file_size > max_bytes_miembro:
+                print(f"PDF omitido por tamaño en {ruta_zip}: {info.filename} ({info.file_size} bytes)")
+                continue
+
+            # No confiar solo en el tamaño declarado en la cabecera del ZIP
+            with zip_ref.open(info) as miembro:
+                datos = miembro.read(max_bytes_miembro + 1)
+            if len(datos) > max_bytes_miembro:
+                print(f"PDF omitido por tamaño en {ruta_zip}: {info.filename}")
+                continue
+
+            total += len(datos)
+            if total > max_bytes_zip:
+                print(f"Se alcanzó el límite de {max_bytes_zip} bytes en {ruta_zip}; se omiten los PDF restantes")
+                return
+
+            yield FuentePDF(f"{prefijo}/{info.filename}", datos)
@@ -0,0 +1,211 @@
+# clases/espacio_trabajo.py
+
+import os
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional, Set
+
+from clases.metricas import metricas
+
+
+# Raíz del proyecto (donde está main.py), para no depender del directorio actual
+RAIZ_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def raiz_por_defecto() -> str:
+    """Raíz de las áreas de trabajo: PACA_DIR_TRABAJO o un subdirectorio del temporal del sistema."""
+    return os.environ.get("PACA_DIR_TRABAJO") or os.path.join(tempfile.gettempdir(), "paca_trabajo")
+
+
+def directorio_datos(*partes: str) -> str:
+    """
+    Ruta dentro del directorio de datos persistentes: PACA_DIR_DATOS o datos/ en la raíz del proyecto.
+
+    A diferencia de las áreas de trabajo (PACA_DIR_TRABAJO), lo que se guarda aquí
+    sobrevive a los reinicios: los trabajos asíncronos, el índice de resultados y
+    los perfiles. La ruta es absoluta aunque PACA_DIR_DATOS sea relativa, así que
+    no cambia con el directorio desde el que se arranque el servidor.
+    """
+    raiz = os.environ.get("PACA_DIR_DATOS") or os.path.join(RAIZ_PROYECTO, "datos")
+    return os.path.join(os.path.abspath(raiz), *partes)
+
+
+class EspaciosTrabajo:
+    """
+    Áreas de trabajo temporales de las peticiones, todas bajo una misma raíz.
+
+    Cada petición obtiene su propio directorio con crear(): allí se guardan las
+    subidas, los archivos intermedios de los procesadores y el ZIP de resultado,
+    y se borra entero con eliminar() una vez enviada la respuesta. La raíz puede
+    estar en un tmpfs (p. ej. /dev/shm) para no tocar el disco.
+
+    Un limpiador periódico borra las áreas que quedaron huérfanas (un proceso que
+    murió, una respuesta que nunca se envió...): las que superan la edad máxima
+    y, si la raíz excede su cuota, las más antiguas que no estén en uso. En cada
+    pasada ejecuta además las limpiezas registradas con registrar_limpieza (p. ej.
+    la retención de los resultados de los trabajos asíncronos).
+
+    Configuración por variables de entorno: PACA_DIR_TRABAJO, PACA_TRABAJO_MAX_EDAD
+    (segundos), PACA_TRABAJO_MAX_BYTES y PACA_TRABAJO_INTERVALO_LIMPIEZA (segundos).
+    Los datos que deben conservarse entre reinicios van en otro directorio,
+    PACA_DIR_DATOS (ver directorio_datos).
+    """
+
+    def __init__(self, raiz: str = None, max_edad: float = None, max_bytes: int = None, intervalo: float = None):
+        """
+        Args:
+            raiz: Directorio bajo el que se crean las áreas de trabajo
+            max_edad: Segundos tras los que un área se considera abandonada
+            max_bytes: Cuota de la raíz; por encima se borran las áreas inactivas más antiguas
+            intervalo: Segundos entre dos pasadas del limpiador
+        """
+        self.raiz = os.path.abspath(raiz or raiz_por_defecto())
+        self.max_edad = max_edad or float(os.environ.get("PACA_TRABAJO_MAX_EDAD", 6 * 3600))
+        self.max_bytes = max_bytes or int(os.environ.get("PACA_TRABAJO_MAX_BYTES", 50 * 1024 ** 3))
+        self.intervalo = intervalo or float(os.environ.get("PACA_TRABAJO_INTERVALO_LIMPIEZA", 600))
+        os.makedirs(self.raiz, exist_ok=True)
+
+        self._activos: Set[str] = set()
+        self._limpiezas: List[Callable[[], object]] = []
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._hilo = None
+
+    @property
+    def activos(self) -> int:
+        """Áreas de trabajo creadas y aún no eliminadas por este proceso."""
+        return len(self._activos)
+
+    def crear(self, prefijo: str = "trabajo") -> str:
+        """
+        Crea un área de trabajo nueva.
+
+        Args:
+            prefijo: Prefijo del nombre del directorio (el tipo de procesamiento)
+
+        Returns:
+            Ruta absoluta del directorio creado
+        """
+        ruta = os.path.join(self.raiz, f"{prefijo}_{uuid.uuid4().hex}")
+        os.makedirs(ruta)
+        with self._lock:
+            self._activos.add(ruta)
+        return ruta
+
+    def eliminar(self, ruta: str):
+        """Borra un área de trabajo y todo su contenido; ignora rutas fuera de la raíz."""
+        ruta = os.path.abspath(ruta)
+        with self._lock:
+            self._activos.discard(ruta)
+        if os.path.dirname(ruta) != self.raiz:
+            print(f"⚠️ No se borra {ruta}: no es un área de trabajo de {self.raiz}")
+            return
+        shutil.rmtree(ruta, ignore_errors=True)
+
+    def limpiar(self) -> Dict[str, int]:
+        """
+        Borra las áreas abandonadas: las que superan la edad máxima y, si la raíz
+        supera la cuota, las inactivas más antiguas hasta volver a estar dentro.
+
+        Las áreas en uso por este proceso solo se borran por edad. Las de otros
+        procesos que compartan la raíz no se distinguen de las huérfanas, así que la
+        cuota debe dejar margen para ellas.
+
+        Returns:
+            Dict con las áreas borradas y los bytes liberados
+        """
+        ahora = time.time()
+        with self._lock:
+            activos = set(self._activos)
+        areas = []
+        for entrada in os.scandir(self.raiz):
+            try:
+                if entrada.is_dir(follow_symlinks=False):
+                    areas.append((entrada.stat().st_mtime, tamano_directorio(entrada.path), entrada.path))
+            except OSError:
+                continue
+
+        borradas = liberados = 0
+        total = sum(tamano for _, tamano, _ in areas)
+        for modificado, tamano, ruta in sorted(areas):
+            caducada = ahora - modificado > self.max_edad
+            if not caducada and (total <= self.max_bytes or ruta in activos):
+                continue
+            shutil.rmtree(ruta, ignore_errors=True)
+            with self._lock:
+                self._activos.discard(ruta)
+            total -= tamano
+            borradas += 1
+            liberados += tamano
+
+        if borradas:
+            metricas.incrementar("paca_trabajo_areas_limpiadas_total", borradas)
+            print(f"🧹 Limpiadas {borradas} áreas de trabajo abandonadas ({liberados / 1024 ** 2:.1f} MB)")
+        return {"borradas": borradas, "bytes": liberados}
+
+    def registrar_limpieza(self, funcion: Callable[[], object]):
+        """Añade una función que el limpiador periódico ejecuta en cada pasada, tras limpiar las áreas."""
+        with self._lock:
+            self._limpiezas.append(funcion)
+
+    def iniciar_limpieza(self):
+        """Arranca el limpiador periódico en un hilo (hace una primera pasada enseguida)."""
+        with self._lock:
+            if self._hilo is not None:
+                return
+            self._parar.clear()
+            self._hilo = threading.Thread(target=self._limpiar_periodicamente, name="limpieza-trabajo", daemon=True)
+            self._hilo.start()
+
+    def detener_limpieza(self):
+        """Detiene el limpiador periódico y espera a que termine su pasada en curso."""
+        with self._lock:
+            hilo, self._hilo = self._hilo, None
+        if hilo is not None:
+            self._parar.set()
+            hilo.join()
+
+    def _limpiar_periodicamente(self):
+        while True:
+            try:
+                self.limpiar()
+            except Exception as e:
+                print(f"⚠️ Error al limpiar las áreas de trabajo: {str(e)}")
+            with self._lock:
+                limpiezas = list(self._limpiezas)
+            for limpieza in limpiezas:
+                try:
+                    limpieza()
+                except Exception as e:
+                    print(f"⚠️ Error en la limpieza periódica: {str(e)}")
+            if self._parar.wait(self.intervalo):
+                return
+
+
+def tamano_directorio(ruta: str) -> int:
+    """Suma el tamaño de los archivos bajo un directorio (sin seguir enlaces)."""
+    total = 0
+    for directorio, _, archivos in os.walk(ruta):
+        for nombre in archivos:
+            try:
+                total += os.lstat(os.path.join(directorio, nombre)).st_size
+            except OSError:
+                pass
+    return total
+
+
+_espacios: Optional[EspaciosTrabajo] = None
+_lock_espacios = threading.Lock()
+
+
+def obtener_espacios() -> EspaciosTrabajo:
+    """Devuelve el gestor de áreas de trabajo compartido por todo el proceso, creándolo la primera vez."""
+    global _espacios
+    with _lock_espacios:
+        if _espacios is None:
+            _espacios = EspaciosTrabajo()
+            metricas.registrar_sonda("paca_trabajo_areas_activas", lambda: _espacios.activos)
+        return _espacios
@@ -0,0 +1,198 @@
+# clases/indice_resultados.py
+
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from clases.espacio_trabajo import directorio_datos
+
+# Tipos de resultado guardados en el índice
+ATENCION = "atencion"
+CERTIFICADO = "certificado"
+
+# Origen de un número de atención guardado: solo se guardan los encontrados en el contenido
+ORIGEN_TEXTO = "texto"
+ORIGEN_OCR = "ocr"
+# El tomado del nombre del archivo solo vale para la subida en la que se encontró
+ORIGEN_NOMBRE = "nombre"
+
+# Formato de las filas; al cambiarlo dejan de usarse todas las guardadas antes
+VERSION_FORMATO = 2
+
+
+def version_reglas(*conjuntos, **extra) -> str:
+    """
+    Huella de las reglas (y opciones) con las que se obtuvo un resultado.
+
+    Si cambian los patrones, los resultados guardados con la versión anterior
+    dejan de usarse y los PDF se vuelven a analizar.
+    """
+    contenido = json.dumps([VERSION_FORMATO, conjuntos, extra], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()[:16]
+
+
+class IndiceResultados:
+    """
+    Índice persistente (SQLite) de los resultados ya extraídos, por hash de contenido del PDF.
+
+    Los procesadores lo consultan antes de parsear un PDF, así que volver a subir
+    un lote conocido no repite la extracción, y permite averiguar qué archivo
+    contenía un número de atención, certificado o asunto. Los workers de otros
+    procesos solo leen; las escrituras se hacen en bloque desde el proceso principal.
+
+    Configuración por variables de entorno: PACA_INDICE_DB (ruta de la base de
+    datos, por defecto indice_resultados.db en PACA_DIR_DATOS; vacía para
+    desactivar el índice).
+    """
+
+    def __init__(self, ruta_db: str):
+        self.ruta_db = ruta_db
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        directorio = os.path.dirname(ruta_db)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+        with self._lock, self._conectar() as conexion:
+            # WAL: los workers pueden leer mientras el proceso principal escribe
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS resultados (
+                    huella TEXT NOT NULL,
+                    tipo TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    nombre_archivo TEXT,
+                    numero_atencion TEXT,
+                    certificado TEXT,
+                    asunto TEXT,
+                    nombre_salida TEXT,
+                    origen_numero TEXT,
+                    clase_documento TEXT,
+                    version_clasificacion TEXT,
+                    procesado TEXT NOT NULL,
+                    PRIMARY KEY (huella, tipo)
+                )
+            """)
+            columnas = {fila["name"] for fila in conexion.execute("PRAGMA table_info(resultados)")}
+            # Bases creadas antes de guardar el origen del número o la clasificación
+            for columna in ("origen_numero", "clase_documento", "version_clasificacion"):
+                if columna not in columnas:
+                    conexion.execute(f"ALTER TABLE resultados ADD COLUMN {columna} TEXT")
+            conexion.execute("CREATE INDEX IF NOT EXISTS idx_numero_atencion ON resultados (numero_atencion)")
+            conexion.execute("CREATE INDEX IF NOT EXISTS idx_certificado ON resultados (certificado)")
+            conexion.execute("CREATE INDEX IF NOT EXISTS idx_asunto ON resultados (asunto)")
+
+    def __getstate__(self):
+        # Solo la ruta: cada proceso abre sus propias conexiones
+        return {"ruta_db": self.ruta_db}
+
+    def __setstate__(self, estado):
+        self.ruta_db = estado["ruta_db"]
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _conectar(self) -> sqlite3.Connection:
+        conexion = sqlite3.connect(self.ruta_db, timeout=30)
+        conexion.row_factory = sqlite3.Row
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        return conexion
+
+    def _conexion_lectura(self) -> sqlite3.Connection:
+        # Una conexión por hilo, reutilizada entre consultas
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = self._local.conexion = self._conectar()
+        return conexion
+
+    def consultar(self, huella: str, tipo: str, version: str) -> Optional[Dict]:
+        """
+        Devuelve el resultado guardado para un PDF, o None si no existe o es de otra versión de reglas.
+
+        Args:
+            huella: Hash SHA-256 del contenido del PDF
+            tipo: ATENCION o CERTIFICADO
+            version: Versión de las reglas del procesador (ver version_reglas)
+        """
+        fila = self._conexion_lectura().execute(
+            "SELECT * FROM resultados WHERE huella = ? AND tipo = ? AND version = ?",
+            (huella, tipo, version)).fetchone()
+        return dict(fila) if fila is not None else None
+
+    def consultar_clasificado(self, huella: str, version_clasificacion: str) -> Optional[Dict]:
+        """
+        Devuelve el resultado guardado para un PDF por el enrutador de lotes mixtos, con su tipo de documento.
+
+        Args:
+            huella: Hash SHA-256 del contenido del PDF
+            version_clasificacion: Versión de las reglas de clasificación (ver version_reglas)
+
+        Returns:
+            La fila (con clase_documento), o None si no la hay con esas reglas
+        """
+        fila = self._conexion_lectura().execute(
+            "SELECT * FROM resultados WHERE huella = ? AND version_clasificacion = ? ORDER BY procesado DESC",
+            (huella, version_clasificacion)).fetchone()
+        return dict(fila) if fila is not None else None
+
+    def guardar(self, filas: Iterable[Dict]):
+        """
+        Guarda (o reemplaza) resultados en una sola transacción.
+
+        Args:
+            filas: Diccionarios con huella, tipo y version, y opcionalmente nombre_archivo,
+                numero_atencion (solo si se encontró en el contenido), origen_numero
+                (ORIGEN_TEXTO u ORIGEN_OCR), certificado, asunto, nombre_salida y, en
+                las del enrutador, clase_documento y version_clasificacion
+        """
+        procesado = datetime.now().isoformat(timespec="seconds")
+        valores = [(f["huella"], f["tipo"], f["version"], f.get("nombre_archivo"), f.get("numero_atencion"),
+                    f.get("certificado"), f.get("asunto"), f.get("nombre_salida"), f.get("origen_numero"),
+                    f.get("clase_documento"), f.get("version_clasificacion"), procesado)
+                   for f in filas]
+        if not valores:
+            return
+        with self._lock, self._conectar() as conexion:
+            conexion.executemany("""
+                INSERT OR REPLACE INTO resultados
+                    (huella, tipo, version, nombre_archivo, numero_atencion, certificado, asunto, nombre_salida,
+                     origen_numero, clase_documento, version_clasificacion, procesado)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, valores)
+
+    def buscar_numero(self, numero: str) -> List[Dict]:
+        """
+        Busca los PDF cuyo número de atención, certificado o asunto coincide con `numero`.
+
+        Returns:
+            Lista de resultados, del más reciente al más antiguo
+        """
+        filas = self._conexion_lectura().execute("""
+            SELECT huella, tipo, nombre_archivo, numero_atencion, origen_numero, certificado, asunto, nombre_salida,
+                   procesado
+            FROM resultados
+            WHERE numero_atencion = ? OR certificado = ? OR asunto = ?
+            ORDER BY procesado DESC
+        """, (numero, numero, numero)).fetchall()
+        return [dict(fila) for fila in filas]
+
+
+_indice = None
+_lock_indice = threading.Lock()
+
+
+def obtener_indice() -> Optional[IndiceResultados]:
+    """Devuelve el índice compartido por todo el proceso (None si está desactivado)."""
+    global _indice
+    ruta_db = os.environ.get("PACA_INDICE_DB")
+    if ruta_db is None:
+        ruta_db = directorio_datos("indice_resultados.db")
+    if not ruta_db:
+        return None
+    with _lock_indice:
+        if _indice is None:
+            _indice = IndiceResultados(ruta_db)
+        return _indice
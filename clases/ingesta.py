@@ -0,0 +1,118 @@
+# clases/ingesta.py
+
+import os
+import hashlib
+from typing import List, NamedTuple
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+TAMANO_BLOQUE = 1024 * 1024
+
+# Límites por defecto; se pueden ajustar con variables de entorno
+MAX_BYTES_ARCHIVO = int(os.environ.get("PACA_MAX_BYTES_ARCHIVO", 500 * 1024 * 1024))
+MAX_BYTES_PETICION = int(os.environ.get("PACA_MAX_BYTES_PETICION", 2 * 1024 * 1024 * 1024))
+
+
+class LimiteSubidaExcedido(Exception):
+    """Se lanza cuando un archivo o el total de la petición supera el tamaño permitido."""
+
+
+class ArchivoSubido(NamedTuple):
+    """Archivo subido ya guardado en disco."""
+    ruta: str
+    huella: str
+    tamano: int
+
+
+def _escribir_bloque(destino, hash_contenido, bloque: bytes):
+    destino.write(bloque)
+    hash_contenido.update(bloque)
+
+
+async def guardar_subida(archivo: UploadFile, directorio: str, max_bytes: int = MAX_BYTES_ARCHIVO) -> ArchivoSubido:
+    """
+    Guarda un archivo subido en disco por bloques, calculando su SHA-256 al vuelo.
+
+    Nunca se carga el archivo completo en memoria y la escritura a disco se hace
+    en el threadpool para no bloquear el event loop.
+
+    Args:
+        archivo: Archivo recibido por FastAPI
+        directorio: Directorio donde guardarlo
+        max_bytes: Tamaño máximo permitido
+
+    Returns:
+        ArchivoSubido con la ruta, el hash del contenido y el tamaño
+
+    Raises:
+        LimiteSubidaExcedido: Si el archivo supera max_bytes (el archivo parcial se elimina)
+    """
+    # Solo el nombre, sin directorios, para no escribir fuera del directorio de trabajo
+    ruta = os.path.join(directorio, os.path.basename(archivo.filename))
+    hash_contenido = hashlib.sha256()
+    tamano = 0
+
+    destino = await run_in_threadpool(open, ruta, "wb")
+    try:
+        while True:
+            bloque = await archivo.read(TAMANO_BLOQUE)
+            if not bloque:
+                break
+
+            tamano += len(bloque)
+            if tamano > max_bytes:
+                raise LimiteSubidaExcedido(
+                    f"El archivo {archivo.filename} supera el tamaño máximo de {max_bytes} bytes")
+
+            await run_in_threadpool(_escribir_bloque, destino, hash_contenido, bloque)
+    except BaseException:
+        await run_in_threadpool(destino.close)
+        os.remove(ruta)
+        raise
+
+    await run_in_threadpool(destino.close)
+    return ArchivoSubido(ruta, hash_contenido.hexdigest(), tamano)
+
+
+async def guardar_subidas(archivos: List[UploadFile], directorio: str,
+                          max_bytes_archivo: int = MAX_BYTES_ARCHIVO,
+                          max_bytes_peticion: int = MAX_BYTES_PETICION) -> List[ArchivoSubido]:
+    """
+    Guarda todos los archivos de una petición respetando el límite por archivo y el total.
+
+    Las huellas de los PDF se registran en la caché de texto compartida, de modo
+    que un PDF ya visto no se vuelve a leer ni a hashear para buscarlo en caché.
+
+    Args:
+        archivos: Archivos recibidos por FastAPI
+        directorio: Directorio donde guardarlos
+        max_bytes_archivo: Tamaño máximo de cada archivo
+        max_bytes_peticion: Tamaño máximo de la suma de todos los archivos
+
+    Returns:
+        Lista de ArchivoSubido en el mismo orden que los archivos recibidos
+
+    Raises:
+        LimiteSubidaExcedido: Si se supera alguno de los límites
+    """
+    from clases.cache_texto import cache_texto
+
+    guardados = []
+    restante = max_bytes_peticion
+
+    for archivo in archivos:
+        limite = min(max_bytes_archivo, restante)
+        try:
+            subido = await guardar_subida(archivo, directorio, limite)
+        except LimiteSubidaExcedido:
+            if limite < max_bytes_archivo:
+                raise LimiteSubidaExcedido(
+                    f"La petición supera el tamaño máximo total de {max_bytes_peticion} bytes")
+            raise
+        restante -= subido.tamano
+        if subido.ruta.lower().endswith(".pdf"):
+            cache_texto.registrar_huella(subido.ruta, subido.huella)
+        guardados.append(subido)
+
+    return guardados
@@ -0,0 +1,350 @@
+# clases/metricas.py
+
+import os
+import time
+import uuid
+import bisect
+import pstats
+import cProfile
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Etapas del procesamiento que se cronometran en los tres procesadores
+INGESTA = "ingesta"
+EXTRAER_TEXTO = "extraer_texto"
+BUSCAR = "buscar"
+ESCRIBIR = "escribir"
+COMPRIMIR = "comprimir"
+OCR = "ocr"
+CONVERTIR = "convertir"
+ETAPAS = (INGESTA, CONVERTIR, EXTRAER_TEXTO, BUSCAR, OCR, ESCRIBIR, COMPRIMIR)
+
+# Límites superiores (en segundos) de los buckets de los histogramas
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Nombre de cada métrica: (tipo de Prometheus, descripción)
+METRICAS = {
+    "paca_etapa_segundos": ("histogram", "Duración de cada etapa del procesamiento, por archivo o por lote"),
+    "paca_peticiones_total": ("counter", "Peticiones HTTP atendidas"),
+    "paca_peticion_segundos": ("histogram", "Duración de las peticiones HTTP (hasta enviar las cabeceras)"),
+    "paca_peticiones_en_curso": ("gauge", "Peticiones HTTP en curso"),
+    "paca_archivos_total": ("counter", "Archivos procesados"),
+    "paca_ejecutor_lotes_en_vuelo": ("gauge", "Lotes enviados al pool del ejecutor y aún no recogidos"),
+    "paca_trabajos_en_cola": ("gauge", "Trabajos asíncronos esperando un worker"),
+    "paca_trabajos_en_proceso": ("gauge", "Trabajos asíncronos en ejecución"),
+    "paca_ocr_pendientes": ("gauge", "Documentos enviados al OCR y aún sin terminar"),
+    "paca_conversion_en_cola": ("gauge", "Conversiones de DOCX a PDF esperando un worker"),
+    "paca_cache_texto_aciertos_total": ("counter", "Búsquedas en la caché de texto que encontraron el PDF"),
+    "paca_cache_texto_fallos_total": ("counter", "Búsquedas en la caché de texto que no encontraron el PDF"),
+    "paca_admision_en_curso": ("gauge", "Peticiones de procesamiento con plaza en el planificador"),
+    "paca_admision_en_espera": ("gauge", "Peticiones de procesamiento esperando plaza"),
+    "paca_admision_espera_segundos": ("histogram", "Tiempo de espera por una plaza de procesamiento"),
+    "paca_admision_rechazadas_total": ("counter", "Peticiones rechazadas por el planificador (429)"),
+    "paca_disco_reservado_bytes": ("gauge", "Espacio en disco reservado para las áreas de trabajo"),
+    "paca_trabajo_areas_activas": ("gauge", "Áreas de trabajo temporales en uso"),
+    "paca_trabajo_areas_limpiadas_total": ("counter", "Áreas de trabajo abandonadas borradas por el limpiador"),
+}
+
+Etiquetas = Tuple[Tuple[str, str], ...]
+
+
+class Histograma:
+    """Histograma acumulativo con buckets fijos, como los de Prometheus."""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.conteos = [0] * (len(buckets) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.conteos[bisect.bisect_left(self.buckets, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+    def acumulados(self) -> Iterator[Tuple[str, int]]:
+        """Devuelve (límite, observaciones menores o iguales) de cada bucket, terminando en +Inf."""
+        acumulado = 0
+        for limite, conteo in zip((*self.buckets, "+Inf"), self.conteos):
+            acumulado += conteo
+            yield str(limite), acumulado
+
+
+class RegistroMetricas:
+    """
+    Contadores, indicadores e histogramas del proceso, exportables en el formato de texto de Prometheus.
+
+    Las métricas se identifican por su nombre (ver METRICAS) y sus etiquetas. Los
+    indicadores que se pueden leer directamente de otro objeto (la longitud de
+    una cola, por ejemplo) se registran como sondas y se evalúan al exportar.
+    """
+
+    def __init__(self):
+        self._valores = {}
+        self._histogramas = {}
+        self._sondas = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, nombre: str, valor: float = 1, **etiquetas):
+        """Suma `valor` a un contador o indicador (puede ser negativo en los indicadores)."""
+        clave = (nombre, _etiquetas(etiquetas))
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def fijar(self, nombre: str, valor: float, **etiquetas):
+        """Fija el valor de un indicador."""
+        with self._lock:
+            self._valores[(nombre, _etiquetas(etiquetas))] = valor
+
+    def observar(self, nombre: str, valor: float, **etiquetas):
+        """Añade una observación (en segundos) a un histograma."""
+        clave = (nombre, _etiquetas(etiquetas))
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = self._histogramas[clave] = Histograma()
+            histograma.observar(valor)
+
+    def registrar_sonda(self, nombre: str, funcion: Callable[[], float], **etiquetas):
+        """Registra una función que da el valor de una métrica en el momento de exportarla."""
+        with self._lock:
+            self._sondas[(nombre, _etiquetas(etiquetas))] = funcion
+
+    def exportar(self) -> str:
+        """Devuelve todas las métricas en el formato de texto de Prometheus (versión 0.0.4)."""
+        with self._lock:
+            valores = dict(self._valores)
+            histogramas = {clave: (list(h.acumulados()), h.suma, h.total) for clave, h in self._histogramas.items()}
+            sondas = dict(self._sondas)
+
+        for clave, funcion in sondas.items():
+            try:
+                valores[clave] = funcion()
+            except Exception as e:
+                print(f"⚠️ No se pudo leer la métrica {clave[0]}: {str(e)}")
+
+        lineas = []
+        for nombre, (tipo, ayuda) in METRICAS.items():
+            series = [(e, v) for (n, e), v in valores.items() if n == nombre]
+            series_histograma = [(e, h) for (n, e), h in histogramas.items() if n == nombre]
+            if not series and not series_histograma:
+                continue
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for etiquetas, valor in sorted(series):
+                lineas.append(f"{nombre}{_formatear(etiquetas)} {valor}")
+            for etiquetas, (acumulados, suma, total) in sorted(series_histograma):
+                for limite, acumulado in acumulados:
+                    lineas.append(f"{nombre}_bucket{_formatear(etiquetas + (('le', limite),))} {acumulado}")
+                lineas.append(f"{nombre}_sum{_formatear(etiquetas)} {suma}")
+                lineas.append(f"{nombre}_count{_formatear(etiquetas)} {total}")
+        return "\n".join(lineas) + "\n"
+
+
+def _etiquetas(etiquetas: Dict) -> Etiquetas:
+    return tuple(sorted((clave, str(valor)) for clave, valor in etiquetas.items()))
+
+
+def _formatear(etiquetas: Etiquetas) -> str:
+    if not etiquetas:
+        return ""
+    partes = []
+    for clave, valor in etiquetas:
+        valor = valor.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        partes.append(f'{clave}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+# Registro compartido por todo el proceso
+metricas = RegistroMetricas()
+
+# Tiempo acumulado de cada etapa en la petición HTTP en curso (para Server-Timing)
+_tiempos_peticion: ContextVar[Optional[Dict[str, float]]] = ContextVar("tiempos_peticion", default=None)
+
+
+class CronometroEtapas:
+    """
+    Acumula el tiempo de cada etapa dentro de una operación.
+
+    Se usa en los workers, que pueden estar en otro proceso: solo miden y
+    devuelven `tiempos` (un dict normal) junto con su resultado, y el proceso
+    principal los registra con registrar_etapas().
+    """
+
+    def __init__(self):
+        self.tiempos = {}
+
+    @contextmanager
+    def medir(self, etapa: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tiempos[etapa] = self.tiempos.get(etapa, 0.0) + time.perf_counter() - inicio
+
+
+def registrar_etapas(procesador: str, tiempos: Dict[str, float]):
+    """
+    Registra el tiempo de varias etapas de una operación del procesador.
+
+    Args:
+        procesador: Procesador que hizo el trabajo ("procesar_pdfs", ...)
+        tiempos: Segundos de cada etapa
+    """
+    acumulado = _tiempos_peticion.get()
+    for etapa, segundos in tiempos.items():
+        metricas.observar("paca_etapa_segundos", segundos, procesador=procesador, etapa=etapa)
+        if acumulado is not None:
+            acumulado[etapa] = acumulado.get(etapa, 0.0) + segundos
+
+
+@contextmanager
+def medir_etapa(procesador: str, etapa: str):
+    """Cronometra un bloque como una etapa del procesador."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_etapas(procesador, {etapa: time.perf_counter() - inicio})
+
+
+def iterar_midiendo(elementos: Iterable, procesador: str, etapa: str) -> Iterator:
+    """Recorre un iterable perezoso atribuyendo a la etapa el tiempo de producir cada elemento."""
+    iterador = iter(elementos)
+    while True:
+        inicio = time.perf_counter()
+        try:
+            elemento = next(iterador)
+        except StopIteration:
+            return
+        registrar_etapas(procesador, {etapa: time.perf_counter() - inicio})
+        yield elemento
+
+
+def iniciar_tiempos_peticion() -> Dict[str, float]:
+    """Empieza a acumular los tiempos por etapa de la petición en curso y devuelve el acumulador."""
+    tiempos = {}
+    _tiempos_peticion.set(tiempos)
+    return tiempos
+
+
+def cabecera_server_timing(tiempos: Dict[str, float], total: float) -> str:
+    """
+    Construye la cabecera Server-Timing con el tiempo de cada etapa y el total, en milisegundos.
+
+    Las etapas que se ejecutan en paralelo (extraer_texto, buscar) suman el
+    tiempo de todos los workers, así que pueden superar al total.
+    """
+    partes = [f"{etapa};dur={segundos * 1000:.1f}" for etapa, segundos in tiempos.items()]
+    partes.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(partes)
+
+
+# Perfiles de la petición en curso (el del bucle de eventos y los de sus hilos), si se perfila
+_perfiles_peticion: ContextVar[Optional[List[cProfile.Profile]]] = ContextVar("perfiles_peticion", default=None)
+
+
+def perfilando() -> bool:
+    """Indica si la petición en curso se está perfilando (ver Perfilador)."""
+    return _perfiles_peticion.get() is not None
+
+
+def perfilar(funcion: Callable) -> Callable:
+    """
+    Prepara una función que se ejecutará en otro hilo (run_in_threadpool) para que
+    entre en el perfil de la petición en curso; si no se perfila, la devuelve tal cual.
+    Si el intérprete no admite un perfil en ese hilo, la función se ejecuta igual.
+    """
+    perfiles = _perfiles_peticion.get()
+    if perfiles is None:
+        return funcion
+
+    @functools.wraps(funcion)
+    def perfilada(*args, **kwargs):
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Desde Python 3.12 solo puede haber un perfilador activo en el proceso (el
+            # del bucle de eventos): la función se ejecuta sin entrar en el perfil
+            return funcion(*args, **kwargs)
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            perfil.disable()
+            perfiles.append(perfil)
+
+    return perfilada
+
+
+class Perfilador:
+    """
+    Perfilado con cProfile de peticiones sueltas, activado por petición con la cabecera X-Perfil.
+
+    Solo se perfila una petición a la vez (en las demás se ignora la cabecera). Se
+    perfila el hilo del bucle de eventos y las funciones que la petición ejecuta en
+    otros hilos envueltas con perfilar(); mientras tanto el ejecutor trabaja en modo
+    "secuencial", así que el procesamiento queda en el perfil (el pool del OCR no, y
+    en las respuestas en streaming solo lo que se hace antes de enviar las cabeceras).
+    Cada perfil se guarda como archivo .prof, legible con pstats o snakeviz.
+
+    Configuración por variables de entorno: PACA_PERFILADO ("1" para permitirlo)
+    y PACA_DIR_PERFILES (por defecto, perfiles/ en PACA_DIR_DATOS).
+    """
+
+    def __init__(self, directorio: str = None, activado: bool = None):
+        # Importación local: espacio_trabajo depende de este módulo
+        from clases.espacio_trabajo import directorio_datos
+        self.directorio = directorio or os.environ.get("PACA_DIR_PERFILES") or directorio_datos("perfiles")
+        self.activado = activado if activado is not None else os.environ.get("PACA_PERFILADO") == "1"
+        self._lock = threading.Lock()
+
+    def iniciar(self) -> Optional[List[cProfile.Profile]]:
+        """
+        Empieza a perfilar la petición en curso (desde el bucle de eventos).
+
+        Returns:
+            Los perfiles de la petición, a los que perfilar() añade los de otros
+            hilos, o None si el perfilado está desactivado u ocupado
+        """
+        if not self.activado or not self._lock.acquire(blocking=False):
+            return None
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Ya hay otro perfilador activo en el proceso
+            self._lock.release()
+            return None
+        perfiles = [perfil]
+        _perfiles_peticion.set(perfiles)
+        return perfiles
+
+    def terminar(self, perfiles: List[cProfile.Profile], ruta: str) -> str:
+        """
+        Detiene el perfilado y guarda el resultado, con los perfiles de todos los hilos juntos.
+
+        Args:
+            perfiles: Perfiles devueltos por iniciar()
+            ruta: Ruta de la petición, para el nombre del archivo
+
+        Returns:
+            Nombre del archivo .prof creado en el directorio de perfiles
+        """
+        try:
+            perfiles[0].disable()
+        finally:
+            _perfiles_peticion.set(None)
+            self._lock.release()
+        estadisticas = pstats.Stats(perfiles[0])
+        for perfil in perfiles[1:]:
+            estadisticas.add(perfil)
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta = ruta.strip("/").replace("/", "_") or "raiz"
+        nombre = f"{datetime.now():%Y%m%d_%H%M%S}_{ruta}_{uuid.uuid4().hex[:8]}.prof"
+        estadisticas.dump_stats(os.path.join(self.directorio, nombre))
+        return nombre
@@ -0,0 +1,192 @@
+# clases/motor_patrones.py
+
+import os
+import re
+import json
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+
+class Regla(NamedTuple):
+    """Expresión regular con su sensibilidad a mayúsculas."""
+    patron: str
+    ignorar_mayusculas: bool = True
+
+
+class MotorPatrones:
+    """
+    Conjunto de expresiones regulares compiladas una vez y evaluadas por prioridad.
+
+    El resultado es el mismo que aplicar las reglas una a una con re.search y
+    quedarse con la primera que coincide: gana la regla de mayor prioridad (la
+    primera de la lista) y, dentro de ella, la coincidencia más a la izquierda.
+
+    Para no recorrer el texto una vez por regla, cada regla lleva un literal
+    obligatorio (el prefijo fijo del patrón, p. ej. "radicado"). El texto se pasa
+    a minúsculas una sola vez y solo se ejecutan las reglas cuyo literal aparece;
+    las reglas sin prefijo fijo se ejecutan siempre.
+    """
+
+    def __init__(self, reglas: Sequence[Regla]):
+        """
+        Args:
+            reglas: Reglas en orden de prioridad; se devuelve el primer grupo de
+                captura de la regla ganadora (o la coincidencia completa si no tiene)
+        """
+        self.reglas = tuple(reglas)
+        self._compiladas = []
+        for regla in self.reglas:
+            banderas = re.IGNORECASE if regla.ignorar_mayusculas else 0
+            literal = _prefijo_literal(regla.patron)
+            if literal and regla.ignorar_mayusculas:
+                literal = literal.lower()
+            self._compiladas.append((re.compile(regla.patron, banderas), literal, regla.ignorar_mayusculas))
+
+    def buscar(self, texto: str) -> Optional[str]:
+        """
+        Devuelve el valor capturado por la regla de mayor prioridad que coincide.
+
+        Args:
+            texto: Texto en el que buscar
+
+        Returns:
+            Primer grupo de captura de la regla ganadora o None
+        """
+        resultado = self.buscar_con_regla(texto)
+        return resultado[1] if resultado else None
+
+    def buscar_con_regla(self, texto: str) -> Optional[Tuple[int, str]]:
+        """
+        Igual que buscar(), pero indica además qué regla coincidió.
+
+        Returns:
+            Tuple con (índice_de_la_regla, valor_capturado) o None
+        """
+        if not texto:
+            return None
+
+        minusculas = None
+        for indice, (compilada, literal, ignorar) in enumerate(self._compiladas):
+            # La primera regla se ejecuta directamente: si coincide (el caso
+            # habitual) no compensa pasar el texto a minúsculas
+            if literal and indice > 0:
+                if ignorar:
+                    if minusculas is None:
+                        minusculas = texto.lower()
+                    if literal not in minusculas:
+                        continue
+                elif literal not in texto:
+                    continue
+
+            match = compilada.search(texto)
+            if match:
+                return indice, match.group(1 if compilada.groups else 0)
+        return None
+
+
+def _prefijo_literal(patron: str) -> str:
+    """
+    Devuelve el prefijo de texto fijo con el que debe empezar toda coincidencia.
+
+    Se detiene en el primer metacarácter; si el último carácter fijo va seguido
+    de un cuantificador que admite cero repeticiones, se descarta.
+    """
+    if patron.startswith("(?") or _tiene_alternancia_global(patron):
+        return ""
+
+    literal = []
+    i = 0
+    while i < len(patron):
+        caracter = patron[i]
+        if caracter == "\\":
+            if i + 1 < len(patron) and not patron[i + 1].isalnum():
+                literal.append(patron[i + 1])
+                i += 2
+                continue
+            break
+        if caracter in ".^$*+?{}[]|()":
+            break
+        literal.append(caracter)
+        i += 1
+
+    if literal and i < len(patron) and patron[i] in "*?{":
+        literal.pop()
+    return "".join(literal)
+
+
+def _tiene_alternancia_global(patron: str) -> bool:
+    """Indica si el patrón tiene un "|" fuera de grupos y clases de caracteres."""
+    profundidad = 0
+    en_clase = False
+    i = 0
+    while i < len(patron):
+        caracter = patron[i]
+        if caracter == "\\":
+            i += 2
+            continue
+        if en_clase:
+            en_clase = caracter != "]"
+        elif caracter == "[":
+            en_clase = True
+        elif caracter == "(":
+            profundidad += 1
+        elif caracter == ")":
+            profundidad -= 1
+        elif caracter == "|" and profundidad == 0:
+            return True
+        i += 1
+    return False
+
+
+def _normalizar(reglas: Sequence[Union[str, Dict, Regla]], ignorar_mayusculas: bool) -> Tuple[Regla, ...]:
+    normalizadas = []
+    for regla in reglas:
+        if isinstance(regla, Regla):
+            normalizadas.append(regla)
+        elif isinstance(regla, str):
+            normalizadas.append(Regla(regla, ignorar_mayusculas))
+        else:
+            normalizadas.append(Regla(regla["patron"], regla.get("ignorar_mayusculas", ignorar_mayusculas)))
+    return tuple(normalizadas)
+
+
+@lru_cache(maxsize=64)
+def _motor_cacheado(reglas: Tuple[Regla, ...]) -> MotorPatrones:
+    return MotorPatrones(reglas)
+
+
+def obtener_motor(reglas: Sequence[Union[str, Dict, Regla]], ignorar_mayusculas: bool = True) -> MotorPatrones:
+    """
+    Devuelve el motor compilado para las reglas dadas; se compila una vez por proceso.
+
+    Args:
+        reglas: Patrones en orden de prioridad (cadenas, diccionarios
+            {"patron", "ignorar_mayusculas"} o Regla)
+        ignorar_mayusculas: Valor por defecto para las reglas que no lo indican
+
+    Returns:
+        MotorPatrones compartido
+    """
+    return _motor_cacheado(_normalizar(reglas, ignorar_mayusculas))
+
+
+def cargar_reglas(nombre: str, por_defecto: List) -> List:
+    """
+    Devuelve las reglas configuradas para un conjunto, o las de por defecto.
+
+    Si la variable de entorno PACA_PATRONES apunta a un archivo JSON con una
+    clave igual a `nombre`, se usan esas reglas. Así se pueden añadir formatos de
+    nuevos clientes sin tocar el código, por ejemplo:
+
+        {"atencion": ["Atención N°\\\\s*(\\\\d+)", {"patron": "Caso\\\\s*(\\\\d+)", "ignorar_mayusculas": false}]}
+    """
+    ruta = os.environ.get("PACA_PATRONES")
+    if not ruta:
+        return list(por_defecto)
+    return list(_leer_configuracion(ruta).get(nombre, por_defecto))
+
+
+@lru_cache(maxsize=8)
+def _leer_configuracion(ruta: str) -> Dict:
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,47 @@
+# clases/nombres_salida.py
+
+import os
+from typing import Dict, Set
+
+
+class AsignadorNombres:
+    """
+    Reparte nombres de archivo únicos en memoria, sin consultar el sistema de archivos.
+
+    El primer archivo con un nombre lo conserva y los siguientes reciben un sufijo
+    numérico (`nombre_1.pdf`, `nombre_2.pdf`, ...). Se recuerda el siguiente
+    sufijo libre de cada nombre, así que resolver una colisión cuesta O(1)
+    amortizado. No es seguro entre hilos: se usa desde un único hilo, después de
+    la extracción, lo que además hace que los nombres dependan solo del orden de
+    los archivos y no de qué worker termina antes.
+    """
+
+    def __init__(self):
+        self._usados: Set[str] = set()
+        self._siguiente_sufijo: Dict[str, int] = {}
+
+    def asignar(self, nombre: str) -> str:
+        """
+        Devuelve un nombre libre a partir de `nombre` y lo marca como usado.
+
+        Args:
+            nombre: Nombre deseado
+
+        Returns:
+            El mismo nombre si estaba libre o el nombre con el primer sufijo libre
+        """
+        if nombre not in self._usados:
+            self._usados.add(nombre)
+            return nombre
+
+        nombre_base, extension = os.path.splitext(nombre)
+        contador = self._siguiente_sufijo.get(nombre, 1)
+        candidato = f"{nombre_base}_{contador}{extension}"
+        # Un nombre con sufijo puede estar ocupado por otro archivo que ya se llamaba así
+        while candidato in self._usados:
+            contador += 1
+            candidato = f"{nombre_base}_{contador}{extension}"
+
+        self._siguiente_sufijo[nombre] = contador + 1
+        self._usados.add(candidato)
+        return candidato
@@ -0,0 +1,221 @@
+# clases/ocr.py
+
+import os
+import time
+import shutil
+import hashlib
+import threading
+import subprocess
+import concurrent.futures
+from collections import OrderedDict, deque
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
+
+from clases.backend_pdf import REGION_ENCABEZADO, Region, abrir_pdf, fitz_disponible, parsear_region
+from clases.ejecutor import contexto_procesos
+from clases.entrada_pdf import FuentePDF, descripcion_fuente, leer_bytes
+from clases.metricas import metricas
+
+
+class ResultadoOCR(NamedTuple):
+    """Texto reconocido en el encabezado de la primera página y lo que costó obtenerlo."""
+    texto: str
+    segundos_render: float
+    segundos_tesseract: float
+
+    @property
+    def segundos(self) -> float:
+        return self.segundos_render + self.segundos_tesseract
+
+
+def _reconocer_encabezado(fuente: Union[str, FuentePDF], tesseract: str, region: Region,
+                          dpi: int, idioma: str, timeout: float) -> ResultadoOCR:
+    """
+    Renderiza la región de la primera página y la pasa por Tesseract.
+
+    Se ejecuta en el pool de procesos del OCR.
+    """
+    inicio = time.perf_counter()
+    with abrir_pdf(fuente, "fitz") as documento:
+        if documento.num_paginas == 0:
+            return ResultadoOCR("", 0.0, 0.0)
+        imagen = documento.renderizar(0, region, dpi)
+    segundos_render = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    proceso = subprocess.run(
+        [tesseract, "stdin", "stdout", "-l", idioma, "--psm", "6"],
+        input=imagen, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout, check=True)
+    return ResultadoOCR(proceso.stdout.decode("utf-8", errors="replace"),
+                        segundos_render, time.perf_counter() - inicio)
+
+
+class MotorOCR:
+    """
+    OCR de respaldo para PDF escaneados (sin capa de texto) con un Tesseract local.
+
+    Solo se renderiza la región del encabezado de la primera página, a una
+    resolución moderada, y el reconocimiento se hace en un pool de procesos
+    propio y acotado: el OCR es lento y no debe ocupar los workers de la
+    extracción normal. Como mucho hay `max_pendientes` documentos en cola; quien
+    envía más espera a que termine alguno. Los resultados se guardan en caché
+    por el hash del contenido del PDF.
+
+    Configuración por variables de entorno: PACA_OCR ("0" para desactivarlo),
+    PACA_TESSERACT, PACA_OCR_WORKERS, PACA_OCR_DPI, PACA_OCR_IDIOMA,
+    PACA_OCR_TIMEOUT y PACA_REGION_OCR.
+    """
+
+    def __init__(self, tesseract: str = None, num_workers: int = None, dpi: int = None,
+                 idioma: str = None, timeout: float = None, region: Region = None,
+                 max_entradas_cache: int = 1024):
+        """
+        Args:
+            tesseract: Ruta del ejecutable de Tesseract
+            num_workers: Procesos del pool de OCR
+            dpi: Resolución con la que se renderiza el encabezado
+            idioma: Idioma de Tesseract
+            timeout: Segundos máximos por documento
+            region: Región de la primera página que se reconoce
+            max_entradas_cache: Documentos cuyo resultado se guarda en caché
+        """
+        activado = os.environ.get("PACA_OCR", "1") != "0"
+        self.tesseract = tesseract or os.environ.get("PACA_TESSERACT") or shutil.which("tesseract")
+        if not activado:
+            self.tesseract = None
+        self.num_workers = num_workers or int(os.environ.get("PACA_OCR_WORKERS", 2))
+        self.dpi = dpi or int(os.environ.get("PACA_OCR_DPI", 150))
+        self.idioma = idioma or os.environ.get("PACA_OCR_IDIOMA", "spa")
+        self.timeout = timeout or float(os.environ.get("PACA_OCR_TIMEOUT", 60))
+        self.region = region or parsear_region(os.environ.get("PACA_REGION_OCR")) or REGION_ENCABEZADO
+        self.max_pendientes = self.num_workers * 2
+        self.max_entradas_cache = max_entradas_cache
+
+        self._cache = OrderedDict()
+        self._pendientes = threading.BoundedSemaphore(self.max_pendientes)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._en_curso = 0
+
+    @property
+    def pendientes(self) -> int:
+        """Documentos enviados al pool del OCR que aún no han terminado."""
+        return self._en_curso
+
+    @property
+    def disponible(self) -> bool:
+        """Indica si hay Tesseract (y PyMuPDF para renderizar) y el OCR no está desactivado."""
+        return bool(self.tesseract) and fitz_disponible()
+
+    def enviar(self, fuente: Union[str, FuentePDF], huella: str = None) -> concurrent.futures.Future:
+        """
+        Pone en cola el OCR del encabezado de un PDF.
+
+        Si ya hay `max_pendientes` documentos en cola, espera a que termine alguno.
+
+        Args:
+            fuente: Ruta del archivo PDF o PDF en memoria
+            huella: Hash de contenido del PDF (el de la ingesta); si no se indica, se calcula
+
+        Returns:
+            Future que se resuelve con un ResultadoOCR
+        """
+        huella = huella or getattr(fuente, "huella", None) or hashlib.sha256(leer_bytes(fuente)).hexdigest()
+        clave = (huella, self.region, self.dpi, self.idioma)
+        with self._lock:
+            en_cache = self._cache.get(clave)
+            if en_cache is not None:
+                self._cache.move_to_end(clave)
+        if en_cache is not None:
+            futuro = concurrent.futures.Future()
+            futuro.set_result(ResultadoOCR(en_cache, 0.0, 0.0))
+            return futuro
+
+        self._pendientes.acquire()
+        try:
+            futuro = self._obtener_pool().submit(
+                _reconocer_encabezado, fuente, self.tesseract, self.region, self.dpi, self.idioma, self.timeout)
+        except BaseException:
+            self._pendientes.release()
+            raise
+        with self._lock:
+            self._en_curso += 1
+        futuro.add_done_callback(lambda f: self._terminado(clave, f))
+        return futuro
+
+    def reconocer(self, fuente: Union[str, FuentePDF], huella: str = None) -> ResultadoOCR:
+        """Igual que enviar(), pero espera el resultado."""
+        return self.enviar(fuente, huella).result()
+
+    def _obtener_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # Como los del ejecutor: sin fork desde un proceso con hilos
+                self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.num_workers,
+                                                                    mp_context=contexto_procesos())
+            return self._pool
+
+    def _terminado(self, clave, futuro: concurrent.futures.Future):
+        self._pendientes.release()
+        with self._lock:
+            self._en_curso -= 1
+        if futuro.cancelled() or futuro.exception() is not None:
+            return
+        with self._lock:
+            self._cache[clave] = futuro.result().texto
+            while len(self._cache) > self.max_entradas_cache:
+                self._cache.popitem(last=False)
+
+
+def intercalar_ocr(elementos: Iterable[Tuple], motor: MotorOCR, necesita_ocr: Callable[[Tuple], bool],
+                   max_en_espera: int = 256) -> Iterator[Tuple[Tuple, Optional[concurrent.futures.Future]]]:
+    """
+    Envía al OCR los elementos de un flujo ordenado que lo necesitan, sin alterar el orden.
+
+    Los elementos que llegan detrás de uno pendiente de OCR se retienen hasta que
+    termina; si se acumulan más de `max_en_espera`, se espera a ese OCR antes de
+    seguir leyendo el flujo, lo que acota la memoria.
+
+    Args:
+        elementos: Tuplas cuyo primer valor es la fuente del PDF y el segundo su
+            resultado; la huella del resultado, si la tiene, evita volver a hashear el PDF
+        motor: Motor de OCR
+        necesita_ocr: Indica si un elemento debe pasar por OCR
+        max_en_espera: Elementos que pueden quedar retenidos detrás de un OCR
+
+    Yields:
+        Tuple con (elemento, futuro_del_ocr); el futuro es None si no hizo falta OCR
+        y puede no haber terminado todavía (su result() espera)
+    """
+    cola = deque()
+    for elemento in elementos:
+        ocr = None
+        if necesita_ocr(elemento):
+            resultado = elemento[1] if len(elemento) > 1 and isinstance(elemento[1], dict) else {}
+            ocr = motor.enviar(elemento[0], resultado.get("huella"))
+        cola.append((elemento, ocr))
+        while cola and (cola[0][1] is None or cola[0][1].done() or len(cola) > max_en_espera):
+            yield cola.popleft()
+    yield from cola
+
+
+def describir_error_ocr(fuente: Union[str, FuentePDF], error: Exception) -> str:
+    """Mensaje de error legible para un OCR fallido."""
+    if isinstance(error, subprocess.TimeoutExpired):
+        return f"El OCR de {descripcion_fuente(fuente)} superó el tiempo máximo"
+    if isinstance(error, subprocess.CalledProcessError):
+        return f"Tesseract falló con {descripcion_fuente(fuente)}: {error.stderr.decode(errors='replace').strip()}"
+    return f"Error en el OCR de {descripcion_fuente(fuente)}: {str(error)}"
+
+
+_motor_ocr = None
+_lock_motor_ocr = threading.Lock()
+
+
+def obtener_motor_ocr() -> MotorOCR:
+    """Devuelve el motor de OCR compartido por todo el proceso, creándolo la primera vez."""
+    global _motor_ocr
+    with _lock_motor_ocr:
+        if _motor_ocr is None:
+            _motor_ocr = MotorOCR()
+            metricas.registrar_sonda("paca_ocr_pendientes", lambda: _motor_ocr.pendientes)
+        return _motor_ocr
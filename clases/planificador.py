@@ -0,0 +1,268 @@
+# clases/planificador.py
+
+import os
+import math
+import time
+import shutil
+import asyncio
+import threading
+from collections import deque
+from typing import Dict
+
+from clases.espacio_trabajo import raiz_por_defecto
+from clases.metricas import metricas
+
+
+class ServidorSaturado(Exception):
+    """Se lanza cuando una petición no se puede admitir; el cliente debe reintentar más tarde."""
+
+    def __init__(self, mensaje: str, reintentar_en: int):
+        super().__init__(mensaje)
+        self.reintentar_en = reintentar_en
+
+
+class Plaza:
+    """Plaza de procesamiento concedida por el planificador; se devuelve con salir()."""
+
+    def __init__(self, tipo: str, bytes_reservados: int):
+        self.tipo = tipo
+        self.bytes_reservados = bytes_reservados
+        self.inicio = time.monotonic()
+        self.liberada = False
+
+
+class PlanificadorPeticiones:
+    """
+    Control de admisión de las peticiones de procesamiento.
+
+    Limita cuántas peticiones se procesan a la vez, en total y por tipo de
+    procesamiento, para que una ráfaga no reparta el pool del ejecutor entre
+    demasiadas peticiones ni agote la memoria. Las que no caben esperan en una
+    cola FIFO de profundidad máxima; con la cola llena, o si la espera supera el
+    tiempo máximo, se rechazan con ServidorSaturado (HTTP 429 y Retry-After).
+
+    También reserva espacio en disco para las áreas de trabajo temporales: cada
+    petición reserva FACTOR_DISCO veces el tamaño de su subida (entradas, salidas
+    y ZIP) y se rechaza si la suma de reservas supera el presupuesto o si el disco
+    de las áreas de trabajo se quedaría por debajo del mínimo libre.
+
+    Se usa desde el bucle de eventos: no es seguro entre hilos.
+
+    Configuración por variables de entorno: PACA_MAX_PETICIONES, PACA_LIMITES_PETICIONES
+    (p. ej. "procesar_docx=1,procesar_pdfs=2"), PACA_MAX_ESPERA, PACA_TIMEOUT_ESPERA,
+    PACA_DISCO_MAX_BYTES y PACA_DISCO_MIN_LIBRE.
+    """
+
+    # Espacio en disco que ocupa una petición respecto a su subida
+    FACTOR_DISCO = 3
+    # Duración supuesta de una petición mientras no se ha medido ninguna de su tipo
+    DURACION_INICIAL = 30.0
+    # Peso de la última duración en la media móvil
+    PESO_DURACION = 0.2
+
+    def __init__(self, max_concurrentes: int = None, limites: Dict[str, int] = None, max_espera: int = None,
+                 timeout_espera: float = None, max_bytes_disco: int = None, min_libre_disco: int = None,
+                 directorio: str = None):
+        """
+        Args:
+            max_concurrentes: Peticiones procesándose a la vez, en total
+            limites: Máximo por tipo de procesamiento; por defecto, la mitad del total
+            max_espera: Peticiones que pueden esperar plaza antes de rechazar
+            timeout_espera: Segundos máximos de espera por una plaza
+            max_bytes_disco: Presupuesto de disco de las áreas de trabajo
+            min_libre_disco: Espacio libre que debe quedar en el disco de las áreas de trabajo
+            directorio: Directorio cuyo disco se vigila (por defecto, la raíz de las áreas de trabajo)
+        """
+        self.max_concurrentes = max_concurrentes or int(
+            os.environ.get("PACA_MAX_PETICIONES", 0)) or max(2, os.cpu_count() or 2)
+        self.limites = limites if limites is not None else _parsear_limites(
+            os.environ.get("PACA_LIMITES_PETICIONES", ""))
+        self.max_espera = max_espera if max_espera is not None else int(os.environ.get("PACA_MAX_ESPERA", 32))
+        self.timeout_espera = timeout_espera or float(os.environ.get("PACA_TIMEOUT_ESPERA", 120))
+        self.max_bytes_disco = max_bytes_disco or int(os.environ.get("PACA_DISCO_MAX_BYTES", 20 * 1024 ** 3))
+        self.min_libre_disco = min_libre_disco if min_libre_disco is not None else int(
+            os.environ.get("PACA_DISCO_MIN_LIBRE", 1024 ** 3))
+        self.directorio = directorio or raiz_por_defecto()
+
+        self._en_curso = {}
+        self._total_en_curso = 0
+        self._espera = deque()
+        self._reservado = 0
+        self._duraciones = {}
+
+    @property
+    def en_curso(self) -> int:
+        """Peticiones que tienen plaza."""
+        return self._total_en_curso
+
+    @property
+    def en_espera(self) -> int:
+        """Peticiones esperando plaza."""
+        return len(self._espera)
+
+    @property
+    def bytes_reservados(self) -> int:
+        """Espacio en disco reservado por las peticiones en curso."""
+        return self._reservado
+
+    def limite(self, tipo: str) -> int:
+        """Peticiones de un tipo que se pueden procesar a la vez."""
+        return min(self.max_concurrentes, self.limites.get(tipo) or math.ceil(self.max_concurrentes / 2))
+
+    async def entrar(self, tipo: str, bytes_subida: int = 0) -> Plaza:
+        """
+        Espera una plaza de procesamiento para una petición.
+
+        Args:
+            tipo: Tipo de procesamiento ("procesar_pdfs", ...)
+            bytes_subida: Tamaño de la subida (Content-Length), para la reserva de disco
+
+        Returns:
+            La plaza concedida, que hay que devolver con salir()
+
+        Raises:
+            ServidorSaturado: Si no hay disco, la cola de espera está llena o la espera se agota
+        """
+        reserva = bytes_subida * self.FACTOR_DISCO
+        self._reservar_disco(tipo, reserva)
+        try:
+            await self._ocupar(tipo)
+        except BaseException:
+            self._liberar_disco(reserva)
+            raise
+        return Plaza(tipo, reserva)
+
+    def salir(self, plaza: Plaza):
+        """Devuelve una plaza y su reserva de disco; se puede llamar más de una vez."""
+        if plaza.liberada:
+            return
+        plaza.liberada = True
+        duracion = time.monotonic() - plaza.inicio
+        anterior = self._duraciones.get(plaza.tipo)
+        self._duraciones[plaza.tipo] = duracion if anterior is None else (
+            anterior + self.PESO_DURACION * (duracion - anterior))
+        self._liberar_disco(plaza.bytes_reservados)
+        self._desocupar(plaza.tipo)
+
+    def verificar_disco(self, tipo: str, bytes_subida: int = 0):
+        """
+        Comprueba, sin reservarlo, que hay disco para guardar una subida (trabajos asíncronos).
+
+        Raises:
+            ServidorSaturado: Si el disco de las áreas de trabajo se quedaría por debajo del mínimo libre
+        """
+        if self._libre() - self._reservado - bytes_subida < self.min_libre_disco:
+            self._rechazar(tipo, "disco", "No queda espacio en disco para procesar la petición, inténtelo más tarde")
+
+    def reintentar_en(self, tipo: str) -> int:
+        """Segundos estimados hasta que haya plaza, según la duración media de las peticiones del tipo."""
+        duracion = self._duraciones.get(tipo, self.DURACION_INICIAL)
+        return max(1, min(600, math.ceil(duracion * (len(self._espera) + 1) / self.limite(tipo))))
+
+    async def _ocupar(self, tipo: str):
+        if self._puede_entrar(tipo):
+            self._ocupar_plaza(tipo)
+            return
+        if len(self._espera) >= self.max_espera:
+            self._rechazar(tipo, "cola_llena", "El servidor está ocupado, inténtelo más tarde")
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._espera.append((tipo, futuro))
+        inicio = time.perf_counter()
+        try:
+            await asyncio.wait_for(futuro, self.timeout_espera)
+        except asyncio.TimeoutError:
+            self._abandonar(tipo, futuro)
+            self._rechazar(tipo, "timeout", "Se agotó la espera por una plaza de procesamiento, inténtelo más tarde")
+        except BaseException:
+            # El cliente se desconectó mientras esperaba
+            self._abandonar(tipo, futuro)
+            raise
+        finally:
+            metricas.observar("paca_admision_espera_segundos", time.perf_counter() - inicio, tipo=tipo)
+
+    def _abandonar(self, tipo: str, futuro: asyncio.Future):
+        if (tipo, futuro) in self._espera:
+            self._espera.remove((tipo, futuro))
+        else:
+            # La plaza se concedió a la vez que se abandonaba la espera
+            self._desocupar(tipo)
+
+    def _puede_entrar(self, tipo: str) -> bool:
+        return (self._total_en_curso < self.max_concurrentes
+                and self._en_curso.get(tipo, 0) < self.limite(tipo))
+
+    def _ocupar_plaza(self, tipo: str):
+        self._en_curso[tipo] = self._en_curso.get(tipo, 0) + 1
+        self._total_en_curso += 1
+
+    def _desocupar(self, tipo: str):
+        self._en_curso[tipo] -= 1
+        self._total_en_curso -= 1
+        # Se despierta, en orden de llegada, a los que esperan y ya caben; uno cuyo
+        # tipo está en su límite no bloquea a los de otros tipos que vienen detrás
+        for tipo_espera, futuro in list(self._espera):
+            if self._total_en_curso >= self.max_concurrentes:
+                break
+            if self._puede_entrar(tipo_espera):
+                self._espera.remove((tipo_espera, futuro))
+                self._ocupar_plaza(tipo_espera)
+                if not futuro.done():
+                    futuro.set_result(None)
+
+    def _reservar_disco(self, tipo: str, reserva: int):
+        if self._reservado + reserva > self.max_bytes_disco:
+            motivo = "presupuesto_disco"
+        elif self._libre() - self._reservado - reserva < self.min_libre_disco:
+            motivo = "disco"
+        else:
+            self._reservado += reserva
+            return
+        self._rechazar(tipo, motivo, "No queda espacio en disco para procesar la petición, inténtelo más tarde")
+
+    def _liberar_disco(self, reserva: int):
+        self._reservado -= reserva
+
+    def _libre(self) -> int:
+        try:
+            return shutil.disk_usage(self.directorio).free
+        except OSError:
+            # La raíz aún no existe: se mide el disco donde se creará
+            try:
+                return shutil.disk_usage(os.path.dirname(os.path.abspath(self.directorio))).free
+            except OSError:
+                return self.min_libre_disco + self.max_bytes_disco
+
+    def _rechazar(self, tipo: str, motivo: str, mensaje: str):
+        metricas.incrementar("paca_admision_rechazadas_total", tipo=tipo, motivo=motivo)
+        raise ServidorSaturado(mensaje, self.reintentar_en(tipo))
+
+
+def _parsear_limites(valor: str) -> Dict[str, int]:
+    """Convierte "tipo=n,tipo=n" en un dict."""
+    limites = {}
+    for parte in valor.split(","):
+        if not parte.strip():
+            continue
+        tipo, _, limite = parte.partition("=")
+        try:
+            limites[tipo.strip()] = int(limite)
+        except ValueError:
+            raise ValueError(f"Límite no válido en PACA_LIMITES_PETICIONES: {parte.strip()}")
+    return limites
+
+
+_planificador = None
+_lock_planificador = threading.Lock()
+
+
+def obtener_planificador() -> PlanificadorPeticiones:
+    """Devuelve el planificador compartido por todo el proceso, creándolo la primera vez."""
+    global _planificador
+    with _lock_planificador:
+        if _planificador is None:
+            _planificador = PlanificadorPeticiones()
+            metricas.registrar_sonda("paca_admision_en_curso", lambda: _planificador.en_curso)
+            metricas.registrar_sonda("paca_admision_en_espera", lambda: _planificador.en_espera)
+            metricas.registrar_sonda("paca_disco_reservado_bytes", lambda: _planificador.bytes_reservados)
+        return _planificador
@@ -1,28 +1,253 @@
 # procesador.py
 
 import os
-import re
-import fitz
 import uuid
 import zipfile
-from docx2pdf import convert
+from functools import partial
+from typing import Callable, Optional
+from clases.backend_pdf import abrir_pdf, backend_por_defecto, cargar_backend
+from clases.conversion_docx import obtener_conversor
+from clases.ejecutor import EjecutorTareas
+from clases.espacio_trabajo import obtener_espacios
+from clases.metricas import (BUSCAR, COMPRIMIR, CONVERTIR, ESCRIBIR, EXTRAER_TEXTO, CronometroEtapas,
+                             medir_etapa, metricas, registrar_etapas)
+from clases.motor_patrones import cargar_reglas, obtener_motor
+
+def dividir_cartas(bloque, ruta_pdf, directorio, patrones):
+    """
+    Guarda como PDF independientes un bloque de cartas del documento combinado.
+
+    Se ejecuta en un worker: abre el PDF de origen por su cuenta y devuelve solo
+    el número de cada carta y la ruta provisional donde la guardó.
+
+    Args:
+        bloque: Lista de (índice_de_carta, primera_página, última_página, marcador);
+            si el marcador es None, el número se busca en el texto de la carta
+        ruta_pdf: Ruta del PDF combinado
+        directorio: Directorio donde guardar las cartas
+        patrones: Reglas para buscar el número de atención
+
+    Returns:
+        Tuple con (lista de (índice_de_carta, número_o_None, ruta_provisional),
+        segundos de cada etapa)
+    """
+    motor = obtener_motor(patrones)
+    cronometro = CronometroEtapas()
+    resultados = []
+
+    with abrir_pdf(ruta_pdf) as doc:
+        for indice, inicio, fin, marcador in bloque:
+            if marcador is None:
+                with cronometro.medir(EXTRAER_TEXTO):
+                    texto = "".join(doc.texto_pagina(p) for p in range(inicio, fin + 1))
+                with cronometro.medir(BUSCAR):
+                    marcador = motor.buscar(texto)
+            numero = _numero_valido(marcador)
+
+            ruta = os.path.join(directorio, f".carta_{indice:07d}.pdf")
+            with cronometro.medir(ESCRIBIR):
+                doc.guardar_paginas(range(inicio, fin + 1), ruta)
+
+            resultados.append((indice, numero, ruta))
+
+    return resultados, cronometro.tiempos
+
+
+def _detectar_marcadores(paginas, ruta_pdf, patrones):
+    """
+    Busca el marcador de inicio de carta en cada página de un bloque.
+
+    Args:
+        paginas: Números de página a revisar
+        ruta_pdf: Ruta del PDF combinado
+        patrones: Reglas que identifican la cabecera de una carta
+
+    Returns:
+        Tuple con (lista de (página, marcador_o_None), segundos de cada etapa)
+    """
+    motor = obtener_motor(patrones)
+    cronometro = CronometroEtapas()
+    marcadores = []
+    with abrir_pdf(ruta_pdf) as doc:
+        for p in paginas:
+            with cronometro.medir(EXTRAER_TEXTO):
+                texto = doc.texto_pagina(p)
+            with cronometro.medir(BUSCAR):
+                marcadores.append((p, motor.buscar(texto)))
+    return marcadores, cronometro.tiempos
+
+
+def _indexar_cartas(marcadores, max_paginas, paginas_por_carta):
+    """
+    Construye el índice de cartas a partir de los marcadores de cada página.
+
+    Una página con un marcador distinto del de la carta en curso abre una carta
+    nueva; las páginas sin marcador o con el mismo marcador (la cabecera repetida
+    en cada página) la continúan, salvo que el mismo marcador aparezca cuando la
+    carta en curso ya tiene paginas_por_carta páginas: ahí empieza la siguiente
+    carta, que tiene el mismo número. Las páginas anteriores al primer marcador,
+    y las que exceden max_paginas en una carta, no pertenecen a ninguna carta y
+    van a excepciones.
+
+    Args:
+        marcadores: Lista ordenada de (página, marcador_o_None)
+        max_paginas: Máximo de páginas por carta (0 para no limitar)
+        paginas_por_carta: Páginas de una carta normal
+
+    Returns:
+        Tuple con (lista de (primera_página, última_página, marcador), páginas_en_excepción)
+    """
+    cartas = []
+    excepciones = []
+    actual = None
+
+    for pagina, marcador in marcadores:
+        if marcador is not None and (actual is None or marcador != actual[2]
+                                     or pagina - actual[0] >= paginas_por_carta):
+            actual = [pagina, pagina, marcador]
+            cartas.append(actual)
+        elif actual is not None and (not max_paginas or pagina - actual[0] < max_paginas):
+            actual[1] = pagina
+        else:
+            excepciones.append(pagina)
+
+    return [tuple(carta) for carta in cartas], excepciones
+
+
+def _encaja_en_bloques(marcadores, paginas_por_carta):
+    """
+    Indica si los marcadores son compatibles con cartas de paginas_por_carta páginas.
+
+    No lo son si alguna página que no es la primera de su bloque tiene un marcador
+    distinto del de esa primera página: una carta empieza donde el modo "fija"
+    cortaría por la mitad. Un bloque sin marcador en su primera página se admite
+    como carta sin número (el modo "marcadores" lo uniría a la carta anterior).
+
+    Args:
+        marcadores: Lista ordenada de (página, marcador_o_None) de todas las páginas
+        paginas_por_carta: Páginas de cada bloque
+    """
+    inicio_bloque = None
+    for pagina, marcador in marcadores:
+        if pagina % paginas_por_carta == 0:
+            inicio_bloque = marcador
+        elif marcador is not None and marcador != inicio_bloque:
+            return False
+    return True
+
+
+def _numero_valido(numero):
+    """Devuelve el número de atención si tiene el formato esperado (empieza por 3)."""
+    if numero:
+        numero = numero.strip()
+        if numero.startswith("3"):
+            return numero
+    return None
+
+
+def segmentar_textos(textos, patrones_numero, patrones_marcador, modo="fija", max_paginas=8):
+    """
+    Divide en cartas un PDF combinado del que ya se tiene el texto de cada página.
+
+    Sigue las mismas reglas que ProcesadorCartas, pero sin volver a leer el PDF.
+
+    Args:
+        textos: Texto de cada página
+        patrones_numero: Reglas para buscar el número de atención en una carta
+        patrones_marcador: Reglas que identifican la cabecera de una carta
+        modo: "fija", "marcadores" o "auto" (ver ProcesadorCartas)
+        max_paginas: Máximo de páginas por carta en modo "marcadores" (0 para no limitar)
+
+    Returns:
+        Tuple con (lista de (primera_página, última_página, número_o_None), páginas_en_excepción)
+    """
+    total = len(textos)
+    paginas_por_carta = ProcesadorCartas.PAGINAS_POR_CARTA
+    marcadores = None
+    if modo != "fija":
+        motor = obtener_motor(patrones_marcador)
+        marcadores = [(p, motor.buscar(texto)) for p, texto in enumerate(textos)]
+    if modo == "auto":
+        modo = ("fija" if total % paginas_por_carta == 0 and _encaja_en_bloques(marcadores, paginas_por_carta)
+                else "marcadores")
+
+    if modo == "fija":
+        if total % paginas_por_carta != 0:
+            raise ValueError("❌ El documento debe tener un múltiplo de 4 páginas.")
+        motor = obtener_motor(patrones_numero)
+        cartas = [(i, i + paginas_por_carta - 1,
+                   _numero_valido(motor.buscar("".join(textos[i:i + paginas_por_carta]))))
+                  for i in range(0, total, paginas_por_carta)]
+        return cartas, []
+
+    indice, excepciones = _indexar_cartas(marcadores, max_paginas, paginas_por_carta)
+    return [(inicio, fin, _numero_valido(marcador)) for inicio, fin, marcador in indice], excepciones
 
 
 class ProcesadorCartas:
-    def __init__(self, ruta_docx):
+    """
+    Divide el PDF combinado de cartas (generado a partir de un DOCX) en una carta por archivo.
+
+    Modos de segmentación (parámetro `segmentacion` o variable PACA_SEGMENTACION_CARTAS):
+        - "fija" (por defecto): cartas de 4 páginas; el documento debe tener un
+          múltiplo de 4 páginas. El número se busca en todo el bloque.
+        - "marcadores": los límites se detectan por la cabecera de cada carta
+          (PAC-DR-25-2-xxxxxx o las reglas "marcadores_cartas" de PACA_PATRONES).
+          Las páginas que no encajan en ninguna carta van a PQR-Excepciones.pdf.
+        - "auto": "fija" si el número de páginas es múltiplo de 4 y ninguna carta
+          empieza a mitad de un bloque de 4 páginas, "marcadores" en caso
+          contrario. Busca la cabecera en todas las páginas antes de dividir, y un
+          bloque con la cabecera fuera de su primera página se divide por
+          marcadores, no como en el modo "fija".
+    """
+
+    MODOS_SEGMENTACION = ("auto", "fija", "marcadores")
+    PAGINAS_POR_CARTA = 4
+    NOMBRE_EXCEPCIONES = "PQR-Excepciones.pdf"
+    # Nombre del procesador en las métricas
+    NOMBRE_METRICAS = "procesar_docx"
+    # Número de atención de cada carta (reglas "cartas" de PACA_PATRONES)
+    PATRONES_NUMERO = [
+        {"patron": r"PAC[-\s]*DR[-\s]*25[-\s]*2[-\s]*(\d{6})", "ignorar_mayusculas": False}
+    ]
+
+    def __init__(self, ruta_docx, ejecutor: EjecutorTareas = None, segmentacion: str = None,
+                 directorio_trabajo: str = None):
         self.ruta_docx = ruta_docx
+        self.ejecutor = ejecutor or EjecutorTareas()
+        self.segmentacion = segmentacion or os.environ.get("PACA_SEGMENTACION_CARTAS", "fija")
+        if self.segmentacion not in self.MODOS_SEGMENTACION:
+            raise ValueError(f"Modo de segmentación no válido: {self.segmentacion}")
+        # Máximo de páginas de una carta en modo "marcadores" (0 para no limitar)
+        self.max_paginas_carta = int(os.environ.get("PACA_MAX_PAGINAS_CARTA", 8))
         self.ruta_pdf = self._convertir_a_pdf()
-        self.directorio_temporal = f"salida_{uuid.uuid4().hex}"
+        self.patrones_numero = cargar_reglas("cartas", self.PATRONES_NUMERO)
+        self.patrones_marcador = cargar_reglas("marcadores_cartas", self.patrones_numero)
+        # Las cartas y el ZIP se escriben en el área de trabajo de la petición; sin
+        # ella se crea una nueva, que el llamador debe eliminar con obtener_espacios()
+        directorio_trabajo = directorio_trabajo or obtener_espacios().crear("cartas")
+        self.directorio_temporal = os.path.join(directorio_trabajo, f"salida_{uuid.uuid4().hex}")
         os.makedirs(self.directorio_temporal, exist_ok=True)
         self.resultados = {
             "procesados": 0,
             "con_numero": 0,
-            "sin_numero": 0
+            "sin_numero": 0,
+            "paginas_excepcion": 0
         }
 
+    @classmethod
+    def precalentar(cls):
+        """Carga la librería de PDF, compila los patrones y prepara el conversor antes de la primera petición."""
+        cargar_backend(backend_por_defecto())
+        patrones_numero = cargar_reglas("cartas", cls.PATRONES_NUMERO)
+        obtener_motor(patrones_numero)
+        obtener_motor(cargar_reglas("marcadores_cartas", patrones_numero))
+        obtener_conversor()
+
     def _convertir_a_pdf(self):
         ruta_pdf = self.ruta_docx.replace(".docx", ".pdf")
-        convert(self.ruta_docx)
+        with medir_etapa(self.NOMBRE_METRICAS, CONVERTIR):
+            obtener_conversor().convertir(self.ruta_docx, ruta_pdf)
         if not os.path.exists(ruta_pdf):
             raise FileNotFoundError("❌ No se generó el archivo PDF.")
         return ruta_pdf
@@ -34,34 +259,53 @@ class ProcesadorCartas:
         PAC DR 25 2 398871
         Y extrae los últimos 6 dígitos si empiezan con 3.
         """
-        patron = r"PAC[-\s]*DR[-\s]*25[-\s]*2[-\s]*(\d{6})"
-        match = re.search(patron, texto)
-        if match:
-            numero = match.group(1).strip()
-            if numero.startswith("3"):
-                return numero
-        return None
-
-    def _dividir_pdf_en_cartas(self):
-        doc = fitz.open(self.ruta_pdf)
-        total = doc.page_count
-
-        if total % 4 != 0:
-            raise ValueError("❌ El documento debe tener un múltiplo de 4 páginas.")
+        return _numero_valido(obtener_motor(self.patrones_numero).buscar(texto))
 
-        desconocidos = 0
+    def _dividir_pdf_en_cartas(self, progreso: Callable[[int, Optional[int]], None] = None):
+        with abrir_pdf(self.ruta_pdf) as doc:
+            total = doc.num_paginas
+
+        modo = self.segmentacion
+        marcadores = {}
+        if modo != "fija":
+            marcadores = self._detectar_marcadores(total)
+        if modo == "auto":
+            # Un múltiplo de 4 páginas no basta: una carta de 3 páginas seguida de
+            # una de 5 también lo es, y el modo "fija" las cortaría mal
+            encaja = _encaja_en_bloques(sorted(marcadores.items()), self.PAGINAS_POR_CARTA)
+            modo = "fija" if total % self.PAGINAS_POR_CARTA == 0 and encaja else "marcadores"
 
-        for i in range(0, total, 4):
-            subdoc = fitz.open()
-            texto_concatenado = ""
+        if modo == "fija":
+            if total % self.PAGINAS_POR_CARTA != 0:
+                raise ValueError("❌ El documento debe tener un múltiplo de 4 páginas.")
+            # (índice_de_carta, primera_página, última_página, marcador) de cada carta;
+            # sin marcador ya detectado, el número se busca en el worker al dividir
+            cartas = [(n, i, i + self.PAGINAS_POR_CARTA - 1, marcadores.get(i))
+                      for n, i in enumerate(range(0, total, self.PAGINAS_POR_CARTA))]
+            excepciones = []
+        else:
+            indice, excepciones = _indexar_cartas(sorted(marcadores.items()), self.max_paginas_carta,
+                                                  self.PAGINAS_POR_CARTA)
+            cartas = [(n, inicio, fin, marcador) for n, (inicio, fin, marcador) in enumerate(indice)]
 
-            for j in range(4):
-                pagina = doc.load_page(i + j)
-                texto_concatenado += pagina.get_text()
-                subdoc.insert_pdf(doc, from_page=i + j, to_page=i + j)
+        # Cada worker abre el PDF por su cuenta y guarda sus cartas con un nombre
+        # provisional; los nombres definitivos se asignan después en orden, para que
+        # la numeración de las cartas sin número no dependa del reparto
+        dividir = partial(dividir_cartas, ruta_pdf=self.ruta_pdf,
+                          directorio=self.directorio_temporal, patrones=self.patrones_numero)
+        cartas_guardadas = []
+        for _, resultado, error in self.ejecutor.mapear(dividir, self._repartir(cartas)):
+            if error is not None:
+                raise RuntimeError(f"❌ Error al dividir el PDF: {error}")
+            guardadas, tiempos = resultado
+            cartas_guardadas.extend(guardadas)
+            registrar_etapas(self.NOMBRE_METRICAS, tiempos)
+            if progreso:
+                progreso(len(cartas_guardadas), len(cartas))
 
-            numero = self._extraer_numero_atencion(texto_concatenado)
+        desconocidos = 0
 
+        for _, numero, ruta_provisional in sorted(cartas_guardadas):
             if numero:
                 nombre = f"PQR-{numero}.pdf"
                 self.resultados["con_numero"] += 1
@@ -71,20 +315,65 @@ class ProcesadorCartas:
                 self.resultados["sin_numero"] += 1
 
             salida = os.path.join(self.directorio_temporal, nombre)
-            subdoc.save(salida)
+            os.replace(ruta_provisional, salida)
             self.resultados["procesados"] += 1
+            metricas.incrementar("paca_archivos_total", procesador=self.NOMBRE_METRICAS,
+                                 resultado="con_numero" if numero else "sin_numero")
 
-        doc.close()
+        if excepciones:
+            self._guardar_excepciones(excepciones)
+
+    def _detectar_marcadores(self, total):
+        """
+        Recorre el texto del documento una sola vez para localizar el inicio de cada carta.
+
+        Returns:
+            Dict con el marcador (o None) de cada página
+        """
+        detectar = partial(_detectar_marcadores, ruta_pdf=self.ruta_pdf, patrones=self.patrones_marcador)
+        marcadores = []
+        for _, resultado, error in self.ejecutor.mapear(detectar, self._repartir(list(range(total)))):
+            if error is not None:
+                raise RuntimeError(f"❌ Error al leer el PDF: {error}")
+            encontrados, tiempos = resultado
+            marcadores.extend(encontrados)
+            registrar_etapas(self.NOMBRE_METRICAS, tiempos)
+
+        return dict(marcadores)
+
+    def _guardar_excepciones(self, paginas):
+        """Reúne en un único PDF las páginas que no pertenecen a ninguna carta."""
+        print(f"⚠️ {len(paginas)} páginas no pertenecen a ninguna carta: {[p + 1 for p in paginas]}")
+
+        with medir_etapa(self.NOMBRE_METRICAS, ESCRIBIR), abrir_pdf(self.ruta_pdf) as doc:
+            doc.guardar_paginas(paginas, os.path.join(self.directorio_temporal, self.NOMBRE_EXCEPCIONES))
+
+        self.resultados["paginas_excepcion"] = len(paginas)
+
+    def _repartir(self, elementos):
+        """Divide cartas o páginas en bloques contiguos, unos cuatro por worker."""
+        tamano = max(1, -(-len(elementos) // (self.ejecutor.max_workers * 4)))
+        return [elementos[i:i + tamano] for i in range(0, len(elementos), tamano)]
 
     def _comprimir_en_zip(self):
         zip_nombre = f"{self.directorio_temporal}.zip"
-        with zipfile.ZipFile(zip_nombre, "w", zipfile.ZIP_DEFLATED) as zipf:
+        with medir_etapa(self.NOMBRE_METRICAS, COMPRIMIR), zipfile.ZipFile(zip_nombre, "w", zipfile.ZIP_DEFLATED) as zipf:
             for archivo in os.listdir(self.directorio_temporal):
                 ruta = os.path.join(self.directorio_temporal, archivo)
                 zipf.write(ruta, arcname=archivo)
         return zip_nombre
 
-    def procesar(self):
-        self._dividir_pdf_en_cartas()
+    def procesar(self, progreso: Callable[[int, Optional[int]], None] = None):
+        """
+        Divide el documento en cartas y las comprime en un ZIP.
+
+        Args:
+            progreso: Función opcional llamada a medida que se guardan las cartas
+                con (cartas_guardadas, total_de_cartas)
+
+        Returns:
+            Tuple con (ruta_zip_resultado, resumen_estadisticas)
+        """
+        self._dividir_pdf_en_cartas(progreso)
         zip_path = self._comprimir_en_zip()
         return zip_path, self.resultados
@@ -2,37 +2,105 @@
 
 import os
 import re
-import PyPDF2
+import json
 import shutil
 import zipfile
 import tempfile
+import time
 from datetime import datetime
-from typing import List, Tuple, Dict
-import concurrent.futures
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Dict, Union
+from clases.backend_pdf import cargar_backend, parsear_region
+from clases.cache_texto import CacheTextoPDF, cache_texto, obtener_cache_worker
+from clases.entrada_pdf import (FuentePDF, MAX_BYTES_MIEMBRO, MAX_BYTES_ZIP, descripcion_fuente,
+                                iterar_pdfs_de_zip, nombre_fuente)
+from clases.ejecutor import EjecutorTareas
+from clases.indice_resultados import (ATENCION, ORIGEN_NOMBRE, ORIGEN_OCR, ORIGEN_TEXTO, IndiceResultados,
+                                      obtener_indice, version_reglas)
+from clases.metricas import (BUSCAR, COMPRIMIR, ESCRIBIR, EXTRAER_TEXTO, INGESTA, OCR, CronometroEtapas,
+                             iterar_midiendo, medir_etapa, metricas, registrar_etapas)
+from clases.motor_patrones import cargar_reglas, obtener_motor
+from clases.nombres_salida import AsignadorNombres
+from clases.ocr import MotorOCR, describir_error_ocr, intercalar_ocr, obtener_motor_ocr
+from clases.zip_streaming import EscritorZipStreaming, comprimir_directorio
 
 
 class ProcesadorPDF:
-    def __init__(self):
+    # Nombre del procesador en las métricas
+    NOMBRE_METRICAS = "procesar_pdfs"
+    # Resultados que se acumulan antes de escribirlos en el índice
+    TAMANO_BLOQUE_INDICE = 500
+    # Resultados que pueden quedar retenidos detrás de un OCR sin terminar
+    MAX_EN_ESPERA_OCR = 256
+    # Número de atención (reglas "atencion" de PACA_PATRONES)
+    PATRONES_ATENCION = [
+        r'Atención N°\s*(\d+)',
+        r'Atención\s+No\.\s*(\d+)',
+        r'ATENCION\s*[:#]?\s*(\d+)',
+        r'Atención\s*[:#]?\s*(\d+)',
+        r'Radicado\s*[:#]?\s*(\d+)',
+        r'RADICADO\s*[:#]?\s*(\d+)',
+        r'[:#]\s*(\d{5,8})',  # Números de 5-8 dígitos después de : o #
+        r'Nro\.\s*(\d+)',
+        r'Asunt\w*:?\s*NOTIFICACION\s*ELECTRONICA\s*PACARIBE\s*-\s*(\d+)'
+    ]
+    
+    def __init__(self, cache: CacheTextoPDF = None, ejecutor: EjecutorTareas = None, ocr: MotorOCR = None,
+                 indice: IndiceResultados = None):
         """Inicializa el procesador con los patrones de búsqueda."""
-        self.patrones_atencion = [
-            r'Atención N°\s*(\d+)',
-            r'Atención\s+No\.\s*(\d+)',
-            r'ATENCION\s*[:#]?\s*(\d+)',
-            r'Atención\s*[:#]?\s*(\d+)',
-            r'Radicado\s*[:#]?\s*(\d+)',
-            r'RADICADO\s*[:#]?\s*(\d+)',
-            r'[:#]\s*(\d{5,8})',  # Números de 5-8 dígitos después de : o #
-            r'Nro\.\s*(\d+)',
-            r'Asunt\w*:?\s*NOTIFICACION\s*ELECTRONICA\s*PACARIBE\s*-\s*(\d+)'
-        ]
-    
-    def procesar_archivos(self, archivos_entrada: List[str], directorio_temporal: str) -> Tuple[str, Dict]:
+        self.cache = cache or cache_texto
+        self.ejecutor = ejecutor or EjecutorTareas()
+        # Resultados ya conocidos por hash de contenido (None si el índice está desactivado)
+        self.indice = indice or obtener_indice()
+        # OCR de respaldo para los PDF sin capa de texto, si hay Tesseract instalado
+        self.ocr = ocr or obtener_motor_ocr()
+        self.usar_ocr = self.ocr.disponible
+        # Páginas (desde la primera) en las que se busca el número de atención
+        self.max_paginas_atencion = 1
+        # Región de esas páginas que se lee antes que la página completa
+        # (PACA_REGION_ATENCION, p. ej. "0,0,1,0.3"); por defecto se lee todo
+        self.region_atencion = parsear_region(os.environ.get("PACA_REGION_ATENCION"))
+        # Límites de tamaño (descomprimido) para los PDF leídos desde ZIP
+        self.max_bytes_miembro_zip = MAX_BYTES_MIEMBRO
+        self.max_bytes_zip = MAX_BYTES_ZIP
+        self.patrones_atencion = cargar_reglas("atencion", self.PATRONES_ATENCION)
+        # Los resultados del índice obtenidos con otras reglas u opciones no se reutilizan
+        self.version_indice = version_reglas(self.patrones_atencion, paginas=self.max_paginas_atencion,
+                                             region=self.region_atencion, ocr=self.usar_ocr)
+    
+    @classmethod
+    def precalentar(cls):
+        """Carga la librería de PDF, compila los patrones y abre el índice antes de la primera petición."""
+        procesador = cls()
+        cargar_backend(procesador.cache.backend)
+        obtener_motor(procesador.patrones_atencion)
+    
+    def __getstate__(self):
+        # Al enviar el procesador a otro proceso no se copian la caché, el ejecutor
+        # ni el OCR; el worker usa una caché pequeña cuyo texto vuelve con cada
+        # resultado a la de este proceso, y el OCR se hace aquí
+        estado = self.__dict__.copy()
+        del estado["cache"]
+        del estado["ejecutor"]
+        del estado["ocr"]
+        return estado
+    
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self.cache = obtener_cache_worker()
+        self.ejecutor = EjecutorTareas(modo="secuencial")
+        self.ocr = None
+    
+    def procesar_archivos(self, archivos_entrada: List[str], directorio_temporal: str,
+                          progreso: Callable[[int, Optional[int]], None] = None) -> Tuple[str, Dict]:
         """
         Procesa una lista de archivos PDF/ZIP y los renombra según los números de atención.
         
         Args:
             archivos_entrada: Lista de rutas de archivos PDF/ZIP
             directorio_temporal: Directorio temporal para trabajar
+            progreso: Función opcional llamada tras cada archivo con (procesados, total);
+                total es None mientras quedan ZIP por leer
             
         Returns:
             Tuple con (ruta_zip_resultado, resumen_estadisticas)
@@ -41,57 +109,217 @@ class ProcesadorPDF:
         directorio_salida = os.path.join(directorio_temporal, "pdfs_procesados")
         os.makedirs(directorio_salida, exist_ok=True)
         
-        # Recopilar todos los archivos PDF
-        archivos_pdf = self._recopilar_archivos_pdf(archivos_entrada, directorio_temporal)
+        # Recopilar todos los archivos PDF (los de los ZIP se leen a medida que se procesan)
+        archivos_pdf = self.recopilar_archivos_pdf(archivos_entrada, directorio_temporal)
         
         # Contadores para estadísticas
-        estadisticas = {
-            "total": len(archivos_pdf),
+        estadisticas = self.estadisticas_iniciales()
+        
+        # Analizar los archivos en paralelo; los workers no escriben nada: los PDF se
+        # copian aquí, en el orden de entrada y con nombres asignados en memoria
+        asignador = AsignadorNombres()
+        nombres_zip = []
+        for fuente, resultado, error in self._mapear(self._analizar_en_worker, archivos_pdf):
+            if error is None and resultado["exitoso"]:
+                with medir_etapa(self.NOMBRE_METRICAS, ESCRIBIR):
+                    resultado = self.guardar_pdf(fuente, resultado, directorio_salida, asignador)
+                if resultado["exitoso"]:
+                    nombres_zip.append(resultado["nombre_salida"])
+            self.contabilizar(estadisticas, resultado, error, fuente)
+            if progreso:
+                progreso(estadisticas["total"], None)
+        
+        if progreso:
+            progreso(estadisticas["total"], estadisticas["total"])
+        
+        # Crear ZIP con los resultados
+        zip_path = os.path.join(directorio_temporal, self.nombre_zip_resultado())
+        with medir_etapa(self.NOMBRE_METRICAS, COMPRIMIR):
+            comprimir_directorio(directorio_salida, zip_path, nombres_zip)
+        
+        return zip_path, estadisticas
+    
+    def procesar_archivos_stream(self, archivos_entrada: List[str], directorio_temporal: str) -> Tuple[Iterator[bytes], Dict]:
+        """
+        Igual que procesar_archivos, pero genera el ZIP de salida mientras se procesa.
+        
+        Los PDF no se copian a disco: cada archivo se añade al ZIP en cuanto se conoce
+        su resultado (en el orden de entrada) y los bytes se entregan al llamador para enviarlos de inmediato. Como
+        el resumen no se conoce hasta el final, se incluye en el ZIP como resumen.json
+        (el diccionario de estadísticas devuelto se completa al agotar el generador).
+        
+        Args:
+            archivos_entrada: Lista de rutas de archivos PDF/ZIP
+            directorio_temporal: Directorio temporal para trabajar
+            
+        Returns:
+            Tuple con (generador_de_bytes_del_zip, resumen_estadisticas)
+        """
+        archivos_pdf = self.recopilar_archivos_pdf(archivos_entrada, directorio_temporal)
+        estadisticas = self.estadisticas_iniciales()
+        return self._generar_zip(archivos_pdf, estadisticas), estadisticas
+    
+    def nombre_zip_resultado(self) -> str:
+        """Nombre del ZIP de resultados con la fecha y hora actuales."""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"pdfs_renombrados_{timestamp}.zip"
+    
+    def estadisticas_iniciales(self) -> Dict:
+        # El total se cuenta a medida que se procesan los archivos, porque los PDF
+        # de los ZIP no se conocen de antemano
+        return {
+            "total": 0,
             "exitosos": 0,
             "fallidos": 0,
-            "sin_numero": 0
+            "sin_numero": 0,
+            "desde_indice": 0,
+            "ocr_archivos": 0,
+            "tiempo_extraccion_s": 0.0,
+            "tiempo_ocr_s": 0.0
         }
+    
+    def _mapear(self, funcion, archivos_pdf: Iterable[Union[str, FuentePDF]]) -> Iterator[Tuple[Union[str, FuentePDF], Dict, str]]:
+        """
+        Procesa los PDF con el ejecutor y entrega cada resultado junto con su PDF de origen,
+        en el mismo orden que los PDF.
+        
+        Los resultados nuevos se guardan en el índice en bloques de `TAMANO_BLOQUE_INDICE`
+        (ver fila_indice).
+        """
+        filas = []
+        try:
+            for fuente, resultado, error in self._mapear_con_ocr(funcion, archivos_pdf):
+                if self.indice is not None and error is None and resultado.get("indexable"):
+                    filas.append(self.fila_indice(fuente, resultado))
+                    if len(filas) >= self.TAMANO_BLOQUE_INDICE:
+                        self.indice.guardar(filas)
+                        filas = []
+                yield fuente, resultado, error
+        finally:
+            # También se guarda lo procesado si el consumidor abandona la iteración
+            if filas:
+                self.indice.guardar(filas)
+    
+    def _mapear_con_ocr(self, funcion, archivos_pdf: Iterable[Union[str, FuentePDF]]) -> Iterator[Tuple[Union[str, FuentePDF], Dict, str]]:
+        """
+        Reparte los PDF entre los workers del ejecutor y, si hace falta, el pool del OCR.
         
-        # Procesar archivos en paralelo
-        max_workers = min(32, os.cpu_count() + 4) if os.cpu_count() else 8
+        Los PDF que ya están en el índice o en la caché de texto de este proceso se
+        resuelven aquí (ver _resolver) y no se envían a los workers. Solo se retienen en memoria los PDF cuyo resultado aún no se ha entregado. Los
+        PDF sin texto marcados como pendientes de OCR se envían al pool del OCR; los
+        resultados posteriores esperan a que termine para conservar el orden (como
+        mucho `MAX_EN_ESPERA_OCR`).
+        """
+        en_vuelo = {}
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Enviar trabajos al executor
-            future_to_pdf = {
-                executor.submit(self._procesar_pdf_individual, pdf, directorio_salida): pdf
-                for pdf in archivos_pdf
-            }
-            
-            # Procesar resultados
-            for future in concurrent.futures.as_completed(future_to_pdf):
-                pdf_original = future_to_pdf[future]
-                try:
-                    resultado = future.result()
-                    if resultado["exitoso"]:
-                        if resultado["numero_encontrado"]:
-                            estadisticas["exitosos"] += 1
-                        else:
-                            estadisticas["sin_numero"] += 1
-                    else:
-                        estadisticas["fallidos"] += 1
-                except Exception as e:
-                    estadisticas["fallidos"] += 1
-                    print(f"Error procesando {pdf_original}: {str(e)}")
+        def registrar():
+            for indice, fuente in enumerate(archivos_pdf):
+                en_vuelo[indice] = fuente
+                yield fuente
         
-        # Crear ZIP con los resultados
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        zip_path = os.path.join(directorio_temporal, f"pdfs_renombrados_{timestamp}.zip")
+        resultados = ((en_vuelo.pop(indice), self.cache.recoger(resultado), error)
+                      for indice, resultado, error in self.ejecutor.mapear(funcion, registrar(), ordenado=True,
+                                                                           resolver=self._resolver))
         
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(directorio_salida):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, directorio_salida)
-                    zipf.write(file_path, arcname)
+        for (fuente, resultado, error), ocr in intercalar_ocr(
+                resultados, self.ocr, self.pendiente_ocr, self.MAX_EN_ESPERA_OCR):
+            if ocr is not None:
+                resultado = self._completar_ocr(fuente, resultado, ocr)
+            yield fuente, resultado, error
+    
+    def fila_indice(self, fuente: Union[str, FuentePDF], resultado: Dict) -> Dict:
+        """
+        Fila del índice de resultados para un PDF analizado.
         
-        return zip_path, estadisticas
+        Solo se guarda el número encontrado en el contenido (texto u OCR): el que se
+        toma del nombre del archivo depende de cómo se llamó esa subida, no del PDF.
+        """
+        return {
+            "huella": resultado["huella"],
+            "tipo": ATENCION,
+            "version": self.version_indice,
+            "nombre_archivo": nombre_fuente(fuente),
+            "numero_atencion": resultado["numero_contenido"],
+            "origen_numero": resultado["origen_numero"] if resultado["numero_contenido"] else None,
+            "nombre_salida": resultado["nombre_salida"]
+        }
+    
+    @staticmethod
+    def pendiente_ocr(elemento: Tuple[Union[str, FuentePDF], Dict, str]) -> bool:
+        _, resultado, error = elemento
+        return error is None and bool(resultado.get("pendiente_ocr"))
+    
+    def _completar_ocr(self, fuente: Union[str, FuentePDF], resultado: Dict, ocr) -> Dict:
+        """Busca el número de atención en el texto reconocido por el OCR (esperándolo si hace falta)."""
+        del resultado["pendiente_ocr"]
+        try:
+            reconocido = ocr.result()
+            resultado["tiempo_ocr_s"] = reconocido.segundos
+            numero_atencion = obtener_motor(self.patrones_atencion).buscar(reconocido.texto)
+            if numero_atencion:
+                resultado.update(self.nombrar(fuente, numero_atencion), numero_contenido=numero_atencion,
+                                 origen_numero=ORIGEN_OCR, ocr=True)
+        except Exception as e:
+            # Sin OCR el archivo se queda como SIN_NUMERO, pero no se guarda en el índice
+            print(describir_error_ocr(fuente, e))
+            resultado["indexable"] = False
+        return resultado
+    
+    def _generar_zip(self, archivos_pdf: Iterable[Union[str, FuentePDF]], estadisticas: Dict) -> Iterator[bytes]:
+        escritor = EscritorZipStreaming()
+        asignador = AsignadorNombres()
+        
+        for fuente, resultado, error in self._mapear(self._analizar_en_worker, archivos_pdf):
+            self.contabilizar(estadisticas, resultado, error, fuente)
+            if error is not None or not resultado["exitoso"]:
+                continue
+            
+            # Manejar duplicados
+            nombre_final = asignador.asignar(resultado["nombre_salida"])
+            
+            if isinstance(fuente, FuentePDF):
+                with medir_etapa(self.NOMBRE_METRICAS, COMPRIMIR):
+                    tramo = escritor.agregar_datos(nombre_final, fuente.datos)
+                yield tramo
+            else:
+                yield from iterar_midiendo(escritor.agregar_archivo(fuente, nombre_final), self.NOMBRE_METRICAS, COMPRIMIR)
+        
+        yield escritor.agregar_datos("resumen.json", json.dumps(estadisticas, indent=2).encode("utf-8"),
+                                     compresion=zipfile.ZIP_DEFLATED)
+        yield escritor.cerrar()
+    
+    def contabilizar(self, estadisticas: Dict, resultado: Dict, error: str, fuente: Union[str, FuentePDF]):
+        """Actualiza las estadísticas (y las métricas) con el resultado de un archivo."""
+        estadisticas["total"] += 1
+        if error is None:
+            etapas = dict(resultado.get("etapas", {}))
+            if "tiempo_ocr_s" in resultado:
+                etapas[OCR] = resultado["tiempo_ocr_s"]
+            registrar_etapas(self.NOMBRE_METRICAS, etapas)
+            estadisticas["tiempo_extraccion_s"] = round(
+                estadisticas["tiempo_extraccion_s"] + resultado.get("tiempo_extraccion_s", 0.0), 3)
+            if "tiempo_ocr_s" in resultado:
+                estadisticas["ocr_archivos"] += 1
+                estadisticas["tiempo_ocr_s"] = round(estadisticas["tiempo_ocr_s"] + resultado["tiempo_ocr_s"], 3)
+        if error is None and resultado["exitoso"]:
+            if resultado.get("desde_indice"):
+                estadisticas["desde_indice"] += 1
+            if resultado["numero_encontrado"]:
+                estadisticas["exitosos"] += 1
+            else:
+                estadisticas["sin_numero"] += 1
+        else:
+            estadisticas["fallidos"] += 1
+            if error is not None:
+                print(f"Error procesando {descripcion_fuente(fuente)}: {error}")
+        
+        if error is None and resultado["exitoso"]:
+            estado = "con_numero" if resultado["numero_encontrado"] else "sin_numero"
+        else:
+            estado = "fallido"
+        metricas.incrementar("paca_archivos_total", procesador=self.NOMBRE_METRICAS, resultado=estado)
     
-    def _recopilar_archivos_pdf(self, archivos_entrada: List[str], directorio_temporal: str) -> List[str]:
+    def recopilar_archivos_pdf(self, archivos_entrada: List[str], directorio_temporal: str) -> Iterator[Union[str, FuentePDF]]:
         """
         Recopila todos los archivos PDF de las fuentes proporcionadas.
         
@@ -99,135 +327,238 @@ class ProcesadorPDF:
             archivos_entrada: Lista de archivos PDF/ZIP
             directorio_temporal: Directorio temporal
             
-        Returns:
-            Lista de rutas de archivos PDF
+        Yields:
+            Rutas de los PDF subidos y PDF en memoria leídos de los ZIP
         """
-        archivos_pdf = []
-        
         for archivo in archivos_entrada:
             if archivo.lower().endswith('.pdf'):
-                archivos_pdf.append(archivo)
+                yield archivo
             elif archivo.lower().endswith('.zip'):
-                # Extraer archivos del ZIP
-                archivos_pdf.extend(self._extraer_pdfs_de_zip(archivo, directorio_temporal))
-        
-        return archivos_pdf
+                # Leer los PDF del ZIP sin extraerlos a disco
+                yield from self._extraer_pdfs_de_zip(archivo)
     
-    def _extraer_pdfs_de_zip(self, ruta_zip: str, directorio_temporal: str) -> List[str]:
+    def _extraer_pdfs_de_zip(self, ruta_zip: str) -> Iterator[FuentePDF]:
         """
-        Extrae archivos PDF de un ZIP.
+        Lee en memoria los archivos PDF de un ZIP, uno a uno.
         
         Args:
             ruta_zip: Ruta del archivo ZIP
-            directorio_temporal: Directorio temporal
             
-        Returns:
-            Lista de rutas de archivos PDF extraídos
+        Yields:
+            PDF del ZIP, con el nombre del ZIP como prefijo
         """
-        archivos_pdf = []
-        directorio_extraccion = os.path.join(directorio_temporal, "zip_extraido")
-        os.makedirs(directorio_extraccion, exist_ok=True)
+        try:
+            yield from iterar_midiendo(iterar_pdfs_de_zip(ruta_zip, self.max_bytes_miembro_zip, self.max_bytes_zip),
+                                       self.NOMBRE_METRICAS, INGESTA)
+        except Exception as e:
+            print(f"Error al leer ZIP {ruta_zip}: {str(e)}")
+    
+    def guardar_pdf(self, ruta_pdf: Union[str, FuentePDF], resultado: Dict, directorio_salida: str,
+                     asignador: AsignadorNombres) -> Dict:
+        """
+        Copia un PDF ya analizado a la carpeta de salida con un nombre único.
         
+        Args:
+            ruta_pdf: Ruta del archivo PDF o PDF en memoria
+            resultado: Resultado de analizar_pdf
+            directorio_salida: Directorio de salida
+            asignador: Asignador de nombres de la carpeta de salida
+            
+        Returns:
+            El resultado con el nombre final (con sufijo si el nombre ya estaba asignado)
+        """
         try:
-            with zipfile.ZipFile(ruta_zip, 'r') as zip_ref:
-                zip_ref.extractall(directorio_extraccion)
+            # Manejar duplicados
+            nombre_final = asignador.asignar(resultado["nombre_salida"])
+            ruta_final = os.path.join(directorio_salida, nombre_final)
             
-            # Buscar archivos PDF en el directorio extraído
-            for root, dirs, files in os.walk(directorio_extraccion):
-                for file in files:
-                    if file.lower().endswith('.pdf'):
-                        archivos_pdf.append(os.path.join(root, file))
+            # Copiar archivo a la carpeta de salida
+            if isinstance(ruta_pdf, FuentePDF):
+                with open(ruta_final, 'wb') as f:
+                    f.write(ruta_pdf.datos)
+            else:
+                shutil.copy2(ruta_pdf, ruta_final)
+            
+            resultado["nombre_salida"] = nombre_final
+            return resultado
         
         except Exception as e:
-            print(f"Error al extraer ZIP {ruta_zip}: {str(e)}")
+            return {
+                "exitoso": False,
+                "error": str(e),
+                "ruta_original": descripcion_fuente(ruta_pdf)
+            }
+    
+    def _resolver(self, ruta_pdf: Union[str, FuentePDF]) -> Tuple[bool, object]:
+        """
+        Resuelve en este proceso los PDF que no necesitan a un worker.
         
-        return archivos_pdf
+        Con la huella de la ingesta (sin volver a leer el archivo) se consulta el
+        índice y la caché de texto de este proceso; si el PDF está en alguno de los
+        dos se analiza aquí. Los demás se envían a los workers junto con su huella.
+        
+        Returns:
+            Tuple con (True, resultado) o (False, (ruta_pdf, huella)) para _analizar_en_worker
+        """
+        huella = self.cache.obtener_huella(ruta_pdf)
+        previo = None
+        if self.indice is not None:
+            previo = self.indice.consultar(huella, ATENCION, self.version_indice)
+        if previo is not None or self.texto_en_cache(huella):
+            return True, self.analizar_pdf(ruta_pdf, huella, previo)
+        return False, (ruta_pdf, huella)
+    
+    def texto_en_cache(self, huella: str) -> bool:
+        """Indica si la caché de texto tiene todo lo que analizar_pdf puede leer de un PDF (región y páginas)."""
+        regiones = [self.region_atencion, None] if self.region_atencion else [None]
+        return all(self.cache.contiene(huella, region, self.max_paginas_atencion) for region in regiones)
+    
+    def _analizar_en_worker(self, elemento: Tuple[Union[str, FuentePDF], str]) -> Dict:
+        """Analiza en un worker un PDF que no se resolvió en el proceso principal, con su huella."""
+        ruta_pdf, huella = elemento
+        try:
+            self.cache.registrar_huella(ruta_pdf, huella)
+        except OSError:
+            pass
+        resultado = self.analizar_pdf(ruta_pdf, huella)
+        if self.cache.en_worker:
+            self.cache.adjuntar(resultado, huella)
+        return resultado
     
-    def _procesar_pdf_individual(self, ruta_pdf: str, directorio_salida: str) -> Dict:
+    def analizar_pdf(self, ruta_pdf: Union[str, FuentePDF], huella: str = None, previo: Dict = None) -> Dict:
         """
-        Procesa un archivo PDF individual.
+        Extrae el número de atención de un PDF y decide su nombre de salida, sin escribir nada.
         
         Args:
-            ruta_pdf: Ruta del archivo PDF
-            directorio_salida: Directorio de salida
+            ruta_pdf: Ruta del archivo PDF o PDF en memoria
+            huella: Hash de contenido del PDF, si ya se conoce
+            previo: Resultado del índice para el PDF, si lo había (ver _resolver)
             
         Returns:
             Diccionario con información del resultado
         """
         try:
-            # Extraer número de atención
-            numero_atencion = self._extraer_numero_atencion(ruta_pdf)
-            
-            if numero_atencion:
-                # Renombrar con número de atención
-                nombre_salida = f"PQR_{numero_atencion}_333.pdf"
-                numero_encontrado = True
-            else:
-                # Mantener nombre original con prefijo
-                nombre_original = os.path.basename(ruta_pdf)
-                nombre_salida = f"SIN_NUMERO_{nombre_original}"
-                numero_encontrado = False
+            inicio = time.perf_counter()
+            cronometro = CronometroEtapas()
             
-            # Copiar archivo a la carpeta de salida
-            ruta_salida = os.path.join(directorio_salida, nombre_salida)
+            # Un PDF ya analizado con las mismas reglas no se vuelve a parsear
+            huella = huella or self.cache.obtener_huella(ruta_pdf)
             
-            # Manejar duplicados
-            contador = 1
-            ruta_final = ruta_salida
-            while os.path.exists(ruta_final):
-                nombre_base, extension = os.path.splitext(nombre_salida)
-                nombre_salida_numerado = f"{nombre_base}_{contador}{extension}"
-                ruta_final = os.path.join(directorio_salida, nombre_salida_numerado)
-                contador += 1
+            # Extraer número de atención del contenido; si falla la lectura, el
+            # resultado vale para esta subida pero no se guarda en el índice
+            if previo is not None:
+                numero_contenido, origen = previo["numero_atencion"], previo["origen_numero"]
+                indexable = False
+            else:
+                try:
+                    numero_contenido, origen = self._extraer_numero_atencion(ruta_pdf, cronometro), ORIGEN_TEXTO
+                    indexable = True
+                except Exception as e:
+                    print(f"Error al extraer número de atención de {descripcion_fuente(ruta_pdf)}: {str(e)}")
+                    numero_contenido, origen = None, None
+                    indexable = False
             
-            shutil.copy2(ruta_pdf, ruta_final)
+            # Si no está en el contenido, se busca en el nombre del archivo, después
+            # de consultar el índice: el mismo PDF puede subirse con otro nombre
+            numero_atencion = numero_contenido
+            if not numero_contenido:
+                numero_atencion = self.numero_en_nombre(nombre_fuente(ruta_pdf))
+                origen = ORIGEN_NOMBRE if numero_atencion else None
             
-            return {
+            resultado = {
                 "exitoso": True,
-                "numero_encontrado": numero_encontrado,
-                "numero_atencion": numero_atencion,
-                "nombre_salida": os.path.basename(ruta_final),
-                "ruta_original": ruta_pdf
+                **self.nombrar(ruta_pdf, numero_atencion),
+                "ruta_original": descripcion_fuente(ruta_pdf),
+                "huella": huella,
+                "numero_contenido": numero_contenido,
+                "origen_numero": origen,
+                "indexable": indexable
             }
+            
+            if previo is not None:
+                resultado["desde_indice"] = True
+            elif not numero_atencion and self.usar_ocr and not self._tiene_texto(ruta_pdf):
+                # Un PDF escaneado no tiene capa de texto: se deja para el OCR
+                resultado["pendiente_ocr"] = True
+            
+            resultado["tiempo_extraccion_s"] = time.perf_counter() - inicio
+            # Lo que no fue buscar con los patrones fue obtener el texto (o la huella)
+            busqueda = cronometro.tiempos.get(BUSCAR, 0.0)
+            resultado["etapas"] = {EXTRAER_TEXTO: resultado["tiempo_extraccion_s"] - busqueda, BUSCAR: busqueda}
+            return resultado
         
         except Exception as e:
             return {
                 "exitoso": False,
                 "error": str(e),
-                "ruta_original": ruta_pdf
+                "ruta_original": descripcion_fuente(ruta_pdf)
             }
     
-    def _extraer_numero_atencion(self, ruta_pdf: str) -> str:
+    def nombrar(self, ruta_pdf: Union[str, FuentePDF], numero_atencion: Optional[str]) -> Dict:
+        """Decide el nombre de salida de un PDF según su número de atención."""
+        if numero_atencion:
+            # Renombrar con número de atención
+            nombre_salida = f"PQR_{numero_atencion}_333.pdf"
+        else:
+            # Mantener nombre original con prefijo
+            nombre_salida = f"SIN_NUMERO_{nombre_fuente(ruta_pdf)}"
+        
+        return {
+            "numero_encontrado": bool(numero_atencion),
+            "numero_atencion": numero_atencion,
+            "nombre_salida": nombre_salida
+        }
+    
+    def _tiene_texto(self, ruta_pdf: Union[str, FuentePDF]) -> bool:
+        """Indica si las páginas donde se busca el número de atención tienen texto extraíble."""
+        paginas = self.cache.iterar_paginas(ruta_pdf)
+        return any(texto.strip() for texto in islice(paginas, self.max_paginas_atencion))
+    
+    def _extraer_numero_atencion(self, ruta_pdf: Union[str, FuentePDF], cronometro: CronometroEtapas = None) -> Optional[str]:
         """
-        Extrae el número de atención de un archivo PDF.
+        Extrae el número de atención del contenido de un archivo PDF (no de su nombre).
         
         Args:
-            ruta_pdf: Ruta del archivo PDF
+            ruta_pdf: Ruta del archivo PDF o PDF en memoria
+            cronometro: Si se indica, acumula en él el tiempo de búsqueda con los patrones
             
         Returns:
             Número de atención encontrado o None
+            
+        Raises:
+            Exception: Si no se puede leer el PDF
         """
-        try:
-            with open(ruta_pdf, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                
-                if len(reader.pages) > 0:
-                    # Extraer texto de la primera página
-                    texto = reader.pages[0].extract_text()
-                    
-                    # Buscar número de atención usando los patrones
-                    for patron in self.patrones_atencion:
-                        match = re.search(patron, texto, re.IGNORECASE)
-                        if match:
-                            return match.group(1)
-                
-                # Si no se encontró en el contenido, buscar en el nombre del archivo
-                nombre_archivo = os.path.basename(ruta_pdf)
-                match = re.search(r'(\d{5,8})', nombre_archivo)
-                if match:
-                    return match.group(1)
-        
-        except Exception as e:
-            print(f"Error al extraer número de atención de {ruta_pdf}: {str(e)}")
+        # Leer página a página y detenerse en la primera coincidencia;
+        # con una región configurada, primero solo el encabezado
+        regiones = [self.region_atencion, None] if self.region_atencion else [None]
+        for region in regiones:
+            numero = self.buscar_en_paginas(self.cache.iterar_paginas(ruta_pdf, region), cronometro)
+            if numero:
+                return numero
+        return None
+    
+    def buscar_en_paginas(self, paginas: Iterable[str], cronometro: CronometroEtapas = None) -> Optional[str]:
+        """
+        Busca el número de atención en el texto de las primeras páginas de un PDF.
         
-        return None
\ No newline at end of file
+        Args:
+            paginas: Texto de cada página, desde la primera (puede ser perezoso)
+            cronometro: Si se indica, acumula en él el tiempo de búsqueda con los patrones
+            
+        Returns:
+            Número de atención encontrado o None
+        """
+        cronometro = cronometro or CronometroEtapas()
+        motor = obtener_motor(self.patrones_atencion)
+        for texto in islice(paginas, self.max_paginas_atencion):
+            with cronometro.medir(BUSCAR):
+                numero = motor.buscar(texto)
+            if numero:
+                return numero
+        return None
+    
+    @staticmethod
+    def numero_en_nombre(nombre_archivo: str) -> Optional[str]:
+        """Número de atención tomado del nombre del archivo (5 a 8 dígitos seguidos), o None."""
+        match = re.search(r'(\d{5,8})', nombre_archivo)
+        return match.group(1) if match else None
\ No newline at end of file
@@ -0,0 +1,179 @@
+# clases/reportes.py
+
+import os
+import csv
+import importlib.util
+from typing import Dict, List, Sequence
+
+
+class EscritorReporte:
+    """
+    Escribe un informe tabular fila a fila, sin acumular las filas en memoria.
+
+    Se usa como gestor de contexto: las filas se añaden con agregar() a medida que
+    se producen y el archivo queda completo al salir del bloque.
+    """
+
+    extension = None
+    # Los formatos ya comprimidos (xlsx, parquet) se guardan en el ZIP sin recomprimir
+    comprimido = False
+    # Paquete opcional que necesita el formato (None si no necesita ninguno)
+    dependencia = None
+
+    def __init__(self, ruta: str, columnas: Sequence[str]):
+        """
+        Args:
+            ruta: Ruta del archivo a crear
+            columnas: Nombres de las columnas, en orden
+        """
+        self.ruta = ruta
+        self.columnas = list(columnas)
+        self.filas = 0
+
+    @classmethod
+    def disponible(cls) -> bool:
+        """Indica si la dependencia del formato está instalada."""
+        return cls.dependencia is None or importlib.util.find_spec(cls.dependencia) is not None
+
+    def agregar(self, fila: Dict):
+        """Añade una fila; las columnas que falten quedan vacías."""
+        self._escribir([fila.get(columna) for columna in self.columnas])
+        self.filas += 1
+
+    def cerrar(self):
+        pass
+
+    def _escribir(self, valores: List):
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.cerrar()
+
+
+class EscritorReporteExcel(EscritorReporte):
+    """Excel en modo write_only de openpyxl: memoria constante sea cual sea el número de filas."""
+
+    extension = "xlsx"
+    comprimido = True
+
+    def __init__(self, ruta: str, columnas: Sequence[str]):
+        super().__init__(ruta, columnas)
+        from openpyxl import Workbook
+
+        self._libro = Workbook(write_only=True)
+        self._hoja = self._libro.create_sheet()
+        self._hoja.append(self.columnas)
+
+    def _escribir(self, valores: List):
+        self._hoja.append(valores)
+
+    def cerrar(self):
+        self._libro.save(self.ruta)
+
+
+class EscritorReporteCSV(EscritorReporte):
+    """CSV en UTF-8 con BOM, para que Excel lo abra con las tildes correctas."""
+
+    extension = "csv"
+
+    def __init__(self, ruta: str, columnas: Sequence[str]):
+        super().__init__(ruta, columnas)
+        self._archivo = open(ruta, "w", newline="", encoding="utf-8-sig")
+        self._csv = csv.writer(self._archivo)
+        self._csv.writerow(self.columnas)
+
+    def _escribir(self, valores: List):
+        self._csv.writerow(["" if valor is None else valor for valor in valores])
+
+    def cerrar(self):
+        self._archivo.close()
+
+
+class EscritorReporteParquet(EscritorReporte):
+    """Parquet (requiere pyarrow); las filas se escriben en grupos de `TAMANO_GRUPO`."""
+
+    extension = "parquet"
+    comprimido = True
+    TAMANO_GRUPO = 10_000
+    dependencia = "pyarrow"
+
+    def __init__(self, ruta: str, columnas: Sequence[str]):
+        super().__init__(ruta, columnas)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError("El formato parquet requiere instalar pyarrow")
+
+        self._pa = pyarrow
+        self._escritor = None
+        self._pendientes = []
+
+    def _escribir(self, valores: List):
+        self._pendientes.append(valores)
+        if len(self._pendientes) >= self.TAMANO_GRUPO:
+            self._volcar()
+
+    def _volcar(self):
+        datos = {columna: [fila[i] for fila in self._pendientes] for i, columna in enumerate(self.columnas)}
+        tabla = self._pa.table(datos)
+        if self._escritor is None:
+            # Los tipos se deducen del primer grupo; las columnas sin ningún valor
+            # en él se declaran como texto
+            esquema = self._pa.schema([
+                self._pa.field(campo.name, self._pa.string()) if self._pa.types.is_null(campo.type) else campo
+                for campo in tabla.schema
+            ])
+            self._escritor = self._pa.parquet.ParquetWriter(self.ruta, esquema)
+        self._escritor.write_table(tabla.cast(self._escritor.schema))
+        self._pendientes = []
+
+    def cerrar(self):
+        if self._pendientes or self._escritor is None:
+            self._volcar()
+        self._escritor.close()
+
+
+FORMATOS = {
+    "xlsx": EscritorReporteExcel,
+    "csv": EscritorReporteCSV,
+    "parquet": EscritorReporteParquet,
+}
+
+
+def verificar_formato(formato: str):
+    """
+    Comprueba que se puede escribir un informe en el formato indicado, antes de procesar nada.
+
+    Raises:
+        ValueError: Si el formato no existe o falta su dependencia
+    """
+    clase = FORMATOS.get(formato)
+    if clase is None:
+        raise ValueError(f"Formato de informe no válido: {formato}. Formatos disponibles: {', '.join(FORMATOS)}")
+    if not clase.disponible():
+        raise ValueError(f"El formato {formato} requiere instalar {clase.dependencia}")
+
+
+def crear_escritor(formato: str, directorio: str, nombre: str, columnas: Sequence[str]) -> EscritorReporte:
+    """
+    Crea el escritor de informes del formato indicado.
+
+    Args:
+        formato: "xlsx", "csv" o "parquet"
+        directorio: Directorio donde crear el informe
+        nombre: Nombre del archivo, sin extensión
+        columnas: Nombres de las columnas, en orden
+
+    Returns:
+        EscritorReporte listo para añadir filas
+
+    Raises:
+        ValueError: Si el formato no existe o falta su dependencia
+    """
+    verificar_formato(formato)
+    clase = FORMATOS[formato]
+    return clase(os.path.join(directorio, f"{nombre}.{clase.extension}"), columnas)
@@ -0,0 +1,418 @@
+# clases/trabajos.py
+
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import shutil
+import socket
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from clases.espacio_trabajo import directorio_datos, tamano_directorio
+from clases.metricas import metricas
+
+# Una tarea recibe la función de progreso y devuelve (ruta_resultado, resumen)
+Tarea = Callable[[Callable[[int, Optional[int]], None]], Tuple[str, Dict]]
+
+EN_COLA = "en_cola"
+EN_PROCESO = "en_proceso"
+COMPLETADO = "completado"
+FALLIDO = "fallido"
+
+
+# Propietario de los trabajos creados por este proceso: "host:pid:arranque". El
+# identificador de arranque distingue este proceso de otro anterior con el mismo pid
+PROPIETARIO = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+
+
+class ColaLlena(Exception):
+    """Se lanza cuando la cola de trabajos ha alcanzado su capacidad máxima."""
+
+
+def _propietario_activo(propietario: Optional[str]) -> bool:
+    """
+    Indica si el proceso que creó un trabajo puede seguir ejecutándolo.
+
+    Los trabajos se ejecutan en el proceso que los creó (la cola está en memoria),
+    así que un trabajo pendiente cuyo proceso ya no existe no va a terminar nunca.
+    Los procesos de otra máquina no se pueden comprobar y se dan por activos.
+    """
+    if not propietario:
+        # Trabajos de una versión anterior, sin propietario
+        return False
+    host, pid, arranque = propietario.rsplit(":", 2)
+    if host != socket.gethostname():
+        return True
+    if int(pid) == os.getpid():
+        return propietario == PROPIETARIO
+    if sys.platform == "win32":
+        # os.kill no sirve para comprobar un proceso en Windows (lo terminaría)
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class AlmacenTrabajos:
+    """Estado persistente de los trabajos en una base de datos SQLite local."""
+
+    def __init__(self, ruta_db: str):
+        self.ruta_db = ruta_db
+        self._lock = threading.Lock()
+        with self._conectar() as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS trabajos (
+                    id TEXT PRIMARY KEY,
+                    tipo TEXT NOT NULL,
+                    estado TEXT NOT NULL,
+                    procesados INTEGER NOT NULL DEFAULT 0,
+                    total INTEGER,
+                    resumen TEXT,
+                    ruta_resultado TEXT,
+                    error TEXT,
+                    creado TEXT NOT NULL,
+                    actualizado TEXT NOT NULL,
+                    propietario TEXT
+                )
+            """)
+            columnas = {fila["name"] for fila in conexion.execute("PRAGMA table_info(trabajos)")}
+            if "propietario" not in columnas:
+                conexion.execute("ALTER TABLE trabajos ADD COLUMN propietario TEXT")
+
+    def _conectar(self) -> sqlite3.Connection:
+        conexion = sqlite3.connect(self.ruta_db, timeout=30)
+        conexion.row_factory = sqlite3.Row
+        return conexion
+
+    def crear(self, trabajo_id: str, tipo: str):
+        ahora = datetime.now().isoformat(timespec="seconds")
+        with self._lock, self._conectar() as conexion:
+            conexion.execute(
+                "INSERT INTO trabajos (id, tipo, estado, creado, actualizado, propietario) VALUES (?, ?, ?, ?, ?, ?)",
+                (trabajo_id, tipo, EN_COLA, ahora, ahora, PROPIETARIO))
+
+    def actualizar(self, trabajo_id: str, **campos):
+        if "resumen" in campos:
+            campos["resumen"] = json.dumps(campos["resumen"])
+        campos["actualizado"] = datetime.now().isoformat(timespec="seconds")
+        asignaciones = ", ".join(f"{campo} = ?" for campo in campos)
+        with self._lock, self._conectar() as conexion:
+            conexion.execute(f"UPDATE trabajos SET {asignaciones} WHERE id = ?",
+                             (*campos.values(), trabajo_id))
+
+    def obtener(self, trabajo_id: str) -> Optional[Dict]:
+        with self._conectar() as conexion:
+            fila = conexion.execute("SELECT * FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+        if fila is None:
+            return None
+        trabajo = dict(fila)
+        trabajo["resumen"] = json.loads(trabajo["resumen"]) if trabajo["resumen"] else None
+        return trabajo
+
+    def listar(self, *estados: str) -> List[Dict]:
+        """Devuelve id, estado, fecha de actualización y resultado de los trabajos en esos estados, del más antiguo al más reciente."""
+        marcas = ", ".join("?" for _ in estados)
+        with self._conectar() as conexion:
+            filas = conexion.execute(
+                f"SELECT id, estado, actualizado, ruta_resultado FROM trabajos WHERE estado IN ({marcas}) "
+                "ORDER BY actualizado", estados).fetchall()
+        return [dict(fila) for fila in filas]
+
+    def existentes(self, trabajo_ids: Iterable[str]) -> Set[str]:
+        """Devuelve cuáles de los ids tienen un trabajo registrado."""
+        trabajo_ids = list(trabajo_ids)
+        with self._conectar() as conexion:
+            return {fila["id"] for i in range(0, len(trabajo_ids), 500)
+                    for fila in conexion.execute(
+                        f"SELECT id FROM trabajos WHERE id IN ({', '.join('?' for _ in trabajo_ids[i:i + 500])})",
+                        trabajo_ids[i:i + 500])}
+
+    def eliminar(self, trabajo_ids: Iterable[str]):
+        with self._lock, self._conectar() as conexion:
+            conexion.executemany("DELETE FROM trabajos WHERE id = ?", [(t,) for t in trabajo_ids])
+
+    def marcar_interrumpidos(self) -> int:
+        """
+        Marca como fallidos los trabajos pendientes cuyo proceso ya no existe.
+
+        Varios workers del servidor comparten la base de datos: los trabajos
+        pendientes de otro proceso vivo no se tocan. La consulta y la actualización
+        van en una misma transacción de escritura, así que dos procesos que
+        arrancan a la vez no se pisan.
+
+        Returns:
+            Número de trabajos marcados como fallidos
+        """
+        with self._lock, self._conectar() as conexion:
+            conexion.execute("BEGIN IMMEDIATE")
+            filas = conexion.execute(
+                "SELECT id, propietario FROM trabajos WHERE estado IN (?, ?)", (EN_COLA, EN_PROCESO)).fetchall()
+            interrumpidos = [(fila["id"],) for fila in filas if not _propietario_activo(fila["propietario"])]
+            conexion.executemany(
+                "UPDATE trabajos SET estado = ?, error = ?, actualizado = ? WHERE id = ?",
+                [(FALLIDO, "Trabajo interrumpido por un reinicio del servidor",
+                  datetime.now().isoformat(timespec="seconds"), trabajo_id) for (trabajo_id,) in interrumpidos])
+        return len(interrumpidos)
+
+
+class GestorTrabajos:
+    """
+    Ejecuta en segundo plano los procesamientos largos y guarda su estado y resultado.
+
+    Los trabajos se encolan en una cola acotada y los atiende un número fijo de
+    hilos. Cada trabajo tiene su propio directorio bajo `directorio`, donde quedan
+    las entradas mientras se procesa y el resultado una vez terminado; el estado
+    se guarda en SQLite, así que los resultados siguen disponibles tras reiniciar.
+    Cada trabajo guarda el proceso que lo creó (PROPIETARIO): al arrancar solo se
+    dan por interrumpidos los trabajos de procesos que ya no existen, no los de
+    otros workers del servidor que comparten el directorio.
+
+    Los resultados no se guardan para siempre (ver limpiar): los trabajos
+    terminados hace más de la edad máxima se borran, y si los resultados superan
+    la cuota se borran los más antiguos, cuyo trabajo queda registrado (el
+    resultado responde 410).
+
+    Configuración por variables de entorno: PACA_DIR_TRABAJOS (por defecto,
+    trabajos/ en PACA_DIR_DATOS), PACA_TRABAJOS_WORKERS, PACA_TRABAJOS_MAX_COLA,
+    PACA_TRABAJOS_MAX_EDAD (segundos) y PACA_TRABAJOS_MAX_BYTES.
+    """
+
+    # Intervalo mínimo entre escrituras de progreso en la base de datos
+    INTERVALO_PROGRESO = 0.5
+    # Edad mínima de un directorio sin trabajo registrado antes de borrarlo (se
+    # crea justo antes de registrar el trabajo)
+    GRACIA_HUERFANOS = 3600
+
+    def __init__(self, directorio: str = None, num_workers: int = None, max_cola: int = None,
+                 max_edad: float = None, max_bytes: int = None):
+        """
+        Args:
+            directorio: Directorio de los trabajos y de su base de datos
+            num_workers: Trabajos ejecutados a la vez
+            max_cola: Trabajos pendientes admitidos antes de rechazar
+            max_edad: Segundos que se conserva un trabajo terminado
+            max_bytes: Cuota de los resultados; por encima se borran los más antiguos
+        """
+        self.directorio = directorio or os.environ.get("PACA_DIR_TRABAJOS") or directorio_datos("trabajos")
+        self.num_workers = num_workers or int(os.environ.get("PACA_TRABAJOS_WORKERS", 2))
+        self.max_cola = max_cola or int(os.environ.get("PACA_TRABAJOS_MAX_COLA", 100))
+        self.max_edad = max_edad or float(os.environ.get("PACA_TRABAJOS_MAX_EDAD", 7 * 24 * 3600))
+        self.max_bytes = max_bytes or int(os.environ.get("PACA_TRABAJOS_MAX_BYTES", 20 * 1024 ** 3))
+        self._cola = queue.Queue(maxsize=self.max_cola)
+        self._hilos = []
+        self._lock = threading.Lock()
+        self._almacen = None
+        self._en_proceso = 0
+
+    @property
+    def en_cola(self) -> int:
+        """Trabajos encolados que aún no ha empezado ningún worker."""
+        return self._cola.qsize()
+
+    @property
+    def en_proceso(self) -> int:
+        """Trabajos que se están ejecutando."""
+        return self._en_proceso
+
+    @property
+    def almacen(self) -> AlmacenTrabajos:
+        with self._lock:
+            if self._almacen is None:
+                os.makedirs(self.directorio, exist_ok=True)
+                self._almacen = AlmacenTrabajos(os.path.join(self.directorio, "trabajos.db"))
+                self._almacen.marcar_interrumpidos()
+            return self._almacen
+
+    def crear(self, tipo: str) -> Tuple[str, str]:
+        """
+        Registra un trabajo nuevo y crea su directorio de entrada.
+
+        Returns:
+            Tuple con (id_del_trabajo, directorio_de_entrada)
+
+        Raises:
+            ColaLlena: Si la cola ya está llena
+        """
+        if self._cola.full():
+            raise ColaLlena("La cola de trabajos está llena, inténtelo más tarde")
+
+        trabajo_id = uuid.uuid4().hex
+        directorio_entrada = os.path.join(self.directorio, trabajo_id, "entrada")
+        os.makedirs(directorio_entrada)
+        self.almacen.crear(trabajo_id, tipo)
+        return trabajo_id, directorio_entrada
+
+    def encolar(self, trabajo_id: str, tarea: Tarea):
+        """
+        Pone en cola un trabajo creado con crear().
+
+        Raises:
+            ColaLlena: Si la cola se llenó entre crear() y encolar(); el trabajo se marca como fallido
+        """
+        self._iniciar_workers()
+        try:
+            self._cola.put_nowait((trabajo_id, tarea))
+        except queue.Full:
+            self.descartar(trabajo_id, "La cola de trabajos está llena")
+            raise ColaLlena("La cola de trabajos está llena, inténtelo más tarde")
+
+    def descartar(self, trabajo_id: str, error: str):
+        """Marca un trabajo como fallido antes de encolarlo y borra sus archivos."""
+        self.almacen.actualizar(trabajo_id, estado=FALLIDO, error=error)
+        shutil.rmtree(os.path.join(self.directorio, trabajo_id), ignore_errors=True)
+
+    def obtener(self, trabajo_id: str) -> Optional[Dict]:
+        """Devuelve el estado de un trabajo, o None si no existe."""
+        return self.almacen.obtener(trabajo_id)
+
+    def limpiar(self) -> Dict[str, int]:
+        """
+        Aplica la retención de los trabajos terminados.
+
+        - Los trabajos (completados o fallidos) terminados hace más de la edad
+          máxima se borran con su directorio.
+        - Los fallidos no conservan archivos: se borran las entradas que quedaron
+          de un trabajo interrumpido.
+        - Si los resultados superan la cuota, se borran los más antiguos; el
+          trabajo sigue registrado y su resultado responde 410.
+        - Se borran los directorios sin trabajo registrado que superan un margen.
+
+        Antes se marcan como fallidos los trabajos pendientes de procesos que ya
+        no existen. Pensado para el limpiador periódico de las áreas de trabajo.
+
+        Returns:
+            Dict con los trabajos borrados, los resultados borrados y los bytes liberados
+        """
+        if not os.path.isdir(self.directorio):
+            return {"trabajos": 0, "resultados": 0, "bytes": 0}
+        almacen = self.almacen
+        almacen.marcar_interrumpidos()
+
+        limite = (datetime.now() - timedelta(seconds=self.max_edad)).isoformat(timespec="seconds")
+        terminados = almacen.listar(COMPLETADO, FALLIDO)
+        caducados = [t["id"] for t in terminados if t["actualizado"] < limite]
+        liberados = sum(self._borrar_directorio(trabajo_id) for trabajo_id in caducados)
+        almacen.eliminar(caducados)
+
+        completados = []
+        for trabajo in terminados:
+            if trabajo["actualizado"] < limite:
+                continue
+            if trabajo["estado"] == FALLIDO:
+                liberados += self._borrar_directorio(trabajo["id"])
+            elif trabajo["ruta_resultado"] and os.path.exists(trabajo["ruta_resultado"]):
+                completados.append(trabajo["id"])
+
+        # Directorios que no corresponden a ningún trabajo (p. ej. filas borradas a mano)
+        ahora = time.time()
+        directorios = {}
+        for entrada in os.scandir(self.directorio):
+            try:
+                if entrada.is_dir(follow_symlinks=False):
+                    directorios[entrada.name] = entrada.stat().st_mtime
+            except OSError:
+                continue
+        registrados = almacen.existentes(directorios)
+        for nombre, modificado in directorios.items():
+            if nombre not in registrados and ahora - modificado > self.GRACIA_HUERFANOS:
+                liberados += self._borrar_directorio(nombre)
+
+        # Cuota: los resultados más antiguos primero (los trabajos en curso no se tocan)
+        tamanos = {trabajo_id: tamano_directorio(os.path.join(self.directorio, trabajo_id)) for trabajo_id in completados}
+        total = sum(tamano_directorio(os.path.join(self.directorio, nombre))
+                    for nombre in directorios if nombre in registrados and nombre not in tamanos)
+        total += sum(tamanos.values())
+        resultados = 0
+        for trabajo_id in completados:
+            if total <= self.max_bytes:
+                break
+            total -= tamanos[trabajo_id]
+            liberados += self._borrar_directorio(trabajo_id)
+            resultados += 1
+
+        if caducados or resultados:
+            metricas.incrementar("paca_trabajos_limpiados_total", len(caducados), tipo="trabajo")
+            metricas.incrementar("paca_trabajos_limpiados_total", resultados, tipo="resultado")
+            print(f"🧹 Borrados {len(caducados)} trabajos caducados y {resultados} resultados por cuota "
+                  f"({liberados / 1024 ** 2:.1f} MB)")
+        return {"trabajos": len(caducados), "resultados": resultados, "bytes": liberados}
+
+    def _borrar_directorio(self, trabajo_id: str) -> int:
+        """Borra el directorio de un trabajo y devuelve los bytes liberados."""
+        ruta = os.path.join(self.directorio, trabajo_id)
+        if not os.path.isdir(ruta):
+            return 0
+        tamano = tamano_directorio(ruta)
+        shutil.rmtree(ruta, ignore_errors=True)
+        return tamano
+
+    def _iniciar_workers(self):
+        with self._lock:
+            if self._hilos:
+                return
+            for i in range(self.num_workers):
+                hilo = threading.Thread(target=self._atender_cola, name=f"trabajos-{i}", daemon=True)
+                hilo.start()
+                self._hilos.append(hilo)
+
+    def _atender_cola(self):
+        while True:
+            trabajo_id, tarea = self._cola.get()
+            with self._lock:
+                self._en_proceso += 1
+            try:
+                self._ejecutar(trabajo_id, tarea)
+            finally:
+                with self._lock:
+                    self._en_proceso -= 1
+                self._cola.task_done()
+
+    def _ejecutar(self, trabajo_id: str, tarea: Tarea):
+        directorio_trabajo = os.path.join(self.directorio, trabajo_id)
+        self.almacen.actualizar(trabajo_id, estado=EN_PROCESO)
+        ultimo_aviso = [0.0]
+
+        def progreso(procesados: int, total: Optional[int] = None):
+            ahora = time.monotonic()
+            if ahora - ultimo_aviso[0] >= self.INTERVALO_PROGRESO or procesados == total:
+                ultimo_aviso[0] = ahora
+                self.almacen.actualizar(trabajo_id, procesados=procesados, total=total)
+
+        try:
+            ruta_resultado, resumen = tarea(progreso)
+
+            # Conservar solo el resultado, fuera de los directorios de trabajo
+            ruta_final = os.path.join(directorio_trabajo, os.path.basename(ruta_resultado))
+            if os.path.abspath(ruta_resultado) != os.path.abspath(ruta_final):
+                shutil.move(ruta_resultado, ruta_final)
+            for nombre in os.listdir(directorio_trabajo):
+                ruta = os.path.join(directorio_trabajo, nombre)
+                if ruta != ruta_final:
+                    if os.path.isdir(ruta):
+                        shutil.rmtree(ruta, ignore_errors=True)
+                    else:
+                        os.remove(ruta)
+
+            # Los apartados por tipo (procesar_documentos) se guardan con sus valores simples
+            resumen_guardado = {k: _valores_simples(v) if isinstance(v, dict) else v
+                                for k, v in resumen.items() if isinstance(v, (int, float, str, dict))}
+            self.almacen.actualizar(trabajo_id, estado=COMPLETADO, resumen=resumen_guardado,
+                                    ruta_resultado=ruta_final,
+                                    procesados=resumen.get("total", resumen.get("procesados", 0)))
+        except Exception as e:
+            print(f"Error en el trabajo {trabajo_id}: {str(e)}")
+            self.almacen.actualizar(trabajo_id, estado=FALLIDO, error=str(e))
+            shutil.rmtree(os.path.join(directorio_trabajo, "entrada"), ignore_errors=True)
+
+
+def _valores_simples(valores: Dict) -> Dict:
+    return {k: v for k, v in valores.items() if isinstance(v, (int, float, str))}
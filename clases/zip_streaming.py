@@ -0,0 +1,101 @@
+# clases/zip_streaming.py
+
+import os
+import zipfile
+from typing import Iterator, List
+
+TAMANO_BLOQUE = 1024 * 1024
+
+
+class _BufferSalida:
+    """Destino de escritura no posicionable que acumula los bytes hasta que se recogen."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos) -> int:
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def recoger(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+class EscritorZipStreaming:
+    """
+    Construye un ZIP en memoria por tramos para enviarlo mientras se genera.
+
+    Cada método devuelve los bytes del ZIP producidos hasta ese momento, de modo
+    que el llamador los puede enviar al cliente sin escribir el ZIP en disco.
+    Los PDF ya van comprimidos internamente, así que por defecto se almacenan
+    sin volver a comprimir (ZIP_STORED).
+    """
+
+    def __init__(self, compresion: int = zipfile.ZIP_STORED):
+        self.compresion = compresion
+        self._buffer = _BufferSalida()
+        self._zip = zipfile.ZipFile(self._buffer, "w", compression=compresion)
+
+    def agregar_archivo(self, ruta: str, nombre: str) -> Iterator[bytes]:
+        """
+        Añade un archivo del disco al ZIP leyéndolo por bloques.
+
+        Args:
+            ruta: Ruta del archivo a añadir
+            nombre: Nombre del archivo dentro del ZIP
+
+        Yields:
+            Tramos del ZIP listos para enviar
+        """
+        info = zipfile.ZipInfo.from_file(ruta, nombre)
+        info.compress_type = self.compresion
+        with open(ruta, "rb") as origen, self._zip.open(info, "w") as destino:
+            while True:
+                bloque = origen.read(TAMANO_BLOQUE)
+                if not bloque:
+                    break
+                destino.write(bloque)
+                datos = self._buffer.recoger()
+                if datos:
+                    yield datos
+        yield self._buffer.recoger()
+
+    def agregar_datos(self, nombre: str, datos: bytes, compresion: int = None) -> bytes:
+        """Añade un archivo a partir de bytes en memoria y devuelve el tramo generado."""
+        self._zip.writestr(nombre, datos, compress_type=self.compresion if compresion is None else compresion)
+        return self._buffer.recoger()
+
+    def cerrar(self) -> bytes:
+        """Escribe el directorio central del ZIP y devuelve los últimos bytes."""
+        self._zip.close()
+        return self._buffer.recoger()
+
+
+def comprimir_directorio(directorio: str, ruta_zip: str, nombres: List[str] = None):
+    """
+    Crea un ZIP en disco con el contenido de un directorio.
+
+    Los PDF se almacenan sin recomprimir; el resto de archivos se comprime con deflate.
+
+    Args:
+        directorio: Directorio a comprimir
+        ruta_zip: Ruta del ZIP a crear
+        nombres: Rutas (relativas al directorio) a incluir, en ese orden; por
+            defecto, todo el directorio en orden alfabético
+    """
+    if nombres is None:
+        nombres = []
+        for root, dirs, files in os.walk(directorio):
+            dirs.sort()
+            for file in sorted(files):
+                nombres.append(os.path.relpath(os.path.join(root, file), directorio))
+
+    with zipfile.ZipFile(ruta_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for arcname in nombres:
+            compresion = zipfile.ZIP_STORED if arcname.lower().endswith('.pdf') else zipfile.ZIP_DEFLATED
+            zipf.write(os.path.join(directorio, arcname), arcname, compress_type=compresion)
@@ -1,17 +1,84 @@
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, UploadFile, File, Request
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
-from tempfile import mkdtemp
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 import os
-import shutil
+import time
 from typing import List
-from clases.procesador import ProcesadorCartas
-from clases.procesador_lleida import ProcesadorPDF
-from clases.ExtractorCertificados import ExtractorCertificadosLleida
-from clases.analizador_excel import AnalizadorExcel
+# Los procesadores (y PyMuPDF, PyPDF2...) se importan en la primera petición que
+# los usa, o al arrancar si se indican en PACA_PRECARGA
+from clases.carga_diferida import PROCESADORES, ProcesadorNoDisponible, cargar_procesador, precargar, procesadores_a_precargar
+from clases.conversion_docx import cerrar_conversor
+from clases.ejecutor import cerrar_pools
+from clases.espacio_trabajo import obtener_espacios
+from clases.indice_resultados import obtener_indice
+from clases.ingesta import LimiteSubidaExcedido, guardar_subida, guardar_subidas
+from clases.metricas import (INGESTA, Perfilador, cabecera_server_timing, iniciar_tiempos_peticion, medir_etapa,
+                             metricas, perfilar)
+from clases.planificador import ServidorSaturado, obtener_planificador
+from clases.reportes import verificar_formato
+from clases.trabajos import COMPLETADO, ColaLlena, GestorTrabajos
 
-app = FastAPI()
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    nombres = procesadores_a_precargar()
+    if nombres:
+        await run_in_threadpool(precargar, nombres)
+    espacios.iniciar_limpieza()
+    yield
+    espacios.detener_limpieza()
+    await run_in_threadpool(cerrar_pools)
+    await run_in_threadpool(cerrar_conversor)
 
+
+class ControlAdmision:
+    """
+    Pide plaza al planificador antes de leer la subida de una petición de procesamiento.
+
+    La plaza se devuelve cuando se ha enviado la respuesta completa, así que en
+    las respuestas en streaming cubre todo el procesamiento. Los trabajos
+    asíncronos tienen su propia cola y solo se comprueba que haya disco.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        ruta = scope["path"].strip("/") if scope["type"] == "http" and scope["method"] == "POST" else ""
+        es_trabajo = ruta.startswith("trabajos/")
+        tipo = ruta.split("/", 1)[1] if es_trabajo else ruta
+        if tipo not in PROCESADORES:
+            await self.app(scope, receive, send)
+            return
+
+        cabeceras = dict(scope["headers"])
+        bytes_subida = int(cabeceras.get(b"content-length", b"0") or 0)
+        planificador = obtener_planificador()
+        plaza = None
+        try:
+            if es_trabajo:
+                planificador.verificar_disco(tipo, bytes_subida)
+            else:
+                plaza = await planificador.entrar(tipo, bytes_subida)
+        except ServidorSaturado as e:
+            respuesta = JSONResponse(status_code=429, content={"error": str(e)},
+                                     headers={"Retry-After": str(e.reintentar_en)})
+            await respuesta(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if plaza is not None:
+                planificador.salir(plaza)
+
+
+app = FastAPI(lifespan=ciclo_de_vida)
+
+# Dentro de CORS e instrumentar, para que los 429 lleven sus cabeceras y se cuenten
+app.add_middleware(ControlAdmision)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -19,21 +86,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+perfilador = Perfilador()
+# Áreas de trabajo de las peticiones: se borran después de enviar la respuesta
+espacios = obtener_espacios()
+
+
+@app.middleware("http")
+async def instrumentar(request: Request, call_next):
+    # Métricas de cada petición, tiempos por etapa en Server-Timing y, si se
+    # pide con la cabecera X-Perfil: 1 (y PACA_PERFILADO=1), perfil de cProfile
+    inicio = time.perf_counter()
+    tiempos = iniciar_tiempos_peticion()
+    perfiles = perfilador.iniciar() if request.headers.get("X-Perfil") == "1" else None
+    metricas.incrementar("paca_peticiones_en_curso", 1)
+    estado = 500
+    try:
+        respuesta = await call_next(request)
+        estado = respuesta.status_code
+    finally:
+        duracion = time.perf_counter() - inicio
+        ruta = getattr(request.scope.get("route"), "path", "desconocida")
+        metricas.incrementar("paca_peticiones_en_curso", -1)
+        metricas.incrementar("paca_peticiones_total", ruta=ruta, estado=estado)
+        metricas.observar("paca_peticion_segundos", duracion, ruta=ruta)
+        if perfiles is not None:
+            archivo_perfil = perfilador.terminar(perfiles, ruta)
+
+    respuesta.headers["Server-Timing"] = cabecera_server_timing(tiempos, duracion)
+    if perfiles is not None:
+        respuesta.headers["X-Perfil-Archivo"] = archivo_perfil
+    return respuesta
+
+
+@app.get("/metrics")
+async def exportar_metricas():
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4")
+
+
+@app.exception_handler(ProcesadorNoDisponible)
+async def procesador_no_disponible(request, e: ProcesadorNoDisponible):
+    return JSONResponse(status_code=503, content={"error": str(e)})
+
 @app.post("/procesar_docx/")
 async def procesar_archivo(archivo: UploadFile = File(...)):
     if not archivo.filename.endswith(".docx"):
         return JSONResponse(status_code=400, content={"error": "Solo se aceptan archivos .docx"})
 
-    temporal = mkdtemp()
-    ruta_docx = os.path.join(temporal, archivo.filename)
-
-    with open(ruta_docx, "wb") as f:
-        f.write(await archivo.read())
+    clase_procesador = cargar_procesador("procesar_docx")
+    temporal = espacios.crear("procesar_docx")
+    limpiar_al_salir = True
 
     try:
-        procesador = ProcesadorCartas(ruta_docx)
-        zip_path, resumen = procesador.procesar()
+        with medir_etapa("procesar_docx", INGESTA):
+            ruta_docx = (await guardar_subida(archivo, temporal)).ruta
+        # Fuera del bucle de eventos, también la construcción (que convierte el DOCX
+        # a PDF con LibreOffice): las demás peticiones siguen atendiéndose
+        zip_path, resumen = await run_in_threadpool(
+            perfilar(lambda: clase_procesador(ruta_docx, directorio_trabajo=temporal).procesar()))
 
+        # El área de trabajo se borra después de enviar el ZIP
+        limpiar_al_salir = False
         return FileResponse(
             zip_path,
             filename=os.path.basename(zip_path),
@@ -41,19 +153,24 @@ async def procesar_archivo(archivo: UploadFile = File(...)):
             headers={
                 "Resumen-Procesados": str(resumen["procesados"]),
                 "Resumen-Con-Numero": str(resumen["con_numero"]),
-                "Resumen-Sin-Numero": str(resumen["sin_numero"])
-            }
+                "Resumen-Sin-Numero": str(resumen["sin_numero"]),
+                "Resumen-Paginas-Excepcion": str(resumen["paginas_excepcion"])
+            },
+            background=BackgroundTask(espacios.eliminar, temporal)
         )
 
+    except LimiteSubidaExcedido as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
     finally:
-        shutil.rmtree(temporal, ignore_errors=True)
+        if limpiar_al_salir:
+            espacios.eliminar(temporal)
 
 # Agregar este endpoint a tu main.py
 
 @app.post("/procesar_pdfs/")
-async def procesar_pdfs(archivos: List[UploadFile] = File(...)):
+async def procesar_pdfs(archivos: List[UploadFile] = File(...), stream: bool = False):
     # Validar que todos los archivos sean PDF o ZIP
     for archivo in archivos:
         if not (archivo.filename.endswith((".pdf", ".zip"))):
@@ -62,21 +179,33 @@ async def procesar_pdfs(archivos: List[UploadFile] = File(...)):
                 content={"error": f"Solo se aceptan archivos .pdf o .zip. Archivo rechazado: {archivo.filename}"}
             )
     
-    temporal = mkdtemp()
-    archivos_guardados = []
+    clase_procesador = cargar_procesador("procesar_pdfs")
+    temporal = espacios.crear("procesar_pdfs")
+    limpiar_al_salir = True
     
     try:
         # Guardar archivos subidos
-        for archivo in archivos:
-            ruta_archivo = os.path.join(temporal, archivo.filename)
-            with open(ruta_archivo, "wb") as f:
-                f.write(await archivo.read())
-            archivos_guardados.append(ruta_archivo)
+        with medir_etapa("procesar_pdfs", INGESTA):
+            archivos_guardados = [subido.ruta for subido in await guardar_subidas(archivos, temporal)]
+        
+        procesador = clase_procesador()
+        
+        if stream:
+            # El ZIP se envía a medida que se procesa; el resumen va dentro como resumen.json
+            contenido, _ = await run_in_threadpool(perfilar(procesador.procesar_archivos_stream),
+                                                   archivos_guardados, temporal)
+            limpiar_al_salir = False
+            return StreamingResponse(
+                contenido,
+                media_type="application/zip",
+                headers={"Content-Disposition": f'attachment; filename="{procesador.nombre_zip_resultado()}"'},
+                background=BackgroundTask(espacios.eliminar, temporal)
+            )
         
         # Procesar archivos
-        procesador = ProcesadorPDF()
-        zip_path, resumen = procesador.procesar_archivos(archivos_guardados, temporal)
+        zip_path, resumen = await run_in_threadpool(perfilar(procesador.procesar_archivos), archivos_guardados, temporal)
         
+        limpiar_al_salir = False
         return FileResponse(
             zip_path,
             filename=os.path.basename(zip_path),
@@ -86,16 +215,24 @@ async def procesar_pdfs(archivos: List[UploadFile] = File(...)):
                 "Resumen-Exitosos": str(resumen["exitosos"]),
                 "Resumen-Fallidos": str(resumen["fallidos"]),
                 "Resumen-Sin-Numero": str(resumen["sin_numero"])
-            }
+            },
+            background=BackgroundTask(espacios.eliminar, temporal)
         )
     
+    except LimiteSubidaExcedido as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
     finally:
-        shutil.rmtree(temporal, ignore_errors=True)
+        if limpiar_al_salir:
+            espacios.eliminar(temporal)
         
 @app.post("/procesar_certificados/")
-async def procesar_certificados(archivos: List[UploadFile] = File(...)):
+async def procesar_certificados(archivos: List[UploadFile] = File(...), formato: str = "xlsx"):
+    try:
+        verificar_formato(formato)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     # Validar que todos los archivos sean PDF
     for archivo in archivos:
         if not archivo.filename.lower().endswith('.pdf'):
@@ -104,21 +241,21 @@ async def procesar_certificados(archivos: List[UploadFile] = File(...)):
                 content={"error": f"Solo se aceptan archivos PDF. Archivo rechazado: {archivo.filename}"}
             )
     
-    temporal = mkdtemp()
-    archivos_guardados = []
+    clase_extractor = cargar_procesador("procesar_certificados")
+    temporal = espacios.crear("procesar_certificados")
+    limpiar_al_salir = True
     
     try:
         # Guardar archivos subidos
-        for archivo in archivos:
-            ruta_archivo = os.path.join(temporal, archivo.filename)
-            with open(ruta_archivo, "wb") as f:
-                f.write(await archivo.read())
-            archivos_guardados.append(ruta_archivo)
+        with medir_etapa("procesar_certificados", INGESTA):
+            archivos_guardados = [subido.ruta for subido in await guardar_subidas(archivos, temporal)]
         
         # Procesar archivos
-        extractor = ExtractorCertificadosLleida()
-        zip_path, resumen = extractor.procesar_archivos(archivos_guardados, temporal)
+        extractor = clase_extractor()
+        zip_path, resumen = await run_in_threadpool(perfilar(extractor.procesar_archivos), archivos_guardados, temporal,
+                                                    formato=formato)
         
+        limpiar_al_salir = False
         return FileResponse(
             zip_path,
             filename=os.path.basename(zip_path),
@@ -129,11 +266,224 @@ async def procesar_certificados(archivos: List[UploadFile] = File(...)):
                 "Resumen-Fallidos": str(resumen["fallidos"]),
                 "Resumen-Sin-Certificado": str(resumen["sin_certificado"]),
                 "Resumen-Sin-Asunto": str(resumen["sin_asunto"])
-            }
+            },
+            background=BackgroundTask(espacios.eliminar, temporal)
         )
     
+    except LimiteSubidaExcedido as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
     finally:
-        shutil.rmtree(temporal, ignore_errors=True)
+        if limpiar_al_salir:
+            espacios.eliminar(temporal)
         
+
+@app.post("/procesar_documentos/")
+async def procesar_documentos(archivos: List[UploadFile] = File(...), formato: str = "xlsx"):
+    # Lotes mixtos: cada PDF se clasifica (certificado, notificación o cartas) y se
+    # procesa como en su endpoint, con un único ZIP y un manifiesto de resultado
+    try:
+        verificar_formato(formato)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    for archivo in archivos:
+        if not (archivo.filename.lower().endswith((".pdf", ".zip"))):
+            return JSONResponse(
+                status_code=400,
+                content={"error": f"Solo se aceptan archivos .pdf o .zip. Archivo rechazado: {archivo.filename}"}
+            )
+
+    clase_enrutador = cargar_procesador("procesar_documentos")
+    temporal = espacios.crear("procesar_documentos")
+    limpiar_al_salir = True
+
+    try:
+        with medir_etapa("procesar_documentos", INGESTA):
+            archivos_guardados = [subido.ruta for subido in await guardar_subidas(archivos, temporal)]
+
+        enrutador = clase_enrutador()
+        zip_path, resumen = await run_in_threadpool(perfilar(enrutador.procesar_archivos), archivos_guardados, temporal,
+                                                    formato=formato)
+
+        # El área de trabajo se borra después de enviar el ZIP
+        limpiar_al_salir = False
+        return FileResponse(
+            zip_path,
+            filename=os.path.basename(zip_path),
+            media_type="application/zip",
+            headers={
+                "Resumen-Total": str(resumen["total"]),
+                "Resumen-Fallidos": str(resumen["fallidos"]),
+                "Resumen-Certificados": str(resumen["certificados"]["total"]),
+                "Resumen-Notificaciones": str(resumen["notificaciones"]["total"]),
+                "Resumen-Cartas": str(resumen["cartas"]["procesados"])
+            },
+            background=BackgroundTask(espacios.eliminar, temporal)
+        )
+
+    except LimiteSubidaExcedido as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+    finally:
+        if limpiar_al_salir:
+            espacios.eliminar(temporal)
+
+
+# Trabajos asíncronos: el procesamiento se hace en segundo plano y el cliente
+# consulta el estado y descarga el resultado cuando termina
+
+gestor_trabajos = GestorTrabajos()
+metricas.registrar_sonda("paca_trabajos_en_cola", lambda: gestor_trabajos.en_cola)
+metricas.registrar_sonda("paca_trabajos_en_proceso", lambda: gestor_trabajos.en_proceso)
+# Retención de los resultados: la aplica el limpiador periódico de las áreas de trabajo
+espacios.registrar_limpieza(gestor_trabajos.limpiar)
+
+
+async def _crear_trabajo(tipo: str, archivos: List[UploadFile], procesar):
+    try:
+        trabajo_id, directorio = gestor_trabajos.crear(tipo)
+    except ColaLlena as e:
+        return JSONResponse(status_code=429, content={"error": str(e)}, headers={"Retry-After": "30"})
+
+    try:
+        with medir_etapa(tipo, INGESTA):
+            rutas = [subido.ruta for subido in await guardar_subidas(archivos, directorio)]
+        gestor_trabajos.encolar(trabajo_id, lambda progreso: procesar(rutas, directorio, progreso))
+    except LimiteSubidaExcedido as e:
+        gestor_trabajos.descartar(trabajo_id, str(e))
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except ColaLlena as e:
+        return JSONResponse(status_code=429, content={"error": str(e)}, headers={"Retry-After": "30"})
+    except Exception as e:
+        gestor_trabajos.descartar(trabajo_id, str(e))
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+    return JSONResponse(status_code=202, content={"id": trabajo_id, "estado": "en_cola"})
+
+
+@app.post("/trabajos/procesar_docx/")
+async def trabajo_procesar_docx(archivo: UploadFile = File(...)):
+    if not archivo.filename.endswith(".docx"):
+        return JSONResponse(status_code=400, content={"error": "Solo se aceptan archivos .docx"})
+
+    clase_procesador = cargar_procesador("procesar_docx")
+    return await _crear_trabajo(
+        "procesar_docx", [archivo],
+        lambda rutas, directorio, progreso: clase_procesador(rutas[0], directorio_trabajo=directorio).procesar(progreso)
+    )
+
+
+@app.post("/trabajos/procesar_pdfs/")
+async def trabajo_procesar_pdfs(archivos: List[UploadFile] = File(...)):
+    for archivo in archivos:
+        if not (archivo.filename.endswith((".pdf", ".zip"))):
+            return JSONResponse(
+                status_code=400,
+                content={"error": f"Solo se aceptan archivos .pdf o .zip. Archivo rechazado: {archivo.filename}"}
+            )
+
+    clase_procesador = cargar_procesador("procesar_pdfs")
+    return await _crear_trabajo(
+        "procesar_pdfs", archivos,
+        lambda rutas, directorio, progreso: clase_procesador().procesar_archivos(rutas, directorio, progreso)
+    )
+
+
+@app.post("/trabajos/procesar_certificados/")
+async def trabajo_procesar_certificados(archivos: List[UploadFile] = File(...), formato: str = "xlsx"):
+    try:
+        verificar_formato(formato)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    for archivo in archivos:
+        if not archivo.filename.lower().endswith('.pdf'):
+            return JSONResponse(
+                status_code=400,
+                content={"error": f"Solo se aceptan archivos PDF. Archivo rechazado: {archivo.filename}"}
+            )
+
+    clase_extractor = cargar_procesador("procesar_certificados")
+    return await _crear_trabajo(
+        "procesar_certificados", archivos,
+        lambda rutas, directorio, progreso: clase_extractor().procesar_archivos(rutas, directorio, progreso, formato)
+    )
+
+
+@app.post("/trabajos/procesar_documentos/")
+async def trabajo_procesar_documentos(archivos: List[UploadFile] = File(...), formato: str = "xlsx"):
+    try:
+        verificar_formato(formato)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    for archivo in archivos:
+        if not (archivo.filename.lower().endswith((".pdf", ".zip"))):
+            return JSONResponse(
+                status_code=400,
+                content={"error": f"Solo se aceptan archivos .pdf o .zip. Archivo rechazado: {archivo.filename}"}
+            )
+
+    clase_enrutador = cargar_procesador("procesar_documentos")
+    return await _crear_trabajo(
+        "procesar_documentos", archivos,
+        lambda rutas, directorio, progreso: clase_enrutador().procesar_archivos(rutas, directorio, progreso, formato)
+    )
+
+
+@app.get("/trabajos/{trabajo_id}")
+async def estado_trabajo(trabajo_id: str):
+    trabajo = gestor_trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        return JSONResponse(status_code=404, content={"error": "Trabajo no encontrado"})
+
+    ruta_resultado = trabajo.pop("ruta_resultado")
+    trabajo["resultado_disponible"] = bool(ruta_resultado) and os.path.exists(ruta_resultado)
+    return trabajo
+
+
+@app.get("/trabajos/{trabajo_id}/progreso")
+async def progreso_trabajo(trabajo_id: str):
+    trabajo = gestor_trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        return JSONResponse(status_code=404, content={"error": "Trabajo no encontrado"})
+
+    total = trabajo["total"]
+    return {
+        "estado": trabajo["estado"],
+        "procesados": trabajo["procesados"],
+        "total": total,
+        "porcentaje": round(100 * trabajo["procesados"] / total, 1) if total else None
+    }
+
+
+@app.get("/trabajos/{trabajo_id}/resultado")
+async def resultado_trabajo(trabajo_id: str):
+    trabajo = gestor_trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        return JSONResponse(status_code=404, content={"error": "Trabajo no encontrado"})
+    if trabajo["estado"] != COMPLETADO:
+        return JSONResponse(status_code=409, content={"error": f"El trabajo está en estado {trabajo['estado']}"})
+    if not os.path.exists(trabajo["ruta_resultado"]):
+        return JSONResponse(status_code=410, content={"error": "El resultado ya no está disponible"})
+
+    return FileResponse(
+        trabajo["ruta_resultado"],
+        filename=os.path.basename(trabajo["ruta_resultado"]),
+        media_type="application/zip"
+    )
+
+
+# Índice de resultados: qué PDF ya procesados contenían un número de atención,
+# certificado o asunto
+
+@app.get("/indice/{numero}")
+async def buscar_en_indice(numero: str):
+    indice = obtener_indice()
+    if indice is None:
+        return JSONResponse(status_code=404, content={"error": "El índice de resultados está desactivado"})
+
+    resultados = indice.buscar_numero(numero.strip())
+    if not resultados:
+        return JSONResponse(status_code=404, content={"error": f"No hay PDF procesados con el número {numero}"})
+    return {"numero": numero, "resultados": resultados}
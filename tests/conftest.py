@@ -0,0 +1,27 @@
+# tests/conftest.py
+
+import os
+import sys
+
+import pytest
+
+# Los módulos de la aplicación se importan como clases.*, desde la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def crear_pdf(tmp_path):
+    """Crea un PDF con una página por cada texto dado y devuelve su ruta."""
+    from clases.backend_pdf import cargar_backend
+
+    def crear(nombre: str, *textos: str) -> str:
+        fitz = cargar_backend("fitz")
+        ruta = str(tmp_path / nombre)
+        doc = fitz.open()
+        for texto in textos:
+            doc.new_page().insert_text((72, 72), texto)
+        doc.save(ruta)
+        doc.close()
+        return ruta
+
+    return crear
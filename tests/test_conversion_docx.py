@@ -0,0 +1,25 @@
+# tests/test_conversion_docx.py
+
+import os
+from pathlib import Path
+
+from clases.conversion_docx import ConversorDocx
+
+
+def test_pdf_desalojado_de_la_cache_llega_al_llamador(tmp_path, monkeypatch):
+    monkeypatch.setenv("PACA_SOFFICE_PERSISTENTE", "0")
+    # Una caché de 1 byte desaloja cada PDF nada más guardarlo
+    conversor = ConversorDocx(num_workers=1, timeout=10, directorio=str(tmp_path / "conversion"), max_bytes_cache=1)
+    conversor.soffice = "soffice"
+
+    def convertir_soffice(ruta_docx, salida, perfil):
+        Path(salida, Path(ruta_docx).with_suffix(".pdf").name).write_bytes(b"%PDF-1.4 convertido")
+
+    monkeypatch.setattr(conversor, "_convertir_soffice", convertir_soffice)
+    ruta_docx = tmp_path / "cartas.docx"
+    ruta_docx.write_bytes(b"docx")
+
+    ruta_pdf = conversor.convertir(str(ruta_docx))
+
+    assert Path(ruta_pdf).read_bytes() == b"%PDF-1.4 convertido"
+    assert not os.listdir(tmp_path / "conversion" / "pdf")
@@ -0,0 +1,61 @@
+# tests/test_ejecutor.py
+
+import pytest
+
+from clases.cache_texto import CacheTextoPDF
+from clases.ejecutor import EjecutorTareas, cerrar_pools
+from clases.ocr import MotorOCR
+from clases.procesador_lleida import ProcesadorPDF
+
+
+def doble(x):
+    return x * 2
+
+
+def resolver_pares(x):
+    # Los pares se resuelven "aquí"; los impares se envían como x + 100
+    return (True, -x) if x % 2 == 0 else (False, x + 100)
+
+
+@pytest.fixture(autouse=True)
+def cerrar():
+    yield
+    cerrar_pools()
+
+
+@pytest.mark.parametrize("modo", ["secuencial", "hilos", "procesos"])
+def test_resolver_conserva_el_orden(modo):
+    ejecutor = EjecutorTareas(modo=modo, max_workers=2, tamano_lote=3)
+    resultados = list(ejecutor.mapear(doble, range(20), ordenado=True, resolver=resolver_pares))
+    assert [indice for indice, _, _ in resultados] == list(range(20))
+    assert [resultado for _, resultado, _ in resultados] == [-x if x % 2 == 0 else (x + 100) * 2
+                                                            for x in range(20)]
+
+
+def test_error_del_resolver_es_del_elemento():
+    def resolver(x):
+        if x == 3:
+            raise ValueError("no se puede")
+        return False, x
+
+    resultados = list(EjecutorTareas(modo="hilos", max_workers=2).mapear(doble, range(5), ordenado=True,
+                                                                          resolver=resolver))
+    assert resultados[3] == (3, None, "no se puede")
+    assert [r for _, r, _ in resultados[:3]] == [0, 2, 4]
+
+
+def test_texto_de_los_workers_vuelve_a_la_cache_principal(crear_pdf, tmp_path, monkeypatch):
+    monkeypatch.setenv("PACA_OCR", "0")
+    monkeypatch.setenv("PACA_INDICE_DB", "")
+    rutas = [crear_pdf(f"aviso_{n}.pdf", f"Atención N° {300000 + n}") for n in range(6)]
+    cache = CacheTextoPDF()
+    procesador = ProcesadorPDF(cache=cache, ejecutor=EjecutorTareas(modo="procesos", max_workers=2,
+                                                                    tamano_lote=2), ocr=MotorOCR())
+    (tmp_path / "salida").mkdir()
+    procesador.procesar_archivos(rutas, str(tmp_path / "salida"))
+
+    # El proceso principal solo hasheó; el texto lo extrajeron los workers y volvió con el resultado
+    assert all(cache.contiene(cache.obtener_huella(ruta), paginas=1) for ruta in rutas)
+    resueltos = [procesador._resolver(ruta) for ruta in rutas]
+    assert all(local for local, _ in resueltos)
+    assert [r["numero_atencion"] for _, r in resueltos] == [str(300000 + n) for n in range(6)]
@@ -0,0 +1,74 @@
+# tests/test_enrutador.py
+
+import os
+
+import pytest
+
+from clases.backend_pdf import abrir_pdf
+from clases.cache_texto import CacheTextoPDF
+from clases.ejecutor import EjecutorTareas
+from clases.enrutador import EnrutadorDocumentos
+from clases.indice_resultados import IndiceResultados
+from clases.ocr import MotorOCR
+
+
+@pytest.fixture
+def crear_enrutador(tmp_path, monkeypatch):
+    monkeypatch.setenv("PACA_OCR", "0")
+    monkeypatch.setenv("PACA_PAGINAS_CLASIFICACION", "2")
+
+    def crear(cache: CacheTextoPDF, ejecutor: EjecutorTareas) -> EnrutadorDocumentos:
+        return EnrutadorDocumentos(cache=cache, ejecutor=ejecutor, ocr=MotorOCR(),
+                                   indice=IndiceResultados(str(tmp_path / "indice.db")))
+
+    return crear
+
+
+def test_notificacion_solo_lee_las_primeras_paginas(crear_pdf, crear_enrutador, tmp_path):
+    ruta = crear_pdf("aviso.pdf", *[f"Notificación, página {n}" for n in range(10)])
+    cache = CacheTextoPDF()
+    enrutador = crear_enrutador(cache, EjecutorTareas(modo="secuencial"))
+
+    _, estadisticas = enrutador.procesar_archivos([ruta], str(tmp_path))
+
+    huella = cache.obtener_huella(ruta)
+    assert estadisticas["notificaciones"]["total"] == 1
+    assert cache.contiene(huella, paginas=2)
+    assert not cache.contiene(huella)
+
+
+def test_cartas_se_dividen_en_el_ejecutor(crear_pdf, crear_enrutador, tmp_path):
+    paginas = [f"PAC-DR-25-2-{numero} página {p}" for numero in ("312345", "398765") for p in range(4)]
+    ruta = crear_pdf("combinado.pdf", *paginas)
+    enrutador = crear_enrutador(CacheTextoPDF(), EjecutorTareas(modo="hilos", max_workers=2))
+
+    _, estadisticas = enrutador.procesar_archivos([ruta], str(tmp_path))
+
+    carpeta = tmp_path / "documentos" / "cartas"
+    assert sorted(os.listdir(carpeta)) == ["PQR-312345.pdf", "PQR-398765.pdf"]
+    for nombre in os.listdir(carpeta):
+        with abrir_pdf(str(carpeta / nombre)) as doc:
+            assert doc.num_paginas == 4
+    assert estadisticas["cartas"]["con_numero"] == 2
+
+
+def test_pdf_ya_indexado_no_se_vuelve_a_clasificar(crear_pdf, crear_enrutador, tmp_path, monkeypatch):
+    certificado = crear_pdf("certificado.pdf", "Certificado: E123456-S", "Asunto: 3123456", "Anexo")
+    aviso = crear_pdf("aviso.pdf", "Notificación", "Sin número")
+    crear_enrutador(CacheTextoPDF(), EjecutorTareas(modo="secuencial")).procesar_archivos(
+        [certificado, aviso], str(tmp_path))
+
+    # Con una caché vacía, el tipo y los datos solo pueden venir del índice
+    cache = CacheTextoPDF()
+    enrutador = crear_enrutador(cache, EjecutorTareas(modo="secuencial"))
+
+    def sin_worker(elemento):
+        raise AssertionError("el PDF no debería enviarse al worker")
+
+    monkeypatch.setattr(enrutador, "_analizar_en_worker", sin_worker)
+    (tmp_path / "segunda").mkdir()
+    _, estadisticas = enrutador.procesar_archivos([certificado, aviso], str(tmp_path / "segunda"))
+
+    assert estadisticas["certificados"]["desde_indice"] == 1
+    assert estadisticas["notificaciones"]["desde_indice"] == 1
+    assert not cache.contiene(cache.obtener_huella(certificado), paginas=1)
@@ -0,0 +1,33 @@
+# tests/test_extractor_certificados.py
+
+from clases.cache_texto import CacheTextoPDF
+from clases.ejecutor import EjecutorTareas
+from clases.ExtractorCertificados import ExtractorCertificadosLleida
+from clases.ocr import MotorOCR
+
+
+def test_certificado_subido_de_nuevo_se_resuelve_sin_worker(crear_pdf, tmp_path, monkeypatch):
+    monkeypatch.setenv("PACA_OCR", "0")
+    monkeypatch.setenv("PACA_INDICE_DB", "")
+    ruta = crear_pdf("certificado.pdf", "Certificado: E123456-S", "Asunto: 3123456",
+                     *[f"Anexo {n}" for n in range(5)])
+    cache = CacheTextoPDF()
+    extractor = ExtractorCertificadosLleida(cache=cache, ejecutor=EjecutorTareas(modo="secuencial"), ocr=MotorOCR())
+
+    (tmp_path / "primera").mkdir()
+    extractor.procesar_archivos([ruta], str(tmp_path / "primera"))
+    huella = cache.obtener_huella(ruta)
+    # La búsqueda se detuvo al encontrar ambos campos: la caché no tiene el documento completo
+    assert cache.contiene(huella, paginas=2) and not cache.contiene(huella)
+
+    def sin_worker(elemento):
+        raise AssertionError("el PDF no debería enviarse al worker")
+
+    monkeypatch.setattr(extractor, "_extraer_en_worker", sin_worker)
+    resuelto, resultado = extractor._resolver(ruta)
+    assert resuelto
+    assert (resultado["certificado"], resultado["asunto"]) == ("E123456-S", "3123456")
+
+    (tmp_path / "segunda").mkdir()
+    _, estadisticas = extractor.procesar_archivos([ruta], str(tmp_path / "segunda"))
+    assert estadisticas["exitosos"] == 1
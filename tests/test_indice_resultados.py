@@ -0,0 +1,77 @@
+# tests/test_indice_resultados.py
+
+import os
+import shutil
+
+import pytest
+
+from clases.cache_texto import CacheTextoPDF
+from clases.ejecutor import EjecutorTareas
+from clases.indice_resultados import ORIGEN_TEXTO, IndiceResultados
+from clases.ocr import MotorOCR
+from clases.procesador_lleida import ProcesadorPDF
+
+
+@pytest.fixture
+def indice(tmp_path):
+    return IndiceResultados(str(tmp_path / "indice.db"))
+
+
+@pytest.fixture
+def crear_procesador(indice, monkeypatch):
+    monkeypatch.setenv("PACA_OCR", "0")
+
+    def crear() -> ProcesadorPDF:
+        # Caché nueva en cada procesador: lo reutilizado solo puede venir del índice
+        return ProcesadorPDF(cache=CacheTextoPDF(), ejecutor=EjecutorTareas(modo="secuencial"), ocr=MotorOCR(),
+                             indice=indice)
+
+    return crear
+
+
+def procesar(procesador: ProcesadorPDF, ruta_pdf: str, directorio: str):
+    os.makedirs(directorio)
+    ruta_zip, estadisticas = procesador.procesar_archivos([ruta_pdf], directorio)
+    return sorted(os.listdir(os.path.join(directorio, "pdfs_procesados"))), estadisticas
+
+
+def test_numero_del_nombre_no_se_guarda_en_el_indice(crear_pdf, crear_procesador, indice, tmp_path):
+    ruta = crear_pdf("in_998877.pdf", "Notificación sin número en el texto")
+    nombres, _ = procesar(crear_procesador(), ruta, str(tmp_path / "primera"))
+    assert nombres == ["PQR_998877_333.pdf"]
+
+    # Los mismos bytes subidos con otro nombre no heredan el número del primer nombre
+    otro = str(tmp_path / "otro.pdf")
+    shutil.copy(ruta, otro)
+    nombres, estadisticas = procesar(crear_procesador(), otro, str(tmp_path / "segunda"))
+    assert nombres == ["SIN_NUMERO_otro.pdf"]
+    assert estadisticas["desde_indice"] == 1
+    assert indice.buscar_numero("998877") == []
+
+
+def test_numero_del_contenido_se_reutiliza_con_otro_nombre(crear_pdf, crear_procesador, indice, tmp_path):
+    ruta = crear_pdf("in_111111.pdf", "Atención N° 445566")
+    nombres, _ = procesar(crear_procesador(), ruta, str(tmp_path / "primera"))
+    assert nombres == ["PQR_445566_333.pdf"]
+
+    otro = str(tmp_path / "otro.pdf")
+    shutil.copy(ruta, otro)
+    nombres, estadisticas = procesar(crear_procesador(), otro, str(tmp_path / "segunda"))
+    assert nombres == ["PQR_445566_333.pdf"]
+    assert estadisticas["desde_indice"] == 1
+    [fila] = indice.buscar_numero("445566")
+    assert fila["origen_numero"] == ORIGEN_TEXTO
+    assert indice.buscar_numero("111111") == []
+
+
+def test_lectura_fallida_no_se_guarda_en_el_indice(crear_procesador, indice, tmp_path):
+    ruta = str(tmp_path / "in_123456.pdf")
+    with open(ruta, "wb") as f:
+        f.write(b"%PDF-1.4 no es un PDF")
+
+    # El número del nombre vale para esta subida, pero el error no queda como "sin número"
+    nombres, estadisticas = procesar(crear_procesador(), ruta, str(tmp_path / "salida"))
+    assert nombres == ["PQR_123456_333.pdf"]
+    assert estadisticas["desde_indice"] == 0
+    assert indice.consultar(CacheTextoPDF().obtener_huella(ruta), "atencion",
+                            crear_procesador().version_indice) is None
@@ -0,0 +1,14 @@
+# tests/test_ocr.py
+
+from clases.ocr import MotorOCR, intercalar_ocr
+
+
+def test_el_ocr_usa_la_huella_de_la_ingesta_sin_releer_el_pdf(tmp_path):
+    motor = MotorOCR(tesseract="tesseract")
+    motor._cache[("h1", motor.region, motor.dpi, motor.idioma)] = "PACARIBE 3123456"
+    # El archivo no existe: si el OCR lo leyera para hashearlo, fallaría
+    ruta = str(tmp_path / "escaneado.pdf")
+
+    [((fuente, resultado, error), ocr)] = intercalar_ocr([(ruta, {"huella": "h1"}, None)], motor, lambda _: True)
+
+    assert ocr.result().texto == "PACARIBE 3123456"
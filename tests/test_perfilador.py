@@ -0,0 +1,55 @@
+# tests/test_perfilador.py
+
+import contextvars
+import pstats
+import threading
+
+from clases.ejecutor import EjecutorTareas
+from clases.metricas import Perfilador, perfilando, perfilar
+
+
+def trabajo_del_hilo():
+    # El ejecutor no reparte entre workers mientras se perfila
+    return [resultado for _, resultado, _ in EjecutorTareas(modo="hilos", max_workers=4).mapear(
+        lambda x: (x, threading.current_thread().name), range(3))]
+
+
+def test_perfil_incluye_el_trabajo_de_otros_hilos(tmp_path):
+    perfilador = Perfilador(directorio=str(tmp_path), activado=True)
+    perfiles = perfilador.iniciar()
+    assert perfilando()
+    funcion = perfilar(trabajo_del_hilo)
+    resultados = []
+    # Como run_in_threadpool: otro hilo con una copia del contexto de la petición
+    contexto = contextvars.copy_context()
+    hilo = threading.Thread(target=lambda: resultados.extend(contexto.run(funcion)))
+    hilo.start()
+    hilo.join()
+    nombre = perfilador.terminar(perfiles, "/procesar_pdfs/")
+
+    assert not perfilando()
+    assert {hilo_resultado for _, hilo_resultado in resultados} == {hilo.name}
+    funciones = {clave[2] for clave in pstats.Stats(str(tmp_path / nombre)).stats}
+    assert "trabajo_del_hilo" in funciones
+
+
+def test_sin_perfil_la_funcion_no_cambia():
+    assert perfilar(trabajo_del_hilo) is trabajo_del_hilo
+
+
+def test_hilo_sin_perfil_si_el_interprete_no_admite_otro(monkeypatch):
+    import types
+
+    from clases import metricas
+
+    class PerfilOcupado:
+        def enable(self):
+            raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(metricas, "cProfile", types.SimpleNamespace(Profile=PerfilOcupado))
+
+    def ejecutar():
+        metricas._perfiles_peticion.set([])
+        return perfilar(lambda: "hecho")(), metricas._perfiles_peticion.get()
+
+    assert contextvars.copy_context().run(ejecutar) == ("hecho", [])
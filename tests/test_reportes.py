@@ -0,0 +1,20 @@
+# tests/test_reportes.py
+
+import pytest
+
+from clases.reportes import EscritorReporteParquet, crear_escritor, verificar_formato
+
+
+def test_formato_sin_su_dependencia_se_rechaza_antes_de_procesar(tmp_path, monkeypatch):
+    monkeypatch.setattr(EscritorReporteParquet, "dependencia", "paquete_que_no_existe")
+
+    with pytest.raises(ValueError, match="requiere instalar paquete_que_no_existe"):
+        verificar_formato("parquet")
+    with pytest.raises(ValueError):
+        crear_escritor("parquet", str(tmp_path), "informe", ["a"])
+    verificar_formato("csv")
+
+
+def test_formato_desconocido():
+    with pytest.raises(ValueError, match="Formato de informe no válido"):
+        verificar_formato("xls")
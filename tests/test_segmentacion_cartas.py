@@ -0,0 +1,65 @@
+# tests/test_segmentacion_cartas.py
+
+from clases.procesador import ProcesadorCartas, _indexar_cartas, segmentar_textos
+
+PATRONES = ProcesadorCartas.PATRONES_NUMERO
+
+
+def paginas(*cartas):
+    """Texto de las páginas de un documento: por cada carta, (número_o_None, páginas)."""
+    textos = []
+    for numero, total in cartas:
+        textos.append(f"PAC-DR-25-2-{numero}\nCuerpo de la carta" if numero else "Carta sin cabecera")
+        textos.extend(["Continuación de la carta"] * (total - 1))
+    return textos
+
+
+def test_indexar_cartas_abre_una_carta_por_marcador():
+    marcadores = [(0, "300001"), (1, None), (2, None), (3, "300002"), (4, None)]
+    assert _indexar_cartas(marcadores, 8, 4) == ([(0, 2, "300001"), (3, 4, "300002")], [])
+
+
+def test_indexar_cartas_paginas_sin_carta_van_a_excepciones():
+    marcadores = [(0, None), (1, "300001"), (2, None), (3, None)]
+    assert _indexar_cartas(marcadores, 2, 4) == ([(1, 2, "300001")], [0, 3])
+
+
+def test_indexar_cartas_cabecera_repetida_continua_la_carta():
+    marcadores = [(0, "300001"), (1, "300001"), (2, "300001"), (3, "300001")]
+    assert _indexar_cartas(marcadores, 8, 4) == ([(0, 3, "300001")], [])
+
+
+def test_indexar_cartas_mismo_numero_en_cartas_seguidas():
+    marcadores = [(p, "300001" if p % 4 == 0 else None) for p in range(8)]
+    assert _indexar_cartas(marcadores, 8, 4) == ([(0, 3, "300001"), (4, 7, "300001")], [])
+
+
+def test_segmentar_auto_bloques_de_cuatro():
+    textos = paginas(("300001", 4), (None, 4), ("300003", 4))
+    cartas, excepciones = segmentar_textos(textos, PATRONES, PATRONES, modo="auto")
+    assert cartas == [(0, 3, "300001"), (4, 7, None), (8, 11, "300003")]
+    assert excepciones == []
+
+
+def test_segmentar_auto_carta_a_mitad_de_bloque_usa_marcadores():
+    # 3 + 5 páginas: múltiplo de 4, pero la segunda carta empieza en la página 4
+    textos = paginas(("300001", 3), ("300002", 5))
+    assert segmentar_textos(textos, PATRONES, PATRONES, modo="auto") == ([(0, 2, "300001"), (3, 7, "300002")], [])
+    assert segmentar_textos(textos, PATRONES, PATRONES, modo="marcadores") == (
+        [(0, 2, "300001"), (3, 7, "300002")], [])
+
+
+def test_segmentar_fija_no_mira_los_marcadores():
+    textos = paginas(("300001", 3), ("300002", 5))
+    cartas, _ = segmentar_textos(textos, PATRONES, PATRONES, modo="fija")
+    assert cartas == [(0, 3, "300001"), (4, 7, None)]
+
+
+def test_segmentar_auto_no_multiplo_de_cuatro():
+    textos = paginas(("300001", 2), ("300002", 3))
+    assert segmentar_textos(textos, PATRONES, PATRONES, modo="auto") == ([(0, 1, "300001"), (2, 4, "300002")], [])
+
+
+def test_segmentar_por_defecto_bloques_fijos():
+    textos = paginas(("300001", 3), ("300002", 5))
+    assert segmentar_textos(textos, PATRONES, PATRONES) == segmentar_textos(textos, PATRONES, PATRONES, modo="fija")
@@ -0,0 +1,96 @@
+# tests/test_trabajos.py
+
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+from clases.trabajos import COMPLETADO, EN_COLA, EN_PROCESO, FALLIDO, AlmacenTrabajos, GestorTrabajos
+
+
+def _pid_terminado() -> int:
+    proceso = subprocess.Popen([sys.executable, "-c", "pass"])
+    proceso.wait()
+    return proceso.pid
+
+
+def test_solo_se_interrumpen_los_trabajos_de_procesos_terminados(tmp_path):
+    almacen = AlmacenTrabajos(str(tmp_path / "trabajos.db"))
+    host = socket.gethostname()
+    propietarios = {
+        "propio": None,
+        "otro_worker": f"{host}:{os.getppid()}:a",
+        "muerto": f"{host}:{_pid_terminado()}:b",
+        "reinicio": f"{host}:{os.getpid()}:arranque_anterior",
+        "otra_maquina": "otra-maquina:1:c",
+    }
+    for trabajo_id, propietario in propietarios.items():
+        almacen.crear(trabajo_id, "procesar_pdfs")
+        if propietario:
+            almacen.actualizar(trabajo_id, propietario=propietario, estado=EN_PROCESO)
+    almacen.crear("antiguo", "procesar_pdfs")
+    almacen.actualizar("antiguo", propietario=None)
+
+    assert almacen.marcar_interrumpidos() == 3
+    estados = {t: almacen.obtener(t)["estado"] for t in [*propietarios, "antiguo"]}
+    assert estados == {"propio": EN_COLA, "otro_worker": EN_PROCESO, "muerto": FALLIDO,
+                       "reinicio": FALLIDO, "otra_maquina": EN_PROCESO, "antiguo": FALLIDO}
+
+
+def test_base_de_datos_anterior_sin_propietario(tmp_path):
+    ruta = str(tmp_path / "trabajos.db")
+    with sqlite3.connect(ruta) as conexion:
+        conexion.execute("CREATE TABLE trabajos (id TEXT PRIMARY KEY, tipo TEXT NOT NULL, estado TEXT NOT NULL, "
+                         "procesados INTEGER NOT NULL DEFAULT 0, total INTEGER, resumen TEXT, "
+                         "ruta_resultado TEXT, error TEXT, creado TEXT NOT NULL, actualizado TEXT NOT NULL)")
+        conexion.execute("INSERT INTO trabajos (id, tipo, estado, creado, actualizado) VALUES ('x', 't', ?, '', '')",
+                         (EN_PROCESO,))
+
+    almacen = AlmacenTrabajos(ruta)
+    assert almacen.marcar_interrumpidos() == 1
+    assert almacen.obtener("x")["estado"] == FALLIDO
+
+
+def _trabajo_terminado(gestor, estado, actualizado, tamano=0):
+    trabajo_id, entrada = gestor.crear("procesar_pdfs")
+    ruta_resultado = os.path.join(gestor.directorio, trabajo_id, "resultado.zip")
+    with open(ruta_resultado, "wb") as f:
+        f.write(b"0" * tamano)
+    gestor.almacen.actualizar(trabajo_id, estado=estado, ruta_resultado=ruta_resultado)
+    with sqlite3.connect(gestor.almacen.ruta_db) as conexion:
+        conexion.execute("UPDATE trabajos SET actualizado = ? WHERE id = ?", (actualizado, trabajo_id))
+    return trabajo_id
+
+
+def test_limpiar_aplica_edad_y_cuota_a_los_resultados(tmp_path):
+    gestor = GestorTrabajos(directorio=str(tmp_path), max_edad=24 * 3600, max_bytes=1500)
+    hace = lambda horas: (datetime.now() - timedelta(hours=horas)).isoformat(timespec="seconds")
+    caducado = _trabajo_terminado(gestor, COMPLETADO, hace(48), 100)
+    antiguo = _trabajo_terminado(gestor, COMPLETADO, hace(3), 1000)
+    reciente = _trabajo_terminado(gestor, COMPLETADO, hace(1), 1000)
+    fallido = _trabajo_terminado(gestor, FALLIDO, hace(1))
+    en_curso, _ = gestor.crear("procesar_pdfs")
+    huerfano = tmp_path / "huerfano"
+    huerfano.mkdir()
+    os.utime(huerfano, (0, 0))
+
+    assert gestor.limpiar() == {"trabajos": 1, "resultados": 1, "bytes": 1100}
+    assert gestor.obtener(caducado) is None
+    assert gestor.obtener(antiguo)["estado"] == COMPLETADO
+    assert not os.path.exists(gestor.obtener(antiguo)["ruta_resultado"])
+    assert os.path.exists(gestor.obtener(reciente)["ruta_resultado"])
+    assert not (tmp_path / fallido).exists()
+    assert (tmp_path / en_curso).exists()
+    assert not huerfano.exists()
+
+
+def test_directorio_por_defecto_en_el_de_datos(tmp_path, monkeypatch):
+    monkeypatch.delenv("PACA_DIR_TRABAJOS", raising=False)
+    monkeypatch.setenv("PACA_DIR_DATOS", "datos_paca")
+    monkeypatch.chdir(tmp_path)
+    gestor = GestorTrabajos()
+    # La ruta queda fijada al crear el gestor, aunque después cambie el directorio actual
+    monkeypatch.chdir("/")
+    assert gestor.directorio == str(tmp_path / "datos_paca" / "trabajos")